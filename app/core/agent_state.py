@@ -12,6 +12,11 @@ class TaxCodeResult(TypedDict):
     reasoning: str
 
 
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer for dict fields written by parallel branches"""
+    return {**left, **right}
+
+
 class AgentState(TypedDict):
     """
     State for the product categorization agent.
@@ -32,7 +37,15 @@ class AgentState(TypedDict):
     category: Dict[str, Any]
     tax_code_result: TaxCodeResult
 
-    total_tokens: int  # Track total tokens used across all LLM calls
+    # Track total tokens used across all LLM calls; nodes return their own usage
+    total_tokens: Annotated[int, operator.add]
+
+    # Prompt tokens served from the provider's prefix cache
+    cached_tokens: Annotated[int, operator.add]
+
+    node_timings: Annotated[Dict[str, float], merge_dicts]  # seconds per node
+
+    use_cache: bool  # Serve LLM responses from the response cache when possible
 
     errors: Annotated[List[str], operator.add]
 
@@ -57,4 +70,7 @@ class ProductAnalysisOutput(TypedDict):
     tax_code_name: str
     tax_code_confidence: float
     tax_code_reasoning: str
-    total_tokens: int  
+    total_tokens: int
+    cached_tokens: int
+    node_timings: Dict[str, float]
+    topology: str  
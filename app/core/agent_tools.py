@@ -1,10 +1,23 @@
+import asyncio
 import json
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from openai import AsyncOpenAI
 from database.vector_db.vector_store import QdrantVectorStore
+from database.vector_db.candidate_table import TaxCandidateTable
+from database.vector_db.retrieval_cache import GroupRetrievalCache
+from database.vector_db.micro_batcher import SearchBatcher
+from app.core.llm_cache import LLMResponseCache
+from app.core.call_policy import NodeCallPolicy
+from app.core.keyword_engine import KeywordEngine
+from app.core.category_map import CategoryMap
+from app.core.tax_cascade import TaxCodeCascade
+from utils.prompt_budget import PromptAssembler
+from utils.json_stream import JSONFieldStream
 from utils.helper import (
     format_product_for_llm,
+    normalized_product_fields,
+    product_fingerprint,
     parse_llm_json_response,
     get_category_hierarchy,
     validate_keyword_count,
@@ -19,19 +32,359 @@ from utils.prompts import (
     get_tax_code_selection_prompt,
     get_combined_product_content_prompt,
     get_combined_classification_prompt,
+    get_combined_tax_code_prompt,
+    get_variant_delta_prompt,
+    COMBINED_TAX_CODE_PROMPT,
+    PROMPT_VERSION,
 )
 from config.config import settings
-from app.core.agent_state import AgentState, TaxCodeResult
+from app.core.agent_state import AgentState, ProductAnalysisOutput, TaxCodeResult
 
 logger = logging.getLogger(__name__)
 
 
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens the provider served from its prefix cache"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+
+def search_payload_fields() -> Optional[List[str]]:
+    """Payload fields tax searches return, None for the full payload"""
+    if settings.search_payload_mode == "full":
+        return None
+    return settings.search_payload_fields
+
+
+def cache_inputs(product_data: Dict[str, Any], **context: Any) -> Dict[str, Any]:
+    """
+    What an LLM response cache key is built from besides the node, prompt
+    version and model: the normalized product fields and the other values
+    the prompt is rendered from
+    """
+    return {"product": normalized_product_fields(product_data), **context}
+
+
 class ProductAgentTools:
     """Tools for the product categorization agent"""
 
-    def __init__(self, openai_client: AsyncOpenAI, vector_store: QdrantVectorStore):
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        vector_store: QdrantVectorStore,
+        candidate_table: Optional[TaxCandidateTable] = None,
+        retrieval_cache: Optional[GroupRetrievalCache] = None,
+        llm_cache: Optional[LLMResponseCache] = None,
+        prompt_assembler: Optional[PromptAssembler] = None,
+        call_policy: Optional[NodeCallPolicy] = None,
+        keyword_engine: Optional[KeywordEngine] = None,
+        category_map: Optional[CategoryMap] = None,
+        tax_cascade: Optional[TaxCodeCascade] = None,
+        search_batcher: Optional[SearchBatcher] = None,
+    ):
         self.openai_client = openai_client
         self.vector_store = vector_store
+        self.candidate_table = candidate_table
+        self.retrieval_cache = retrieval_cache
+        self.llm_cache = llm_cache
+        self.prompt_assembler = prompt_assembler
+        self.call_policy = call_policy
+        self.keyword_engine = keyword_engine or KeywordEngine()
+        self.category_map = category_map
+        self.tax_cascade = tax_cascade
+        self.search_batcher = search_batcher
+        self.usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+    async def _cached_json_completion(
+        self,
+        node: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        cache_inputs: Dict[str, Any],
+        use_cache: bool = True,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+    ) -> Tuple[Optional[str], int, int, bool]:
+        """
+        JSON chat completion served from the LLM response cache when possible.
+
+        The cache key is built from ``cache_inputs`` (see cache_inputs())
+        rather than the rendered messages. Returns the response content, the tokens it cost (0 on a cache hit),
+        how many of its prompt tokens the provider served from its prefix
+        cache and whether it came from the response cache. Only responses
+        that parse as JSON are stored.
+
+        With ``on_field`` the completion is streamed and on_field(key, value)
+        is called for each top-level field of the JSON object as soon as its
+        value has closed (for a cached response, all at once). Under the
+        call policy each field is reported once, from whichever attempt
+        streams it first.
+        """
+        key = None
+        if self.llm_cache is not None:
+            key = LLMResponseCache.make_key(
+                node,
+                PROMPT_VERSION,
+                settings.model_name,
+                cache_inputs,
+                temperature=settings.agent_temperature,
+                max_tokens=max_tokens,
+            )
+            if use_cache:
+                # SQLite I/O runs in a worker thread, off the event loop
+                cached = await asyncio.to_thread(self.llm_cache.get, key)
+                if cached is not None:
+                    logger.info(f"Using cached LLM response for {node}")
+                    if on_field is not None:
+                        for field, value in JSONFieldStream().feed(cached[0]):
+                            on_field(field, value)
+                    return cached[0], 0, 0, True
+
+        stream_params = (
+            {"stream": True, "stream_options": {"include_usage": True}}
+            if on_field is not None
+            else {}
+        )
+
+        # Hedged and retried attempts stream the same fields; report each once
+        reported = set()
+
+        def report(field: str, value: Any):
+            if field not in reported:
+                reported.add(field)
+                on_field(field, value)  # type:ignore
+
+        async def request(model: str) -> Tuple[Optional[str], Any]:
+            response = await self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,  # type:ignore
+                temperature=settings.agent_temperature,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+                **stream_params,
+            )
+            # Streams are read within the attempt, so the policy's deadline,
+            # retries and fallback cover the whole response and a losing
+            # hedge's stream is closed when it is cancelled
+            if on_field is not None:
+                return await self._read_stream(response, report)
+            return response.choices[0].message.content, getattr(
+                response, "usage", None
+            )
+
+        model = settings.model_name
+        if self.call_policy is not None:
+            # Streamed responses are timed separately from whole ones
+            policy_node = f"{node}_stream" if on_field is not None else node
+            (content, usage), model = await self.call_policy.call(
+                policy_node, request
+            )
+        else:
+            content, usage = await request(model)
+
+        total_tokens = 0
+        cached_tokens = 0
+        if usage:
+            total_tokens = usage.total_tokens
+            cached_tokens = cached_prompt_tokens(usage)
+            self.usage["requests"] += 1
+            self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self.usage["cached_tokens"] += cached_tokens
+
+        # Bypassed requests still refresh the stored entry; fallback model
+        # responses are not stored under the primary model's key
+        if (
+            key is not None
+            and model == settings.model_name
+            and content
+            and parse_llm_json_response(content) is not None
+        ):
+            await asyncio.to_thread(
+                self.llm_cache.put,
+                key,
+                node,
+                settings.model_name,
+                content,
+                total_tokens,
+            )
+
+        return content, total_tokens, cached_tokens, False
+
+    @staticmethod
+    async def _read_stream(
+        stream: Any, on_field: Callable[[str, Any], None]
+    ) -> Tuple[str, Any]:
+        """Collect a streamed completion, reporting JSON fields as they close"""
+        parser = JSONFieldStream()
+        usage = None
+        try:
+            async for chunk in stream:
+                # The usage arrives in a final chunk without choices
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    for field, value in parser.feed(chunk.choices[0].delta.content):
+                        on_field(field, value)
+        finally:
+            # Release the connection of an abandoned stream
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+        return parser.text, usage
+
+    async def _search_tax_categories(
+        self,
+        product_data: Dict[str, Any],
+        query: str,
+        payload_fields: Optional[List[str]],
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """Live tax search, shared between Structure Group siblings when cached"""
+
+        async def search():
+            # Concurrent searches go out together through search_many
+            if self.search_batcher is not None:
+                return await self.search_batcher.search(query)
+            return await self.vector_store.search(
+                collection_name=settings.collection_name,
+                query=query,
+                top_k=settings.retrieval_top_k,
+                payload_fields=payload_fields,
+            )
+
+        group = product_data.get("Structure Group") or product_data.get(
+            "Structure_Group"
+        )
+        description = product_data.get("Item Desc Short") or product_data.get(
+            "Item_Desc_Short"
+        )
+        if self.retrieval_cache is None or not group or not description:
+            return await search(), "live search"
+
+        results, cached = await self.retrieval_cache.get_or_search(
+            str(group), str(description), search
+        )
+        return results, "group cache" if cached else "live search"
+
+    def _fit_keywords(
+        self, product_data: Dict[str, Any], keywords: List[str]
+    ) -> List[str]:
+        """Trim keywords to the maximum, filling up to the minimum locally"""
+        if not validate_keyword_count(
+            keywords, settings.keyword_count_min, settings.keyword_count_max
+        ):
+            logger.warning(
+                f"Keyword count {len(keywords)} outside range {settings.keyword_count_min}-{settings.keyword_count_max}"
+            )
+        return self.keyword_engine.fill(
+            product_data,
+            keywords[: settings.keyword_count_max],
+            settings.keyword_count_min,
+        )
+
+    def content_keywords(
+        self, product_data: Dict[str, Any], keywords: List[Any]
+    ) -> List[str]:
+        """Final keywords from the keywords of a content response"""
+        return self._fit_keywords(product_data, clean_keywords(keywords))
+
+    def local_keywords(self, product_data: Dict[str, Any]) -> List[str]:
+        """
+        Catalog-trained keywords for a product, without an LLM call.
+        ["product"] when the product has no usable text.
+        """
+        target_count = (settings.keyword_count_min + settings.keyword_count_max) // 2
+        return self.keyword_engine.keywords(product_data, target_count) or ["product"]
+
+    async def known_category(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        """
+        Category learned for the product's Structure Group, set on the state
+        so no LLM call has to choose it. None when the group is not confident.
+        """
+        if self.category_map is None:
+            return None
+        # The map's lock is shared with SQLite writes; keep both off the loop
+        category = await asyncio.to_thread(
+            self.category_map.lookup, state["product_data"]
+        )
+        if category is not None:
+            state["category"] = category
+            category_display = f"{category['main_category']} > {', '.join(category['subcategories'][:2])}"
+            state["processing_steps"].append(
+                f"Matched category from Structure Group: {category_display}"
+            )
+            logger.info(f"Matched category from Structure Group: {category_display}")
+        return category
+
+    async def record_category(self, state: AgentState):
+        """Learn the LLM-assigned category of the product's Structure Group"""
+        if self.category_map is not None:
+            await asyncio.to_thread(
+                self.category_map.record, state["product_data"], state["category"]
+            )
+
+    async def classify_locally(
+        self, state: AgentState, with_category: bool = True
+    ) -> bool:
+        """
+        Take the tax code (and, unless the Structure Group supplies it, the
+        category) from the vote of similar classified products. False when
+        the cascade is disabled or the vote is not decisive. With
+        ``with_category`` the Structure Group's category is filled in first
+        either way, for the classification request to build on.
+        """
+        if with_category and not state["category"].get("main_category"):
+            await self.known_category(state)
+        if self.tax_cascade is None:
+            return False
+        need_category = with_category and not state["category"].get("main_category")
+        try:
+            prediction = await self.tax_cascade.predict(
+                state["product_data"], require_category=need_category
+            )
+        except Exception as e:
+            logger.warning(f"Tax code cascade failed, asking the LLM: {e}")
+            return False
+        if prediction is None:
+            return False
+
+        if need_category:
+            state["category"] = prediction["category"]
+        state["tax_code_result"] = TaxCodeResult(
+            tax_code=prediction["tax_code"],
+            tax_code_name=prediction["tax_code_name"],
+            confidence=prediction["confidence"],
+            reasoning=(
+                f"Resolved from {prediction['neighbors']} similar classified "
+                f"products (nearest similarity {prediction['similarity']}, "
+                f"vote margin {prediction['margin']})"
+            ),
+        )
+        state["processing_steps"].append(
+            f"Resolved tax code from similar products: {prediction['tax_code']}"
+        )
+        logger.info(
+            f"Resolved tax code locally: {prediction['tax_code']} (margin: {prediction['margin']})"
+        )
+        return True
+
+    async def record_classification(
+        self, state: AgentState, with_category: bool = True
+    ):
+        """Store an LLM classification for the tax code cascade"""
+        result = state["tax_code_result"]
+        if self.tax_cascade is None or not result["tax_code"]:
+            return
+        try:
+            await self.tax_cascade.record(
+                state["product_data"],
+                result["tax_code"],
+                result["tax_code_name"],
+                float(result["confidence"] or 0.0),
+                state["category"] if with_category else None,
+            )
+        except Exception as e:
+            logger.warning(
+                f"Could not store classification for the tax code cascade: {e}"
+            )
 
     async def retrieve_tax_categories(self, state: AgentState) -> AgentState:
         """
@@ -43,14 +396,26 @@ class ProductAgentTools:
             product_info = format_product_for_llm(state["product_data"])
             state["product_info_formatted"] = product_info
 
-            results = await self.vector_store.search(
-                collection_name=settings.collection_name,
-                query=product_info,
-                top_k=settings.retrieval_top_k,
-            )
+            payload_fields = search_payload_fields()
+            # Catalog products precomputed offline skip the live search
+            results = None
+            if self.candidate_table is not None:
+                results = self.candidate_table.lookup(
+                    product_fingerprint(state["product_data"]),
+                    top_k=settings.retrieval_top_k,
+                    payload_fields=payload_fields,
+                )
+
+            source = "candidate table"
+            if results is None:
+                results, source = await self._search_tax_categories(
+                    state["product_data"], product_info, payload_fields
+                )
 
             state["retrieved_tax_categories"] = results
-            state["processing_steps"].append(f"Retrieved {len(results)} tax categories")
+            state["processing_steps"].append(
+                f"Retrieved {len(results)} tax categories ({source})"
+            )
 
             logger.info(f"Retrieved {len(results)} tax categories")
 
@@ -88,6 +453,7 @@ class ProductAgentTools:
             # Track tokens
             if hasattr(response, "usage") and response.usage:
                 state["total_tokens"] += response.usage.total_tokens
+                state["cached_tokens"] += cached_prompt_tokens(response.usage)
 
             logger.info(f"Generated name pattern: {name_pattern}")
 
@@ -130,6 +496,7 @@ class ProductAgentTools:
             # Track tokens
             if hasattr(response, "usage") and response.usage:
                 state["total_tokens"] += response.usage.total_tokens
+                state["cached_tokens"] += cached_prompt_tokens(response.usage)
             else:
                 raise ValueError("Failed to generate product summary")
 
@@ -172,6 +539,7 @@ class ProductAgentTools:
             # Track tokens
             if hasattr(response, "usage") and response.usage:
                 state["total_tokens"] += response.usage.total_tokens
+                state["cached_tokens"] += cached_prompt_tokens(response.usage)
             else:
                 raise ValueError("Failed to generate product description")
 
@@ -188,6 +556,14 @@ class ProductAgentTools:
         Node: Extract 15-20 relevant keywords
         """
         try:
+            if settings.local_keywords_only:
+                keywords = self.local_keywords(state["product_data"])
+                state["keywords"] = keywords
+                state["processing_steps"].append(
+                    f"Extracted {len(keywords)} keywords (local)"
+                )
+                return state
+
             logger.info("Extracting keywords...")
 
             target_count = (
@@ -220,26 +596,9 @@ class ProductAgentTools:
             )
 
             if keywords_json and "keywords" in keywords_json:
-                keywords = clean_keywords(keywords_json["keywords"])
-
-                if not validate_keyword_count(
-                    keywords, settings.keyword_count_min, settings.keyword_count_max
-                ):
-                    logger.warning(
-                        f"Keyword count {len(keywords)} outside range {settings.keyword_count_min}-{settings.keyword_count_max}"
-                    )
-                    if len(keywords) < settings.keyword_count_min:
-
-                        keywords.extend(
-                            [
-                                f"keyword_{i}"
-                                for i in range(
-                                    settings.keyword_count_min - len(keywords)
-                                )
-                            ]
-                        )
-                    elif len(keywords) > settings.keyword_count_max:
-                        keywords = keywords[: settings.keyword_count_max]
+                keywords = self._fit_keywords(
+                    state["product_data"], clean_keywords(keywords_json["keywords"])
+                )
 
                 state["keywords"] = keywords
                 state["processing_steps"].append(f"Extracted {len(keywords)} keywords")
@@ -248,6 +607,7 @@ class ProductAgentTools:
                 # Track tokens
                 if hasattr(response, "usage") and response.usage:
                     state["total_tokens"] += response.usage.total_tokens
+                    state["cached_tokens"] += cached_prompt_tokens(response.usage)
             else:
                 raise ValueError("Failed to parse keywords JSON")
 
@@ -255,7 +615,7 @@ class ProductAgentTools:
             error_msg = f"Error extracting keywords: {str(e)}"
             logger.error(error_msg)
             state["errors"].append(error_msg)
-            state["keywords"] = []
+            state["keywords"] = self.local_keywords(state["product_data"])
 
         return state
 
@@ -263,6 +623,9 @@ class ProductAgentTools:
         """
         Node: Match product to category
         """
+        if await self.known_category(state) is not None:
+            return state
+
         try:
             logger.info("Matching category...")
 
@@ -302,6 +665,7 @@ class ProductAgentTools:
                     "main_category": category_json["main_category"],
                     "subcategories": category_json["subcategories"],
                 }
+                await self.record_category(state)
                 category_display = f"{category_json['main_category']} > {', '.join(category_json['subcategories'][:2])}"
                 state["processing_steps"].append(
                     f"Matched category: {category_display}"
@@ -311,6 +675,7 @@ class ProductAgentTools:
                 # Track tokens
                 if hasattr(response, "usage") and response.usage:
                     state["total_tokens"] += response.usage.total_tokens
+                    state["cached_tokens"] += cached_prompt_tokens(response.usage)
             else:
                 raise ValueError(
                     "Failed to parse category JSON - missing main_category or subcategories"
@@ -331,6 +696,9 @@ class ProductAgentTools:
         """
         Node: Suggest tax code from retrieved categories
         """
+        if await self.classify_locally(state, with_category=False):
+            return state
+
         try:
             logger.info("Suggesting tax code...")
 
@@ -379,6 +747,7 @@ class ProductAgentTools:
                     confidence=tax_json.get("confidence", 0.0),
                     reasoning=tax_json.get("reasoning", ""),
                 )
+                await self.record_classification(state, with_category=False)
                 state["processing_steps"].append(
                     f"Suggested tax code: {tax_json.get('tax_code', '')}"
                 )
@@ -389,6 +758,7 @@ class ProductAgentTools:
                 # Track tokens
                 if hasattr(response, "usage") and response.usage:
                     state["total_tokens"] += response.usage.total_tokens
+                    state["cached_tokens"] += cached_prompt_tokens(response.usage)
             else:
                 raise ValueError("Failed to parse tax code JSON")
 
@@ -407,182 +777,331 @@ class ProductAgentTools:
 
     # OPTIMIZED COMBINED METHODS
 
-    async def generate_product_content(self, state: AgentState) -> AgentState:
+    def product_content_request(self, state: AgentState) -> Dict[str, Any]:
+        """Messages and token limit of the combined product content call"""
+        if self.prompt_assembler is not None:
+            prompt, input_tokens = self.prompt_assembler.content_prompt(
+                state["product_data"]
+            )
+            logger.info(f"Product content prompt: {input_tokens} input tokens")
+        else:
+            prompt = get_combined_product_content_prompt(
+                state["product_info_formatted"]
+            )
+        return {
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a product content generation expert.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": settings.agent_max_tokens * 2,  # Double for combined output
+        }
+
+    def apply_product_content(self, state: AgentState, content_json: Dict[str, Any]):
+        """Copy a parsed product content response into the state"""
+        # Extract all 4 components
+        state["name_pattern"] = content_json.get("name_pattern", "")
+        state["product_summary"] = content_json.get("product_summary", "")
+        state["product_description"] = content_json.get("product_description", "")
+
+        # Process keywords
+        keywords = content_json.get("keywords", [])
+        if isinstance(keywords, list):
+            state["keywords"] = self.content_keywords(state["product_data"], keywords)
+        else:
+            raise ValueError("Keywords must be a list")
+
+    def product_content_failed(self, state: AgentState, error: Exception):
+        """Record a product content failure and set defaults"""
+        error_msg = f"Error generating product content: {str(error)}"
+        logger.error(error_msg)
+        state["errors"].append(error_msg)
+        # Set defaults
+        state["name_pattern"] = "Unknown Product"
+        state["product_summary"] = "Product information not available"
+        state["product_description"] = "Product information not available"
+        state["keywords"] = self.local_keywords(state["product_data"])
+
+    async def generate_product_content(
+        self,
+        state: AgentState,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+    ) -> AgentState:
         """
         Generate ALL product content in one LLM call (OPTIMIZED).
         Combines: name_pattern, product_summary, product_description, keywords
+
+        With ``on_field`` the response is streamed and each field is passed
+        to it as soon as it has been generated.
         """
         try:
             logger.info("Generating all product content in one call...")
 
-            prompt = get_combined_product_content_prompt(
-                state["product_info_formatted"]
+            (
+                content,
+                total_tokens,
+                cached_tokens,
+                cached,
+            ) = await self._cached_json_completion(
+                "generate_product_content",
+                **self.product_content_request(state),
+                cache_inputs=cache_inputs(state["product_data"]),
+                use_cache=state.get("use_cache", True),
+                on_field=on_field,
             )
 
-            response = await self.openai_client.chat.completions.create(
-                model=settings.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a product content generation expert.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=settings.agent_temperature,
-                max_tokens=settings.agent_max_tokens * 2,  # Double for combined output
-                response_format={"type": "json_object"},
-            )
-
-            content_json = parse_llm_json_response(
-                response.choices[0].message.content  # type:ignore
-            )
+            content_json = parse_llm_json_response(content)  # type:ignore
 
             if content_json:
-                # Extract all 4 components
-                state["name_pattern"] = content_json.get("name_pattern", "")
-                state["product_summary"] = content_json.get("product_summary", "")
-                state["product_description"] = content_json.get(
-                    "product_description", ""
-                )
+                self.apply_product_content(state, content_json)
 
-                # Process keywords
-                keywords = content_json.get("keywords", [])
-                if isinstance(keywords, list):
-                    keywords = clean_keywords(keywords)
-                    if not validate_keyword_count(
-                        keywords, settings.keyword_count_min, settings.keyword_count_max
-                    ):
-                        logger.warning(
-                            f"Keyword count {len(keywords)} outside range {settings.keyword_count_min}-{settings.keyword_count_max}"
-                        )
-                        if len(keywords) < settings.keyword_count_min:
-                            keywords.extend(
-                                [
-                                    f"keyword_{i}"
-                                    for i in range(
-                                        len(keywords), settings.keyword_count_min
-                                    )
-                                ]
-                            )
-                        elif len(keywords) > settings.keyword_count_max:
-                            keywords = keywords[: settings.keyword_count_max]
-
-                    state["keywords"] = keywords
-                else:
-                    raise ValueError("Keywords must be a list")
-
-                state["processing_steps"].append("Generated all product content")
+                state["processing_steps"].append(
+                    "Generated all product content" + (" (cached)" if cached else "")
+                )
                 logger.info("Generated all product content successfully")
 
                 # Track tokens
-                if hasattr(response, "usage") and response.usage:
-                    state["total_tokens"] += response.usage.total_tokens
+                state["total_tokens"] += total_tokens
+                state["cached_tokens"] += cached_tokens
 
             else:
                 raise ValueError("Failed to parse product content JSON")
 
         except Exception as e:
-            error_msg = f"Error generating product content: {str(e)}"
-            logger.error(error_msg)
-            state["errors"].append(error_msg)
-            # Set defaults
-            state["name_pattern"] = "Unknown Product"
-            state["product_summary"] = "Product information not available"
-            state["product_description"] = "Product information not available"
-            state["keywords"] = ["product"]
+            self.product_content_failed(state, e)
 
         return state
 
+    def classification_request(self, state: AgentState) -> Dict[str, Any]:
+        """Messages and token limit of the combined classification call"""
+        # Get categories and tax categories
+        categories = get_category_hierarchy()
+        tax_categories = state.get("retrieved_tax_categories", [])
+        # A confident Structure Group leaves only the tax code to the LLM;
+        # classify_locally has already looked it up
+        category_known = bool(state["category"].get("main_category"))
+
+        if self.prompt_assembler is not None:
+            prompt, input_tokens = self.prompt_assembler.classification_prompt(
+                state["product_data"],
+                state["keywords"],
+                categories,
+                tax_categories,
+                **({"template": COMBINED_TAX_CODE_PROMPT} if category_known else {}),
+            )
+            logger.info(f"Classification prompt: {input_tokens} input tokens")
+        elif category_known:
+            prompt = get_combined_tax_code_prompt(
+                state["product_info_formatted"],
+                state["keywords"],
+                tax_categories,
+            )
+        else:
+            prompt = get_combined_classification_prompt(
+                state["product_info_formatted"],
+                state["keywords"],
+                categories,
+                tax_categories,
+            )
+        return {
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a medical product classification expert.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": settings.agent_max_tokens,
+        }
+
+    def apply_classification(
+        self, state: AgentState, classification_json: Dict[str, Any]
+    ) -> bool:
+        """
+        Copy a parsed classification response into the state. Returns
+        whether the response chose the category, which is then worth
+        recording with record_category.
+        """
+        # Extract category, unless it came from the Structure Group
+        category_chosen = "category" in classification_json
+        if category_chosen:
+            category_data = classification_json["category"]
+            state["category"] = {
+                "main_category": category_data.get("main_category", ""),
+                "subcategories": category_data.get("subcategories", []),
+            }
+            category_display = f"{category_data.get('main_category', '')} > {', '.join(category_data.get('subcategories', [])[:2])}"
+            logger.info(f"Matched category: {category_display}")
+        elif not state["category"].get("main_category"):
+            raise ValueError("Missing category in response")
+
+        # Extract tax code
+        if "tax_code" in classification_json:
+            tax_data = classification_json["tax_code"]
+            state["tax_code_result"] = TaxCodeResult(
+                tax_code=tax_data.get("tax_code", ""),
+                tax_code_name=tax_data.get("tax_code_name", ""),
+                confidence=tax_data.get("confidence", 0.0),
+                reasoning=tax_data.get("reasoning", ""),
+            )
+            logger.info(
+                f"Suggested tax code: {tax_data.get('tax_code', '')} (confidence: {tax_data.get('confidence', 0.0)})"
+            )
+        else:
+            raise ValueError("Missing tax_code in response")
+        return category_chosen
+
+    def classification_failed(self, state: AgentState, error: Exception):
+        """Record a classification failure and set defaults"""
+        error_msg = f"Error classifying product: {str(error)}"
+        logger.error(error_msg)
+        state["errors"].append(error_msg)
+        # Set defaults, keeping a category learned from the Structure Group
+        if not state["category"].get("main_category"):
+            state["category"] = {
+                "main_category": "Uncategorized",
+                "subcategories": ["General"],
+            }
+        state["tax_code_result"] = TaxCodeResult(
+            tax_code="",
+            tax_code_name="",
+            confidence=0.0,
+            reasoning=f"Error: {str(error)}",
+        )
+
     async def classify_product(self, state: AgentState) -> AgentState:
         """
         Classify product by category AND tax code in one LLM call (OPTIMIZED).
         Combines: category matching + tax code selection
         """
+        if await self.classify_locally(state):
+            return state
+
         try:
             logger.info("Classifying product (category + tax code) in one call...")
 
-            # Get categories and tax categories
-            categories = get_category_hierarchy()
-            tax_categories = state.get("retrieved_tax_categories", [])
-
-            prompt = get_combined_classification_prompt(
-                state["product_info_formatted"],
-                state["keywords"],
-                categories,
-                tax_categories,
-            )
-
-            response = await self.openai_client.chat.completions.create(
-                model=settings.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a medical product classification expert.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=settings.agent_temperature,
-                max_tokens=settings.agent_max_tokens,
-                response_format={"type": "json_object"},
+            (
+                content,
+                total_tokens,
+                cached_tokens,
+                cached,
+            ) = await self._cached_json_completion(
+                "classify_product",
+                **self.classification_request(state),
+                cache_inputs=cache_inputs(
+                    state["product_data"],
+                    keywords=state["keywords"],
+                    tax_categories=[
+                        str(c.get("product_tax_code") or c.get("id"))
+                        for c in state.get("retrieved_tax_categories", [])
+                    ],
+                    category_known=bool(state["category"].get("main_category")),
+                ),
+                use_cache=state.get("use_cache", True),
             )
 
-            classification_json = parse_llm_json_response(
-                response.choices[0].message.content  # type:ignore
-            )
+            classification_json = parse_llm_json_response(content)  # type:ignore
 
             if classification_json:
-                # Extract category
-                if "category" in classification_json:
-                    category_data = classification_json["category"]
-                    state["category"] = {
-                        "main_category": category_data.get("main_category", ""),
-                        "subcategories": category_data.get("subcategories", []),
-                    }
-                    category_display = f"{category_data.get('main_category', '')} > {', '.join(category_data.get('subcategories', [])[:2])}"
-                    logger.info(f"Matched category: {category_display}")
-                else:
-                    raise ValueError("Missing category in response")
-
-                # Extract tax code
-                if "tax_code" in classification_json:
-                    tax_data = classification_json["tax_code"]
-                    state["tax_code_result"] = TaxCodeResult(
-                        tax_code=tax_data.get("tax_code", ""),
-                        tax_code_name=tax_data.get("tax_code_name", ""),
-                        confidence=tax_data.get("confidence", 0.0),
-                        reasoning=tax_data.get("reasoning", ""),
-                    )
-                    logger.info(
-                        f"Suggested tax code: {tax_data.get('tax_code', '')} (confidence: {tax_data.get('confidence', 0.0)})"
-                    )
-                else:
-                    raise ValueError("Missing tax_code in response")
+                if self.apply_classification(state, classification_json):
+                    await self.record_category(state)
+                await self.record_classification(state)
 
                 state["processing_steps"].append(
                     "Classified product (category + tax code)"
+                    + (" (cached)" if cached else "")
                 )
 
                 # Track tokens
-                if hasattr(response, "usage") and response.usage:
-                    state["total_tokens"] += response.usage.total_tokens
+                state["total_tokens"] += total_tokens
+                state["cached_tokens"] += cached_tokens
 
             else:
                 raise ValueError("Failed to parse classification JSON")
 
         except Exception as e:
-            error_msg = f"Error classifying product: {str(e)}"
-            logger.error(error_msg)
-            state["errors"].append(error_msg)
-            # Set defaults
-            state["category"] = {
-                "main_category": "Uncategorized",
-                "subcategories": ["General"],
-            }
-            state["tax_code_result"] = TaxCodeResult(
-                tax_code="",
-                tax_code_name="",
-                confidence=0.0,
-                reasoning=f"Error: {str(e)}",
-            )
+            self.classification_failed(state, e)
 
         return state
+
+    async def adapt_variant_content(
+        self,
+        representative: Dict[str, Any],
+        representative_output: ProductAnalysisOutput,
+        variant: Dict[str, Any],
+        use_cache: bool = True,
+    ) -> Optional[ProductAnalysisOutput]:
+        """
+        Adapt a representative's content to a near-duplicate variant with one
+        small LLM call that returns the new name pattern and keywords plus
+        text replacements for the summary and specification table.
+        Category and tax code carry over; callers reclassify variants whose
+        descriptions differ beyond sizes. Returns None if the response is
+        unusable.
+        """
+        try:
+            prompt = get_variant_delta_prompt(
+                format_product_for_llm(representative),
+                format_product_for_llm(variant),
+                representative_output["name_pattern"],
+                representative_output["keywords"],
+            )
+
+            (
+                content,
+                total_tokens,
+                cached_tokens,
+                _,
+            ) = await self._cached_json_completion(
+                "adapt_variant_content",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a product content generation expert.",
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=settings.agent_max_tokens,
+                cache_inputs=cache_inputs(
+                    variant,
+                    representative=normalized_product_fields(representative),
+                    name_pattern=representative_output["name_pattern"],
+                    keywords=representative_output["keywords"],
+                ),
+                use_cache=use_cache,
+            )
+
+            delta = parse_llm_json_response(content)  # type:ignore
+            if not delta:
+                raise ValueError("Failed to parse variant JSON")
+
+            replacements = delta.get("replacements") or {}
+            if not delta.get("name_pattern") or not isinstance(replacements, dict):
+                raise ValueError("Missing name_pattern or replacements")
+            keywords = self._fit_keywords(
+                variant, clean_keywords(delta.get("keywords") or [])
+            )
+
+            def apply(text: str) -> str:
+                for old, new in replacements.items():
+                    if old:
+                        text = text.replace(str(old), str(new))
+                return text
+
+            output: ProductAnalysisOutput = dict(representative_output)  # type:ignore
+            output["name_pattern"] = delta["name_pattern"]
+            output["keywords"] = keywords
+            output["product_summary"] = apply(representative_output["product_summary"])
+            output["product_description"] = apply(
+                representative_output["product_description"]
+            )
+            output["total_tokens"] = total_tokens
+            output["cached_tokens"] = cached_tokens
+            output["node_timings"] = {}
+            return output
+
+        except Exception as e:
+            logger.warning(f"Could not adapt variant content: {str(e)}")
+            return None
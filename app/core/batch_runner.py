@@ -0,0 +1,394 @@
+import pathlib
+import sys
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from openai import AsyncOpenAI
+from config.config import settings
+from database.vector_db.vector_store import QdrantVectorStore
+from app.core.agent_state import AgentState, ProductAnalysisOutput
+from app.core.product_agent import ProductCategorizationAgent
+from utils.helper import format_product_for_llm, parse_llm_json_response
+from utils.rate_limiter import create_openai_client
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchRunner:
+    """
+    Full-catalog analysis through the OpenAI Batch API.
+
+    Runs the agent's two LLM calls as two batch phases: every product's
+    combined content request is submitted as one batch, and once it
+    completes the classification requests (which need the generated
+    keywords) are submitted as a second one. Progress is checkpointed in
+    ``<run_dir>/state.json`` after every upload, submission and poll, so
+    an interrupted run picks up where it left off without resubmitting.
+    """
+
+    def __init__(
+        self,
+        agent: ProductCategorizationAgent,
+        batch_client: AsyncOpenAI,
+        run_dir: str,
+    ):
+        self.agent = agent
+        self.tools = agent.tools
+        self.batch_client = batch_client
+        self.run_dir = run_dir
+        self.state_path = os.path.join(run_dir, "state.json")
+        self.state: Dict[str, Any] = {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _load_state(self, products: List[Dict[str, Any]]):
+        os.makedirs(self.run_dir, exist_ok=True)
+        fingerprint = hashlib.sha256(
+            json.dumps(products, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r") as f:
+                self.state = json.load(f)
+            if self.state.get("catalog_fingerprint") != fingerprint:
+                raise ValueError(
+                    f"Run directory {self.run_dir} belongs to a different catalog"
+                )
+            logger.info(f"Resuming batch run from {self.state_path}")
+        else:
+            self.state = {
+                "catalog_fingerprint": fingerprint,
+                "model": settings.model_name,
+                "phases": {},
+            }
+            self._save_state()
+
+    def _initial_state(self, product: Dict[str, Any]) -> AgentState:
+        return {
+            "product_data": product,
+            "product_info_formatted": format_product_for_llm(product),
+            "retrieved_tax_categories": [],
+            "available_categories": {},
+            "name_pattern": "",
+            "product_summary": "",
+            "product_description": "",
+            "keywords": [],
+            "category": {"main_category": "", "subcategories": []},
+            "tax_code_result": {
+                "tax_code": "",
+                "tax_code_name": "",
+                "confidence": 0.0,
+                "reasoning": "",
+            },
+            "total_tokens": 0,
+            "cached_tokens": 0,
+            "node_timings": {},
+            "use_cache": False,
+            "errors": [],
+            "processing_steps": [],
+        }  # type:ignore
+
+    async def _retrieve(self, states: List[AgentState]):
+        """Retrieve tax categories for every product, once per run"""
+        path = os.path.join(self.run_dir, "retrieval.json")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                retrieved = json.load(f)
+            for state, results in zip(states, retrieved):
+                state["retrieved_tax_categories"] = results
+            return
+
+        # Live searches of a chunk go out together through search_many
+        chunk_size = settings.search_batch_max_size
+        for start in range(0, len(states), chunk_size):
+            await asyncio.gather(
+                *[
+                    self.tools.retrieve_tax_categories(state)
+                    for state in states[start : start + chunk_size]
+                ]
+            )
+        with open(path, "w") as f:
+            json.dump([state["retrieved_tax_categories"] for state in states], f)
+        logger.info(f"Retrieved tax categories for {len(states)} products")
+
+    def _batch_line(self, custom_id: str, request: Dict[str, Any]) -> str:
+        return json.dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": settings.model_name,
+                    "temperature": settings.agent_temperature,
+                    "response_format": {"type": "json_object"},
+                    **request,
+                },
+            }
+        )
+
+    async def _submit(self, phase: str, batch: Dict[str, Any]):
+        """Upload a chunk's JSONL and create its batch, checkpointing each step"""
+        if not batch.get("input_file_id"):
+            with open(batch["input_path"], "rb") as f:
+                uploaded = await self.batch_client.files.create(
+                    file=(os.path.basename(batch["input_path"]), f.read()),
+                    purpose="batch",
+                )
+            batch["input_file_id"] = uploaded.id
+            self._save_state()
+
+        # A crash between create and checkpoint must not submit twice
+        existing = await self.batch_client.batches.list(limit=100)
+        for submitted in existing.data:
+            if submitted.input_file_id == batch["input_file_id"]:
+                batch["batch_id"] = submitted.id
+                batch["status"] = submitted.status
+                self._save_state()
+                return
+
+        created = await self.batch_client.batches.create(
+            input_file_id=batch["input_file_id"],
+            endpoint="/v1/chat/completions",
+            completion_window=settings.openai_batch_completion_window,
+            metadata={"phase": phase, "run": os.path.basename(self.run_dir)},
+        )
+        batch["batch_id"] = created.id
+        batch["status"] = created.status
+        self._save_state()
+        logger.info(f"Submitted {phase} batch {created.id}")
+
+    async def _download(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        content = await self.batch_client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    async def _run_phase(
+        self, phase: str, requests: List[Tuple[str, Dict[str, Any]]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Submit one phase's requests, wait for its batches and return the
+        results by custom_id: {"content": ..., "total_tokens": ...} or
+        {"error": ...}.
+        """
+        results_path = os.path.join(self.run_dir, f"{phase}_results.json")
+        if os.path.exists(results_path):
+            with open(results_path, "r") as f:
+                return json.load(f)
+
+        phase_state = self.state["phases"].setdefault(phase, {"batches": []})
+        if not phase_state["batches"]:
+            chunk_size = settings.openai_batch_max_requests
+            for start in range(0, len(requests), chunk_size):
+                input_path = os.path.join(
+                    self.run_dir, f"{phase}_{start // chunk_size}.jsonl"
+                )
+                with open(input_path, "w") as f:
+                    for custom_id, request in requests[start : start + chunk_size]:
+                        f.write(self._batch_line(custom_id, request) + "\n")
+                phase_state["batches"].append({"input_path": input_path})
+            self._save_state()
+
+        for batch in phase_state["batches"]:
+            if not batch.get("batch_id"):
+                await self._submit(phase, batch)
+
+        while True:
+            pending = [
+                b
+                for b in phase_state["batches"]
+                if b["status"] not in TERMINAL_STATUSES
+            ]
+            for batch in pending:
+                remote = await self.batch_client.batches.retrieve(batch["batch_id"])
+                batch["status"] = remote.status
+                batch["output_file_id"] = remote.output_file_id
+                batch["error_file_id"] = remote.error_file_id
+                if remote.request_counts:
+                    batch["request_counts"] = remote.request_counts.model_dump()
+                if remote.status == "failed" and remote.errors:
+                    batch["errors"] = [e.message for e in remote.errors.data or []]
+            self._save_state()
+
+            if not any(
+                b["status"] not in TERMINAL_STATUSES for b in phase_state["batches"]
+            ):
+                break
+            logger.info(
+                f"{phase}: waiting on {len(pending)} batch(es): "
+                + ", ".join(f"{b['batch_id']}={b['status']}" for b in pending)
+            )
+            await asyncio.sleep(settings.openai_batch_poll_seconds)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for batch in phase_state["batches"]:
+            if batch["status"] == "failed":
+                raise RuntimeError(
+                    f"{phase} batch {batch['batch_id']} failed: {batch.get('errors')}"
+                )
+            lines = await self._download(batch.get("output_file_id"))
+            lines += await self._download(batch.get("error_file_id"))
+            for line in lines:
+                response = line.get("response") or {}
+                body = response.get("body") or {}
+                if line.get("error") or response.get("status_code") != 200:
+                    results[line["custom_id"]] = {
+                        "error": str(line.get("error") or body.get("error") or body)
+                    }
+                    continue
+                usage = body.get("usage") or {}
+                results[line["custom_id"]] = {
+                    "content": body["choices"][0]["message"]["content"],
+                    "total_tokens": usage.get("total_tokens", 0),
+                    "cached_tokens": (usage.get("prompt_tokens_details") or {}).get(
+                        "cached_tokens", 0
+                    ),
+                }
+
+        with open(results_path, "w") as f:
+            json.dump(results, f)
+        logger.info(
+            f"{phase}: {sum(1 for r in results.values() if 'content' in r)} of "
+            f"{len(requests)} requests succeeded"
+        )
+        return results
+
+    def _apply(self, state: AgentState, result: Optional[Dict[str, Any]], apply):
+        if result is None:
+            raise ValueError("No batch result")
+        if "error" in result:
+            raise ValueError(f"Batch request failed: {result['error']}")
+        parsed = parse_llm_json_response(result["content"])
+        if not parsed:
+            raise ValueError("Failed to parse batch response JSON")
+        applied = apply(state, parsed)
+        state["total_tokens"] += result["total_tokens"]
+        state["cached_tokens"] += result.get("cached_tokens", 0)
+        return applied
+
+    async def run(self, products: List[Dict[str, Any]]) -> List[ProductAnalysisOutput]:
+        self._load_state(products)
+        states = [self._initial_state(product) for product in products]
+
+        await self._retrieve(states)
+
+        content_results = await self._run_phase(
+            "content",
+            [
+                (f"content-{i}", self.tools.product_content_request(state))
+                for i, state in enumerate(states)
+            ],
+        )
+        for i, state in enumerate(states):
+            try:
+                self._apply(
+                    state,
+                    content_results.get(f"content-{i}"),
+                    self.tools.apply_product_content,
+                )
+            except Exception as e:
+                self.tools.product_content_failed(state, e)
+
+        # Products the tax code cascade resolves stay out of the batch
+        resolved = await asyncio.gather(
+            *(self.tools.classify_locally(state) for state in states)
+        )
+        classify_results = await self._run_phase(
+            "classify",
+            [
+                (f"classify-{i}", self.tools.classification_request(state))
+                for i, state in enumerate(states)
+                if not resolved[i]
+            ],
+        )
+        for i, state in enumerate(states):
+            if resolved[i]:
+                continue
+            try:
+                category_chosen = self._apply(
+                    state,
+                    classify_results.get(f"classify-{i}"),
+                    self.tools.apply_classification,
+                )
+                if category_chosen:
+                    await self.tools.record_category(state)
+                await self.tools.record_classification(state)
+            except Exception as e:
+                self.tools.classification_failed(state, e)
+
+        outputs: List[ProductAnalysisOutput] = [
+            {
+                "name_pattern": state["name_pattern"],
+                "product_summary": state["product_summary"],
+                "product_description": state["product_description"],
+                "keywords": state["keywords"],
+                "category": state["category"],
+                "tax_code": state["tax_code_result"]["tax_code"],
+                "tax_code_name": state["tax_code_result"]["tax_code_name"],
+                "tax_code_confidence": state["tax_code_result"]["confidence"],
+                "tax_code_reasoning": state["tax_code_result"]["reasoning"],
+                "total_tokens": state["total_tokens"],
+                "cached_tokens": state["cached_tokens"],
+                "node_timings": {},
+                "topology": "batch",
+            }  # type:ignore
+            for state in states
+        ]
+
+        results_path = os.path.join(self.run_dir, "results.json")
+        with open(results_path, "w") as f:
+            json.dump(
+                [
+                    {"Item Num": product.get("Item Num"), **output}
+                    for product, output in zip(products, outputs)
+                ],
+                f,
+                indent=2,
+            )
+        failed = sum(1 for state in states if state["errors"])
+        logger.info(
+            f"Batch run complete: {len(outputs)} products, {failed} with errors, "
+            f"results in {results_path}"
+        )
+        return outputs
+
+
+async def run_catalog_batch(run_name: str = "catalog", catalog_file: str = ""):
+    """Analyze a catalog file through the Batch API (resumable by run_name)"""
+    catalog_file = catalog_file or settings.CATALOG_FILE
+    with open(catalog_file, "r") as f:
+        products = json.load(f)
+
+    openai_client = create_openai_client()
+    batch_client = AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.openai_batch_base_url,
+        max_retries=5,
+    )
+    vector_store = QdrantVectorStore(openai_client=openai_client)
+    agent = ProductCategorizationAgent(openai_client, vector_store)
+    try:
+        runner = BatchRunner(
+            agent, batch_client, os.path.join(settings.BATCH_RUNS_DIR, run_name)
+        )
+        await runner.run(products)
+    finally:
+        await agent.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(run_catalog_batch(*sys.argv[1:3]))
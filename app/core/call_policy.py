@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _NodeStats:
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.errors = 0
+        self.fallback_calls = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class NodeCallPolicy:
+    """
+    Deadlines, hedging and model fallback for the agent's LLM calls.
+
+    Every attempt of a node's call has ``timeout_seconds`` to finish. Once
+    an attempt has run longer than the node's recent p95 latency (or
+    ``initial_hedge_delay`` until ``min_samples`` calls were seen), an
+    identical hedged request is sent and whichever answers first wins.
+    Timed-out attempts are retried up to ``max_attempts`` in total. After
+    ``fallback_after_timeouts`` consecutive timeouts of the primary model
+    the node switches to ``fallback_model`` for ``fallback_cooldown_seconds``.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        timeout_seconds: float = 30.0,
+        max_attempts: int = 2,
+        hedge_enabled: bool = True,
+        min_hedge_delay: float = 2.0,
+        initial_hedge_delay: float = 10.0,
+        min_samples: int = 20,
+        fallback_model: Optional[str] = None,
+        fallback_after_timeouts: int = 3,
+        fallback_cooldown_seconds: float = 300.0,
+        window: int = 500,
+    ):
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.hedge_enabled = hedge_enabled
+        self.min_hedge_delay = min_hedge_delay
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_samples = min_samples
+        self.fallback_model = fallback_model
+        self.fallback_after_timeouts = fallback_after_timeouts
+        self.fallback_cooldown_seconds = fallback_cooldown_seconds
+        self.window = window
+
+        self._nodes: Dict[str, _NodeStats] = {}
+        self._consecutive_timeouts: Dict[str, int] = {}
+        self._fallback_until: Dict[str, float] = {}
+
+    def _stats(self, node: str) -> _NodeStats:
+        if node not in self._nodes:
+            self._nodes[node] = _NodeStats(self.window)
+        return self._nodes[node]
+
+    def hedge_delay(self, node: str) -> float:
+        stats = self._stats(node)
+        if len(stats.latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, stats.percentile(0.95))  # type:ignore
+
+    def current_model(self, node: str) -> str:
+        if self.fallback_model and time.monotonic() < self._fallback_until.get(
+            node, 0.0
+        ):
+            return self.fallback_model
+        return self.model
+
+    def record_timeout(self, node: str, model: str):
+        """Count a timeout, switching the node to the fallback model if due"""
+        stats = self._stats(node)
+        stats.timeouts += 1
+        if model != self.model or not self.fallback_model:
+            return
+        count = self._consecutive_timeouts.get(node, 0) + 1
+        self._consecutive_timeouts[node] = count
+        if count >= self.fallback_after_timeouts:
+            self._consecutive_timeouts[node] = 0
+            self._fallback_until[node] = (
+                time.monotonic() + self.fallback_cooldown_seconds
+            )
+            logger.warning(
+                f"{node}: {count} consecutive timeouts on {self.model}, using "
+                f"{self.fallback_model} for {self.fallback_cooldown_seconds:.0f}s"
+            )
+
+    async def _attempt(
+        self, node: str, model: str, request: Callable[[str], Awaitable[Any]]
+    ) -> Any:
+        """One deadline-bound attempt, hedged once it outlives the hedge delay"""
+        stats = self._stats(node)
+        started: Dict[asyncio.Task, float] = {}
+
+        def launch() -> asyncio.Task:
+            task = asyncio.ensure_future(request(model))
+            started[task] = time.monotonic()
+            return task
+
+        primary = launch()
+        pending = {primary}
+        deadline = time.monotonic() + self.timeout_seconds
+        hedge_at = time.monotonic() + self.hedge_delay(node)
+        hedged = not self.hedge_enabled
+        error: Optional[BaseException] = None
+
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise asyncio.TimeoutError()
+                wake = deadline if hedged else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(
+                    pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        stats.latencies.append(time.monotonic() - started[task])
+                        if task is not primary:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                if not hedged and time.monotonic() >= hedge_at and pending:
+                    hedged = True
+                    stats.hedges += 1
+                    logger.info(f"{node}: no response after the hedge delay, hedging")
+                    pending.add(launch())
+            raise error  # type:ignore
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
+
+    async def call(
+        self, node: str, request: Callable[[str], Awaitable[Any]]
+    ) -> Tuple[Any, str]:
+        """
+        Run ``request(model)`` under the node's policy.
+
+        Returns the response and the model that produced it. Raises
+        asyncio.TimeoutError when every attempt timed out. Losing attempts
+        are cancelled or their results dropped, so ``request`` should
+        release anything it opens (such as a stream) before returning.
+        """
+        stats = self._stats(node)
+        stats.calls += 1
+        for attempt in range(self.max_attempts):
+            model = self.current_model(node)
+            if model != self.model:
+                stats.fallback_calls += 1
+            if attempt:
+                stats.retries += 1
+            try:
+                response = await self._attempt(node, model, request)
+            except asyncio.TimeoutError:
+                self.record_timeout(node, model)
+                logger.warning(
+                    f"{node}: {model} timed out after {self.timeout_seconds:.1f}s "
+                    f"(attempt {attempt + 1}/{self.max_attempts})"
+                )
+                continue
+            except Exception:
+                stats.errors += 1
+                raise
+            if model == self.model:
+                self._consecutive_timeouts[node] = 0
+            return response, model
+
+        raise asyncio.TimeoutError(
+            f"{node} timed out {self.max_attempts} times after "
+            f"{self.timeout_seconds:.1f}s each"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            node: {
+                "calls": stats.calls,
+                "p50_seconds": (
+                    round(stats.percentile(0.5), 3) if stats.latencies else None
+                ),
+                "p95_seconds": (
+                    round(stats.percentile(0.95), 3) if stats.latencies else None
+                ),
+                "hedge_delay_seconds": round(self.hedge_delay(node), 3),
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+                "timeouts": stats.timeouts,
+                "retries": stats.retries,
+                "errors": stats.errors,
+                "fallback_calls": stats.fallback_calls,
+                "model": self.current_model(node),
+            }
+            for node, stats in self._nodes.items()
+        }
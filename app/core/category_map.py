@@ -0,0 +1,217 @@
+import pathlib
+import sys
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+from utils.helper import product_fingerprint
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_CATEGORIES = ("", "uncategorized")
+
+
+def _field(product_data: Dict[str, Any], name: str) -> Any:
+    # API products use underscores, catalog and batch products use spaces
+    return product_data.get(name) or product_data.get(name.replace(" ", "_"))
+
+
+def _group_key(structure_group: Any) -> str:
+    return " ".join(str(structure_group or "").split()).lower()
+
+
+class CategoryMap:
+    """
+    Structure Group -> category mapping learned from past analyses.
+
+    The category the LLM assigns to each product is stored in SQLite with
+    the product's Structure Group; analysing a product again replaces its
+    earlier category, so support counts distinct products. A group is
+    confident once it has at least ``min_support`` products and its most
+    frequent (main_category, subcategories) pair accounts for at least
+    ``min_agreement`` of them; confident groups get that category without
+    asking the LLM. Categories assigned from the map are not recorded, so
+    the map never confirms itself.
+    """
+
+    def __init__(self, path: str, min_support: int = 20, min_agreement: float = 0.9):
+        self.path = path
+        self.min_support = min_support
+        self.min_agreement = min_agreement
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS product_categories (
+                product_key TEXT PRIMARY KEY,
+                structure_group TEXT NOT NULL,
+                main_category TEXT NOT NULL,
+                subcategories TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self._conn.commit()
+
+        self._products: Dict[str, Tuple[str, Tuple[str, str]]] = {}
+        self._counts: Dict[str, Counter] = {}
+        for key, group, main_category, subcategories in self._conn.execute(
+            "SELECT product_key, structure_group, main_category, subcategories FROM product_categories"
+        ):
+            self._products[key] = (group, (main_category, subcategories))
+            self._counts.setdefault(group, Counter())[
+                (main_category, subcategories)
+            ] += 1
+
+    def _mapping(self, group: str) -> Optional[Tuple[Tuple[str, str], int, int]]:
+        """Most frequent category of a group, its count and the group's support"""
+        counts = self._counts.get(group)
+        if not counts:
+            return None
+        category, count = max(counts.items(), key=lambda item: (item[1], item[0]))
+        return category, count, sum(counts.values())
+
+    def _confident(self, count: int, support: int) -> bool:
+        return support >= self.min_support and count / support >= self.min_agreement
+
+    def lookup(self, product_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The learned category of a product's group, None unless confident"""
+        with self._lock:
+            mapping = self._mapping(_group_key(_field(product_data, "Structure Group")))
+            if mapping is None or not self._confident(mapping[1], mapping[2]):
+                self.misses += 1
+                return None
+            self.hits += 1
+            main_category, subcategories = mapping[0]
+            return {
+                "main_category": main_category,
+                "subcategories": json.loads(subcategories),
+            }
+
+    def record(self, product_data: Dict[str, Any], category: Dict[str, Any]):
+        """Store the LLM-assigned category of a product"""
+        group = _group_key(_field(product_data, "Structure Group"))
+        main_category = str(category.get("main_category") or "").strip()
+        if not group or main_category.lower() in UNKNOWN_CATEGORIES:
+            return
+        key = str(_field(product_data, "Item Num") or product_fingerprint(product_data))
+        value = (
+            main_category,
+            json.dumps(sorted(str(sub) for sub in category.get("subcategories") or [])),
+        )
+        with self._lock:
+            previous = self._products.get(key)
+            if previous == (group, value):
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO product_categories (product_key, structure_group, main_category, subcategories, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (key, group, value[0], value[1], time.time()),
+            )
+            self._conn.commit()
+            if previous is not None:
+                self._counts[previous[0]][previous[1]] -= 1
+                if self._counts[previous[0]][previous[1]] <= 0:
+                    del self._counts[previous[0]][previous[1]]
+            self._products[key] = (group, value)
+            self._counts.setdefault(group, Counter())[value] += 1
+            self.recorded += 1
+
+    def groups(self) -> List[Dict[str, Any]]:
+        """Learned mapping of every group with its support and agreement"""
+        with self._lock:
+            rows = []
+            for group in sorted(self._counts):
+                mapping = self._mapping(group)
+                if mapping is None:
+                    continue
+                (main_category, subcategories), count, support = mapping
+                rows.append(
+                    {
+                        "structure_group": group,
+                        "main_category": main_category,
+                        "subcategories": json.loads(subcategories),
+                        "support": support,
+                        "agreement": round(count / support, 4),
+                        "confident": self._confident(count, support),
+                    }
+                )
+            return rows
+
+    def stats(self) -> Dict[str, Any]:
+        groups = self.groups()
+        confident = [group for group in groups if group["confident"]]
+        lookups = self.hits + self.misses
+        return {
+            "groups": len(groups),
+            "confident_groups": len(confident),
+            "products": len(self._products),
+            "confident_products": sum(group["support"] for group in confident),
+            "min_support": self.min_support,
+            "min_agreement": self.min_agreement,
+            "recorded": self.recorded,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def learn_from_batch_runs(
+    category_map: CategoryMap, runs_dir: str = "", catalog_file: str = ""
+) -> int:
+    """
+    Record the categories of finished batch runs, joined to the catalog's
+    Structure Groups by Item Num. Returns the number of products recorded.
+    """
+    runs_dir = runs_dir or settings.BATCH_RUNS_DIR
+    catalog_file = catalog_file or settings.CATALOG_FILE
+    with open(catalog_file, "r") as f:
+        products = {str(product.get("Item Num")): product for product in json.load(f)}
+
+    recorded = 0
+    for results_path in sorted(glob.glob(os.path.join(runs_dir, "*", "results.json"))):
+        with open(results_path, "r") as f:
+            results = json.load(f)
+        # Later runs replace the categories of earlier ones
+        for result in results:
+            product = products.get(str(result.get("Item Num")))
+            if product is not None and result.get("category"):
+                category_map.record(product, result["category"])
+                recorded += 1
+        logger.info(f"Learned categories from {results_path}")
+    return recorded
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    category_map = CategoryMap(
+        settings.CATEGORY_MAP_FILE,
+        min_support=settings.category_map_min_support,
+        min_agreement=settings.category_map_min_agreement,
+    )
+    recorded = learn_from_batch_runs(category_map, *sys.argv[1:3])
+    stats = category_map.stats()
+    logger.info(
+        f"Recorded {recorded} batch results: {stats['confident_groups']} of "
+        f"{stats['groups']} structure groups are confident"
+    )
+    category_map.close()
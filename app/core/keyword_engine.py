@@ -0,0 +1,308 @@
+import pathlib
+import sys
+import os
+import json
+import math
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+from utils.helper import parse_specifications
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+SEGMENT_PATTERN = re.compile(r"[,;:()/|\n•.!?]+|\s-\s")
+
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has have in is it its of on or that the
+    this to with without per use used using into your our you can may will
+    each all any not no than more most other only such very also which who
+    """.split())
+
+# Units of measure and packaging abbreviations that make poor keywords
+PACKAGING_WORDS = frozenset(
+    "ea bx cs pk dz ct cn bg bt pr rl tb kt st vl sz onesz case box pack each".split()
+)
+
+CORPORATE_SUFFIXES = re.compile(
+    r"\b(?:inc|llc|ltd|co|corp|corporation|company|companies|us|usa|lp|plc)\b\.?",
+    re.IGNORECASE,
+)
+
+# Text fields with the weight of their terms when scoring a product
+FIELD_WEIGHTS = (
+    ("Item Desc Full", 1.5),
+    ("Item Desc Short", 1.0),
+    ("Structure Group", 2.0),
+)
+FEATURE_WEIGHT = 1.0
+MAX_NGRAM = 3
+
+# Catalog products a phrase of n words must appear in to be a keyword
+MIN_PHRASE_FREQUENCY = {2: 2, 3: 3}
+
+# Characteristic keywords kept per Structure Group, for sparse products
+GROUP_KEYWORDS = 30
+
+
+def _field(product_data: Dict[str, Any], name: str) -> str:
+    value = product_data.get(name) or product_data.get(name.replace(" ", "_"))
+    return str(value).strip() if value else ""
+
+
+def _usable(word: str) -> bool:
+    return (
+        len(word) > 1
+        and word not in STOPWORDS
+        and word not in PACKAGING_WORDS
+        and any(char.isalpha() for char in word)
+    )
+
+
+def ngrams(text: str, max_n: int = MAX_NGRAM) -> Iterable[str]:
+    """
+    Word n-grams of text that neither cross punctuation nor start or end
+    with a stopword. Words without letters (sizes, counts) break phrases.
+    """
+    for segment in SEGMENT_PATTERN.split(text.lower()):
+        words = TOKEN_PATTERN.findall(segment)
+        for i in range(len(words)):
+            for n in range(1, max_n + 1):
+                gram = words[i : i + n]
+                if len(gram) < n:
+                    break
+                if not any(char.isalpha() for char in gram[-1]):
+                    break
+                if _usable(gram[0]) and _usable(gram[-1]):
+                    yield " ".join(gram)
+
+
+def product_texts(product_data: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """Weighted text fields of a product used for keywords"""
+    texts = [(_field(product_data, name), weight) for name, weight in FIELD_WEIGHTS]
+    texts.extend(
+        (feature, FEATURE_WEIGHT) for feature in parse_specifications(product_data)
+    )
+    return [(text, weight) for text, weight in texts if text]
+
+
+class KeywordEngine:
+    """
+    TF-IDF keyword generator trained on the product catalog.
+
+    Training counts in how many catalog products each 1-3 word phrase
+    appears. A product's keywords are its own phrases ranked by weighted
+    term frequency times inverse document frequency, so words that name
+    this product score above words shared by the whole catalog. Phrases of
+    two or more words are only kept if they recur across the catalog.
+    Products with too little text of their own are topped up with the
+    characteristic keywords of their Structure Group. Results are
+    deterministic and need no LLM call.
+    """
+
+    def __init__(
+        self,
+        document_frequency: Optional[Dict[str, int]] = None,
+        documents: int = 0,
+        group_keywords: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.document_frequency = document_frequency or {}
+        self.documents = documents
+        self.group_keywords = group_keywords or {}
+
+    @classmethod
+    def train(cls, products: List[Dict[str, Any]]) -> "KeywordEngine":
+        document_frequency: Counter = Counter()
+        group_frequency: Dict[str, Counter] = {}
+        for product in products:
+            grams = set()
+            for text, _ in product_texts(product):
+                grams.update(ngrams(text))
+            document_frequency.update(grams)
+            group = _field(product, "Structure Group").lower()
+            if group:
+                group_frequency.setdefault(group, Counter()).update(grams)
+
+        # Phrases seen once carry no more information than the default
+        engine = cls(
+            {gram: df for gram, df in document_frequency.items() if df > 1},
+            len(products),
+        )
+        for group, frequency in group_frequency.items():
+            ranked = sorted(
+                (
+                    (count * engine.idf(gram), gram)
+                    for gram, count in frequency.items()
+                    if count > 1 and engine._keyword_like(gram)
+                ),
+                key=lambda item: (-item[0], item[1]),
+            )
+            engine.group_keywords[group] = [
+                gram for _, gram in ranked[:GROUP_KEYWORDS] if gram != group
+            ]
+        return engine
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordEngine":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(
+            data["document_frequency"],
+            data["documents"],
+            data.get("group_keywords"),
+        )
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "documents": self.documents,
+                    "document_frequency": self.document_frequency,
+                    "group_keywords": self.group_keywords,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+
+    def idf(self, gram: str) -> float:
+        df = self.document_frequency.get(gram, 1)
+        return math.log((1 + self.documents) / (1 + df)) + 1
+
+    def _keyword_like(self, gram: str) -> bool:
+        """Whether a phrase is specific enough to stand alone as a keyword"""
+        words = gram.count(" ") + 1
+        if words == 1:
+            return len(gram) >= 3 and not gram[0].isdigit()
+        return (
+            not self.documents
+            or self.document_frequency.get(gram, 1) >= MIN_PHRASE_FREQUENCY[words]
+        )
+
+    def keywords(
+        self,
+        product_data: Dict[str, Any],
+        count: int,
+        exclude: Iterable[str] = (),
+    ) -> List[str]:
+        """
+        Top ``count`` keywords of a product, skipping ``exclude``.
+
+        Fewer are returned only when neither the product's own text nor
+        its Structure Group offer enough distinct phrases.
+        """
+        scores: Counter = Counter()
+        for text, weight in product_texts(product_data):
+            for gram in ngrams(text):
+                scores[gram] += weight * (1 + 0.5 * gram.count(" "))
+
+        ranked = sorted(
+            ((score * self.idf(gram), gram) for gram, score in scores.items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+        preferred = [gram for _, gram in ranked if self._keyword_like(gram)]
+
+        # Vendor and product group lead, as a shopper would search for them
+        leading = []
+        vendor = CORPORATE_SUFFIXES.sub(" ", _field(product_data, "Vendor Name"))
+        vendor = " ".join(vendor.split()).lower()
+        if vendor:
+            leading.append(vendor)
+        group = _field(product_data, "Structure Group").lower()
+        if group:
+            leading.append(group)
+
+        seen = {keyword.strip().lower() for keyword in exclude}
+        phrases = [set(keyword.split()) for keyword in seen if " " in keyword]
+        result: List[str] = []
+        skipped: List[str] = []
+        for keyword in leading + preferred:
+            if len(result) >= count:
+                return result
+            if keyword in seen:
+                continue
+            # Skip reordered phrases and phrases that only shift a chosen
+            # phrase by a word
+            words = set(keyword.split())
+            if len(words) > 1 and any(
+                words == phrase
+                or (words & phrase and not (words <= phrase or phrase <= words))
+                for phrase in phrases
+            ):
+                skipped.append(keyword)
+                continue
+            seen.add(keyword)
+            result.append(keyword)
+            if len(words) > 1:
+                phrases.append(words)
+
+        # Sparse product: take what was held back, then its group's keywords
+        fallback = (
+            skipped
+            + [gram for _, gram in ranked if not self._keyword_like(gram)]
+            + self.group_keywords.get(group, [])
+        )
+        for keyword in fallback:
+            if len(result) >= count:
+                break
+            if keyword not in seen:
+                seen.add(keyword)
+                result.append(keyword)
+        return result
+
+    def fill(
+        self, product_data: Dict[str, Any], keywords: List[str], min_count: int
+    ) -> List[str]:
+        """Extend keywords to at least min_count with local keywords"""
+        if len(keywords) >= min_count:
+            return keywords
+        return keywords + self.keywords(
+            product_data, min_count - len(keywords), exclude=keywords
+        )
+
+
+def load_keyword_engine(path: str = "", catalog_file: str = "") -> KeywordEngine:
+    """
+    Keyword engine from the trained model file, trained on the fly from the
+    catalog when there is no model yet, or untrained (term frequency only)
+    when neither exists.
+    """
+    path = path or settings.KEYWORD_MODEL_FILE
+    catalog_file = catalog_file or settings.CATALOG_FILE
+    if os.path.exists(path):
+        engine = KeywordEngine.load(path)
+        logger.info(f"Loaded keyword model trained on {engine.documents} products")
+        return engine
+    if os.path.exists(catalog_file):
+        with open(catalog_file, "r") as f:
+            engine = KeywordEngine.train(json.load(f))
+        logger.info(f"Trained keyword model on {engine.documents} catalog products")
+        return engine
+    logger.warning("No keyword model or catalog found, using untrained keywords")
+    return KeywordEngine()
+
+
+def train_keyword_model(catalog_file: str = "", path: str = ""):
+    """Train the keyword model on the catalog and store it"""
+    catalog_file = catalog_file or settings.CATALOG_FILE
+    path = path or settings.KEYWORD_MODEL_FILE
+    with open(catalog_file, "r") as f:
+        products = json.load(f)
+    engine = KeywordEngine.train(products)
+    engine.save(path)
+    logger.info(
+        f"Stored keyword model ({len(engine.document_frequency)} phrases from "
+        f"{engine.documents} products) in {path}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    train_keyword_model(*sys.argv[1:3])
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM responses.
+
+    Entries are keyed by a hash of the node name, prompt template version,
+    model, sampling parameters and the call's inputs (the normalized product
+    fields plus whatever else the prompt is built from), so any change to
+    the product, the prompts or the model misses the cache while prompt
+    rendering and field formatting don't. Entries expire
+    after ``ttl_seconds`` and the file is trimmed back to ``max_entries`` by
+    least-recent access.
+    """
+
+    def __init__(
+        self, path: str, max_entries: int = 50_000, ttl_seconds: float = 604_800
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                node TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                total_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_access ON llm_responses(last_access)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute(
+            "SELECT COUNT(*) FROM llm_responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(
+        node: str,
+        prompt_version: str,
+        model: str,
+        inputs: Dict[str, Any],
+        **params: Any,
+    ) -> str:
+        material = json.dumps(
+            {
+                "node": node,
+                "prompt_version": prompt_version,
+                "model": model,
+                "inputs": inputs,
+                "params": params,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """Cached (response, total_tokens) for a key, None when missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, total_tokens, created_at FROM llm_responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            now = time.time()
+            if row is not None and now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._count -= 1
+                self.expired += 1
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            self.tokens_saved += row[1]
+            return row[0], row[1]
+
+    def put(self, key: str, node: str, model: str, response: str, total_tokens: int):
+        """Store a response, evicting the least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, node, model, response, total_tokens, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, node, model, response, total_tokens, now, now),
+            )
+            self._count = self._conn.execute(
+                "SELECT COUNT(*) FROM llm_responses"
+            ).fetchone()[0]
+            if self._count > self.max_entries:
+                overflow = self._count - self.max_entries
+                self._conn.execute(
+                    """
+                    DELETE FROM llm_responses WHERE key IN (
+                        SELECT key FROM llm_responses ORDER BY last_access ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,),
+                )
+                self._count -= overflow
+                self.evictions += overflow
+                logger.info(f"Evicted {overflow} LLM responses from cache {self.path}")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "tokens_saved": self.tokens_saved,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,14 +1,85 @@
+import asyncio
+import functools
 import logging
-from typing import Dict, Any
+import statistics
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from openai import AsyncOpenAI
-from database.vector_db.vector_store import QdrantVectorStore
+from database.vector_db.vector_store import (
+    QdrantVectorStore,
+    TAX_CATEGORY_TEXT_FIELDS,
+)
+from database.vector_db.local_index import LocalVectorIndex
+from database.vector_db.lexical_index import BM25Index
+from database.vector_db.hybrid_search import HybridRetriever
+from database.vector_db.candidate_table import TaxCandidateTable
+from database.vector_db.retrieval_cache import GroupRetrievalCache
+from database.vector_db.micro_batcher import SearchBatcher
 from app.core.agent_state import AgentState, ProductAnalysisOutput
-from app.core.agent_tools import ProductAgentTools
+from app.core.agent_tools import ProductAgentTools, search_payload_fields
+from app.core.llm_cache import LLMResponseCache
+from app.core.call_policy import NodeCallPolicy
+from app.core.keyword_engine import load_keyword_engine
+from app.core.category_map import CategoryMap
+from app.core.tax_cascade import TaxCodeCascade
+from utils.prompt_budget import PromptAssembler
+from app.core.variant_grouping import (
+    MinHashLSH,
+    derive_variant_output,
+    group_near_duplicates,
+    same_masked_descriptions,
+)
+from utils.helper import format_product_for_llm, load_tax_categories
+from utils.rate_limiter import create_openai_client
 from config.config import settings
 
 logger = logging.getLogger(__name__)
 
+TOPOLOGIES = ("serial", "parallel", "fanout", "pipelined")
+
+# Keys every node returns as its own contribution rather than the full value
+_ACCUMULATED_KEYS = (
+    "errors",
+    "processing_steps",
+    "total_tokens",
+    "cached_tokens",
+    "node_timings",
+)
+
+# State keys that map onto ProductAnalysisOutput fields
+_OUTPUT_KEYS = (
+    "name_pattern",
+    "product_summary",
+    "product_description",
+    "keywords",
+    "category",
+)
+
+
+def node_output_fields(update: Dict[str, Any]) -> Dict[str, Any]:
+    """The ProductAnalysisOutput fields contained in a node's state update"""
+    fields = {key: update[key] for key in _OUTPUT_KEYS if key in update}
+    if "tax_code_result" in update:
+        result = update["tax_code_result"]
+        fields["tax_code"] = result["tax_code"]
+        fields["tax_code_name"] = result["tax_code_name"]
+        fields["tax_code_confidence"] = result["confidence"]
+        fields["tax_code_reasoning"] = result["reasoning"]
+    return fields
+
 
 class ProductCategorizationAgent:
     """
@@ -26,36 +97,476 @@ class ProductCategorizationAgent:
     def __init__(self, openai_client: AsyncOpenAI, vector_store: QdrantVectorStore):
         self.openai_client = openai_client
         self.vector_store = vector_store
-        self.tools = ProductAgentTools(openai_client, vector_store)
-        self.graph = self._build_graph()
+        self.retriever = self._build_retriever(vector_store)
+        self.candidate_table = self._load_candidate_table()
+        self.retrieval_cache = (
+            GroupRetrievalCache(
+                max_entries=settings.retrieval_cache_max_entries,
+                ttl_seconds=settings.retrieval_cache_ttl_seconds,
+                similarity_threshold=settings.retrieval_cache_similarity,
+            )
+            if settings.retrieval_cache_enabled
+            else None
+        )
+        self.search_batcher = (
+            SearchBatcher(
+                functools.partial(
+                    self.retriever.search_many,
+                    settings.collection_name,
+                    top_k=settings.retrieval_top_k,
+                    payload_fields=search_payload_fields(),
+                ),
+                max_batch_size=settings.search_batch_max_size,
+                max_wait_ms=settings.search_batch_max_wait_ms,
+            )
+            if settings.search_batch_enabled
+            else None
+        )
+        self.llm_cache = (
+            LLMResponseCache(
+                settings.LLM_RESPONSE_CACHE,
+                max_entries=settings.llm_cache_max_entries,
+                ttl_seconds=settings.llm_cache_ttl_seconds,
+            )
+            if settings.llm_cache_enabled
+            else None
+        )
+        self.prompt_assembler = (
+            PromptAssembler(
+                content_budget=settings.prompt_budget_content_tokens,
+                classification_budget=settings.prompt_budget_classification_tokens,
+                model=settings.model_name,
+            )
+            if settings.prompt_budget_enabled
+            else None
+        )
+        self.call_policy = (
+            NodeCallPolicy(
+                settings.model_name,
+                timeout_seconds=settings.node_timeout_seconds,
+                max_attempts=settings.node_max_attempts,
+                hedge_enabled=settings.hedge_enabled,
+                min_hedge_delay=settings.hedge_min_delay_seconds,
+                initial_hedge_delay=settings.hedge_initial_delay_seconds,
+                fallback_model=settings.fallback_model_name,
+                fallback_after_timeouts=settings.fallback_after_timeouts,
+                fallback_cooldown_seconds=settings.fallback_cooldown_seconds,
+            )
+            if settings.node_call_policy_enabled
+            else None
+        )
+        self.keyword_engine = load_keyword_engine()
+        self.category_map = (
+            CategoryMap(
+                settings.CATEGORY_MAP_FILE,
+                min_support=settings.category_map_min_support,
+                min_agreement=settings.category_map_min_agreement,
+            )
+            if settings.category_map_enabled
+            else None
+        )
+        self.tax_cascade = (
+            TaxCodeCascade(
+                settings.TAX_CASCADE_FILE,
+                vector_store.embed_query,
+                model=vector_store.embedding_model,
+                k=settings.tax_cascade_k,
+                min_similarity=settings.tax_cascade_min_similarity,
+                min_margin=settings.tax_cascade_min_margin,
+                min_neighbors=settings.tax_cascade_min_neighbors,
+            )
+            if settings.tax_cascade_enabled
+            else None
+        )
+        self.tools = ProductAgentTools(
+            openai_client,
+            self.retriever,  # type:ignore
+            self.candidate_table,
+            self.retrieval_cache,
+            self.llm_cache,
+            self.prompt_assembler,
+            self.call_policy,
+            self.keyword_engine,
+            self.category_map,
+            self.tax_cascade,
+            self.search_batcher,
+        )
+        self.graphs = {topology: self._build_graph(topology) for topology in TOPOLOGIES}
+        self.graph = self.graphs[self._resolve_topology(settings.graph_topology)]
+        self.topology_latencies: Dict[str, Deque[float]] = {
+            topology: deque(maxlen=200) for topology in TOPOLOGIES
+        }
+
+    def _build_retriever(self, vector_store: QdrantVectorStore):
+        """Pick the search backend used by the retrieval node"""
+        retriever = vector_store
+        if settings.local_index_enabled:
+            logger.info("Using in-process local index for tax category search")
+            retriever = LocalVectorIndex(
+                vector_store, settings.collection_name, settings.LOCAL_INDEX_DIR
+            )
 
-    def _build_graph(self) -> StateGraph:
-        """Build the OPTIMIZED LangGraph workflow (2 LLM calls instead of 6)"""
+        if settings.retrieval_mode in ("hybrid", "lexical"):
+            logger.info(f"Using {settings.retrieval_mode} tax category retrieval")
+            lexical_index = BM25Index(
+                load_tax_categories(settings.TAX_CATEGORIES_FILE),
+                text_fields=TAX_CATEGORY_TEXT_FIELDS,
+            )
+            retriever = HybridRetriever(
+                retriever,
+                settings.collection_name,
+                lexical_index,
+                mode=settings.retrieval_mode,
+            )
 
-        workflow = StateGraph(AgentState)
+        return retriever
 
-        workflow.add_node("retrieve_tax_categories", self.tools.retrieve_tax_categories)
-        workflow.add_node(
-            "generate_product_content", self.tools.generate_product_content
+    def _load_candidate_table(self):
+        """Load the offline tax candidate table when enabled"""
+        if not settings.candidate_table_enabled:
+            return None
+        if settings.retrieval_mode != "dense":
+            logger.warning(
+                f"Tax candidate table holds dense search results; not using it "
+                f"with {settings.retrieval_mode} retrieval"
+            )
+            return None
+        table = TaxCandidateTable.load(
+            settings.CANDIDATE_TABLE_FILE,
+            load_tax_categories(settings.TAX_CATEGORIES_FILE),
         )
-        workflow.add_node("classify_product", self.tools.classify_product)
+        if table is None:
+            return None
+
+        # A table built for another model or collection has stale candidates
+        expected = {
+            "embedding_model": self.vector_store.embedding_model,
+            "collection_name": settings.collection_name,
+        }
+        for key, value in expected.items():
+            if table.metadata.get(key) != value:
+                logger.warning(
+                    f"Tax candidate table was built with {key}="
+                    f"{table.metadata.get(key)!r}, not {value!r}; rerun "
+                    f"precompute_candidates.py. Using live search"
+                )
+                return None
+        if (table.metadata.get("top_k") or 0) < settings.retrieval_top_k:
+            logger.warning(
+                f"Tax candidate table stores top_k={table.metadata.get('top_k')}, "
+                f"fewer than retrieval_top_k={settings.retrieval_top_k}. Using live search"
+            )
+            return None
+        return table
+
+    def _node(
+        self, name: str, fn: Callable[[AgentState], Awaitable[AgentState]]
+    ) -> Callable[[AgentState], Awaitable[Dict[str, Any]]]:
+        """
+        Wrap a tool so it returns only the keys it changed.
+
+        Tools mutate and return the whole state; parallel branches may only
+        write disjoint keys, and errors, steps, tokens and timings are merged
+        by reducers, so each node reports just its own contribution.
+        """
+
+        async def node(state: AgentState) -> Dict[str, Any]:
+            local: AgentState = dict(state)  # type:ignore
+            local["errors"] = []
+            local["processing_steps"] = []
+            local["total_tokens"] = 0
+            local["cached_tokens"] = 0
+            local["node_timings"] = {}
+
+            started = time.perf_counter()
+            local = await fn(local)
+            elapsed = time.perf_counter() - started
+
+            update = {
+                key: value
+                for key, value in local.items()
+                if key not in _ACCUMULATED_KEYS and value != state.get(key)
+            }
+            update["errors"] = local["errors"]
+            update["processing_steps"] = local["processing_steps"]
+            update["total_tokens"] = local["total_tokens"]
+            update["cached_tokens"] = local["cached_tokens"]
+            update["node_timings"] = {name: round(elapsed, 3)}
+            return update
+
+        return node
+
+    async def _prepare_product(self, state: AgentState) -> AgentState:
+        """Node: Format the product once for every branch"""
+        state["product_info_formatted"] = format_product_for_llm(state["product_data"])
+        return state
+
+    async def _generate_and_classify(
+        self, state: AgentState, config: RunnableConfig
+    ) -> Dict[str, Any]:
+        """
+        Node: Retrieval runs alongside streamed content generation, and
+        classification starts as soon as the keywords have streamed in,
+        overlapping the summary and description output. Content fields are
+        passed to the run's ``on_field`` callback, if any, as they arrive.
+        Returns the merged updates of the three steps, timed separately and
+        as a whole.
+        """
+        started = time.perf_counter()
+        emit = config.get("configurable", {}).get("on_field")
+        retrieve = asyncio.ensure_future(
+            self._node("retrieve_tax_categories", self.tools.retrieve_tax_categories)(
+                state
+            )
+        )
+        classification: Optional[asyncio.Future] = None
+
+        async def classify(keywords: List[str]) -> Dict[str, Any]:
+            retrieved = await retrieve
+            classify_state = {
+                **state,
+                **{
+                    key: value
+                    for key, value in retrieved.items()
+                    if key not in _ACCUMULATED_KEYS
+                },
+                "keywords": keywords,
+            }
+            return await self._node("classify_product", self.tools.classify_product)(
+                classify_state  # type:ignore
+            )
+
+        def on_field(field: str, value: Any):
+            nonlocal classification
+            fields = node_output_fields({field: value})
+            if emit is not None and fields:
+                emit({"node": "generate_product_content", "fields": fields})
+            if field == "keywords" and classification is None and isinstance(
+                value, list
+            ):
+                keywords = self.tools.content_keywords(state["product_data"], value)
+                classification = asyncio.ensure_future(classify(keywords))
+
+        try:
+            content = await self._node(
+                "generate_product_content",
+                functools.partial(
+                    self.tools.generate_product_content, on_field=on_field
+                ),
+            )(state)
+            # Keywords that never streamed (failed or unparseable response)
+            # are the fallback keywords set by the content step
+            if classification is None:
+                classification = asyncio.ensure_future(
+                    classify(content.get("keywords", state["keywords"]))
+                )
+            updates = [await retrieve, content, await classification]
+        finally:
+            for task in (retrieve, classification):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        merged: Dict[str, Any] = {
+            "errors": [],
+            "processing_steps": [],
+            "total_tokens": 0,
+            "cached_tokens": 0,
+            "node_timings": {},
+        }
+        for update in updates:
+            for key, value in update.items():
+                if key in ("errors", "processing_steps"):
+                    merged[key] = merged[key] + value
+                elif key in ("total_tokens", "cached_tokens"):
+                    merged[key] += value
+                elif key == "node_timings":
+                    merged[key] = {**merged[key], **value}
+                else:
+                    merged[key] = value
+        merged["node_timings"]["generate_and_classify"] = round(
+            time.perf_counter() - started, 3
+        )
+        return merged
+
+    async def _join(self, state: AgentState) -> Dict[str, Any]:
+        """Node: Wait for all parallel branches"""
+        return {}
+
+    def _build_graph(self, topology: str = "serial") -> StateGraph:
+        """
+        Build the LangGraph workflow for a topology.
+
+        serial:   retrieve -> combined content -> combined classification
+                  (OPTIMIZED, 2 LLM calls instead of 6)
+        parallel: retrieval runs alongside combined content generation,
+                  classification joins both
+        fanout:   the six fine-grained generators run as concurrent branches
+                  (tax code selection after retrieval) and meet in a join node
+        pipelined: retrieval runs alongside streamed content generation and
+                  classification starts once the keywords have streamed in
+        """
+
+        workflow = StateGraph(AgentState)
+
+        def add(name: str, fn):
+            workflow.add_node(name, self._node(name, fn))
+
+        if topology == "serial":
+            add("retrieve_tax_categories", self.tools.retrieve_tax_categories)
+            add("generate_product_content", self.tools.generate_product_content)
+            add("classify_product", self.tools.classify_product)
 
-        workflow.set_entry_point("retrieve_tax_categories")
+            workflow.set_entry_point("retrieve_tax_categories")
 
-        workflow.add_edge("retrieve_tax_categories", "generate_product_content")
-        workflow.add_edge("generate_product_content", "classify_product")
-        workflow.add_edge("classify_product", END)
+            workflow.add_edge("retrieve_tax_categories", "generate_product_content")
+            workflow.add_edge("generate_product_content", "classify_product")
+            workflow.add_edge("classify_product", END)
+
+        elif topology == "parallel":
+            add("prepare_product", self._prepare_product)
+            add("retrieve_tax_categories", self.tools.retrieve_tax_categories)
+            add("generate_product_content", self.tools.generate_product_content)
+            add("classify_product", self.tools.classify_product)
+
+            workflow.set_entry_point("prepare_product")
+
+            workflow.add_edge("prepare_product", "retrieve_tax_categories")
+            workflow.add_edge("prepare_product", "generate_product_content")
+            workflow.add_edge(
+                ["retrieve_tax_categories", "generate_product_content"],
+                "classify_product",
+            )
+            workflow.add_edge("classify_product", END)
+
+        elif topology == "pipelined":
+            add("prepare_product", self._prepare_product)
+            workflow.add_node("generate_and_classify", self._generate_and_classify)
+
+            workflow.set_entry_point("prepare_product")
+
+            workflow.add_edge("prepare_product", "generate_and_classify")
+            workflow.add_edge("generate_and_classify", END)
+
+        elif topology == "fanout":
+            generators = {
+                "generate_name_pattern": self.tools.generate_name_pattern,
+                "generate_product_summary": self.tools.generate_product_summary,
+                "generate_product_description": self.tools.generate_product_description,
+                "extract_keywords": self.tools.extract_keywords,
+                "match_category": self.tools.match_category,
+            }
+
+            add("prepare_product", self._prepare_product)
+            add("retrieve_tax_categories", self.tools.retrieve_tax_categories)
+            add("suggest_tax_code", self.tools.suggest_tax_code)
+            for name, fn in generators.items():
+                add(name, fn)
+            workflow.add_node("join", self._join)
+
+            workflow.set_entry_point("prepare_product")
+
+            workflow.add_edge("prepare_product", "retrieve_tax_categories")
+            workflow.add_edge("retrieve_tax_categories", "suggest_tax_code")
+            for name in generators:
+                workflow.add_edge("prepare_product", name)
+            workflow.add_edge([*generators, "suggest_tax_code"], "join")
+            workflow.add_edge("join", END)
+
+        else:
+            raise ValueError(f"Unknown graph topology '{topology}'")
 
         return workflow.compile()  # type:ignore
 
+    def _resolve_topology(self, topology: Optional[str]) -> str:
+        """
+        Pick the topology for a run. "auto" tries each topology until it has
+        enough samples, then uses the one with the lowest median latency.
+        """
+        topology = topology or settings.graph_topology
+        if topology != "auto":
+            if topology not in TOPOLOGIES:
+                raise ValueError(f"Unknown graph topology '{topology}'")
+            return topology
+
+        latencies = getattr(self, "topology_latencies", {})
+        for candidate in TOPOLOGIES:
+            if len(latencies.get(candidate, ())) < settings.graph_topology_min_samples:
+                return candidate
+        return min(TOPOLOGIES, key=lambda t: statistics.median(latencies[t]))
+
+    def _initial_state(
+        self, product_data: Dict[str, Any], use_cache: bool = True
+    ) -> AgentState:
+        return {
+            "product_data": product_data,
+            "product_info_formatted": "",
+            "retrieved_tax_categories": [],
+            "available_categories": {},
+            "name_pattern": "",
+            "product_summary": "",
+            "product_description": "",
+            "keywords": [],
+            "category": {"main_category": "", "subcategories": []},
+            "tax_code_result": {
+                "tax_code": "",
+                "tax_code_name": "",
+                "confidence": 0.0,
+                "reasoning": "",
+            },
+            "total_tokens": 0,
+            "cached_tokens": 0,
+            "node_timings": {},
+            "use_cache": use_cache,
+            "errors": [],
+            "processing_steps": [],
+        }  # type:ignore
+
+    def _build_output(
+        self, final_state: Dict[str, Any], topology: str
+    ) -> ProductAnalysisOutput:
+        steps = final_state.get("processing_steps", [])
+        unique_steps = []
+        seen = set()
+        for step in steps:
+            if step not in seen:
+                unique_steps.append(step)
+                seen.add(step)
+                logger.info(f"   ✓ {step}")
+
+        if final_state.get("errors"):
+            for error in final_state["errors"]:
+                logger.warning(f"  ⚠ {error}")
+
+        return {
+            "name_pattern": final_state["name_pattern"],
+            "product_summary": final_state["product_summary"],
+            "product_description": final_state["product_description"],
+            "keywords": final_state["keywords"],
+            "category": final_state["category"],
+            "tax_code": final_state["tax_code_result"]["tax_code"],
+            "tax_code_name": final_state["tax_code_result"]["tax_code_name"],
+            "tax_code_confidence": final_state["tax_code_result"]["confidence"],
+            "tax_code_reasoning": final_state["tax_code_result"]["reasoning"],
+            "total_tokens": final_state["total_tokens"],
+            "cached_tokens": final_state["cached_tokens"],
+            "node_timings": final_state["node_timings"],
+            "topology": topology,
+        }  # type:ignore
+
     async def analyze_product(
-        self, product_data: Dict[str, Any]
+        self,
+        product_data: Dict[str, Any],
+        use_cache: bool = True,
+        topology: Optional[str] = None,
     ) -> ProductAnalysisOutput:
         """
         Analyze a product and generate all outputs
 
         Args:
             product_data: Product data from catalog
+            use_cache: Serve LLM responses from the response cache when enabled
+            topology: Graph topology ("serial", "parallel", "fanout",
+                "pipelined" or "auto"); defaults to settings.graph_topology
 
         Returns:
             ProductAnalysisOutput with all generated fields
@@ -65,54 +576,16 @@ class ProductCategorizationAgent:
                 f"Starting product analysis for: {product_data.get('Item Num', 'Unknown')}"
             )
 
-            initial_state: AgentState = {
-                "product_data": product_data,
-                "product_info_formatted": "",
-                "retrieved_tax_categories": [],
-                "available_categories": {},
-                "name_pattern": "",
-                "product_summary": "",
-                "product_description": "",
-                "keywords": [],
-                "category": {"main_category": "", "subcategories": []},
-                "tax_code_result": {
-                    "tax_code": "",
-                    "tax_code_name": "",
-                    "confidence": 0.0,
-                    "reasoning": "",
-                },
-                "total_tokens": 0,
-                "errors": [],
-                "processing_steps": [],
-            }  # type:ignore
-
-            final_state = await self.graph.ainvoke(initial_state)  # type:ignore
-
-            steps = final_state.get("processing_steps", [])
-            unique_steps = []
-            seen = set()
-            for step in steps:
-                if step not in seen:
-                    unique_steps.append(step)
-                    seen.add(step)
-                    logger.info(f"   ✓ {step}")
-
-            if final_state.get("errors"):
-                for error in final_state["errors"]:
-                    logger.warning(f"  ⚠ {error}")
-
-            output: ProductAnalysisOutput = {
-                "name_pattern": final_state["name_pattern"],
-                "product_summary": final_state["product_summary"],
-                "product_description": final_state["product_description"],
-                "keywords": final_state["keywords"],
-                "category": final_state["category"],
-                "tax_code": final_state["tax_code_result"]["tax_code"],
-                "tax_code_name": final_state["tax_code_result"]["tax_code_name"],
-                "tax_code_confidence": final_state["tax_code_result"]["confidence"],
-                "tax_code_reasoning": final_state["tax_code_result"]["reasoning"],
-                "total_tokens": final_state["total_tokens"],
-            }  # type:ignore
+            initial_state = self._initial_state(product_data, use_cache)
+
+            topology = self._resolve_topology(topology)
+            started = time.perf_counter()
+            final_state = await self.graphs[topology].ainvoke(
+                initial_state  # type:ignore
+            )
+            self.topology_latencies[topology].append(time.perf_counter() - started)
+
+            output = self._build_output(final_state, topology)
 
             logger.info(
                 f"Product analysis complete for: {product_data.get('Item Num', 'Unknown')}"
@@ -124,9 +597,273 @@ class ProductCategorizationAgent:
             logger.error(f"Error in product analysis: {str(e)}", exc_info=True)
             raise
 
+    async def stream_product(
+        self,
+        product_data: Dict[str, Any],
+        use_cache: bool = True,
+        topology: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Analyze a product, yielding each node's results as it completes
+
+        Yields ("node", update) once per finished node, where update holds
+        the node name, the output fields it produced, its tokens, errors and
+        duration, then ("result", ProductAnalysisOutput) at the end. Nodes
+        that stream their LLM response also yield ("field", update) with
+        the node name and each output field as soon as it has streamed in.
+        """
+        logger.info(
+            f"Starting streamed product analysis for: {product_data.get('Item Num', 'Unknown')}"
+        )
+
+        topology = self._resolve_topology(topology)
+        started = time.perf_counter()
+        final_state: Dict[str, Any] = {}
+
+        # Graph chunks and streamed fields share one queue, so fields are
+        # yielded while their node is still running; None marks the end
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def run_graph():
+            async for mode, chunk in self.graphs[topology].astream(
+                self._initial_state(product_data, use_cache),  # type:ignore
+                config={
+                    "configurable": {
+                        "on_field": lambda update: events.put_nowait(("field", update))
+                    }
+                },
+                stream_mode=["updates", "values"],
+            ):
+                events.put_nowait((mode, chunk))
+
+        graph_run = asyncio.ensure_future(run_graph())
+        graph_run.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                mode, chunk = event
+                if mode == "values":
+                    final_state = chunk
+                    continue
+                if mode == "field":
+                    yield "field", chunk
+                    continue
+                for node, update in chunk.items():
+                    if not update:
+                        continue
+                    yield "node", {
+                        "node": node,
+                        "fields": node_output_fields(update),
+                        "total_tokens": update.get("total_tokens", 0),
+                        "cached_tokens": update.get("cached_tokens", 0),
+                        "errors": update.get("errors", []),
+                        "seconds": update.get("node_timings", {}).get(node),
+                    }
+            # Raises the graph's error, if it failed
+            graph_run.result()
+        finally:
+            graph_run.cancel()
+        self.topology_latencies[topology].append(time.perf_counter() - started)
+
+        yield "result", self._build_output(final_state, topology)
+
+        logger.info(
+            f"Streamed product analysis complete for: {product_data.get('Item Num', 'Unknown')}"
+        )
+
+    async def analyze_products(
+        self, products: List[Dict[str, Any]], use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Analyze a batch of products, reusing content across size variants.
+
+        Near-duplicate products (same Structure Group and vendor, descriptions
+        equal up to size tokens) are grouped; only each group's representative
+        runs through the agent. Variants get the representative's content with
+        their size tokens substituted. When the substitution is ambiguous a
+        small delta LLM call adapts the content instead, and only if that
+        fails does the variant get its own analysis.
+
+        Returns:
+            Dict with "results" (ProductAnalysisOutput per product, in input
+            order), "variant_of" (representative index or None),
+            "processing_times" (seconds per product) and grouping "stats"
+        """
+        if settings.variant_grouping_enabled:
+            groups = group_near_duplicates(
+                products, MinHashLSH(threshold=settings.variant_grouping_similarity)
+            )
+        else:
+            groups = [[i] for i in range(len(products))]
+
+        results: List[Optional[ProductAnalysisOutput]] = [None] * len(products)
+        variant_of: List[Optional[int]] = [None] * len(products)
+        processing_times = [0.0] * len(products)
+        semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+        templated: List[int] = []
+        adapted: List[int] = []
+
+        async def analyze(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                results[i] = await self.analyze_product(products[i], use_cache)
+                processing_times[i] = time.perf_counter() - started
+
+        async def analyze_group(group: List[int]):
+            representative = group[0]
+            await analyze(representative)
+            rep_output = results[representative]
+
+            fallback = []
+            for i in group[1:]:
+                started = time.perf_counter()
+                derived = None
+                # Don't spread a failed analysis to the whole group
+                if rep_output and rep_output["tax_code"]:
+                    derived = derive_variant_output(
+                        products[representative], rep_output, products[i]
+                    )
+                if derived is None:
+                    fallback.append(i)
+                    continue
+                results[i] = derived
+                variant_of[i] = representative
+                templated.append(i)
+                processing_times[i] = time.perf_counter() - started
+
+            await asyncio.gather(
+                *[adapt_or_analyze(representative, i) for i in fallback]
+            )
+
+        async def adapt_or_analyze(representative: int, i: int):
+            rep_output = results[representative]
+            if (
+                settings.variant_delta_llm_enabled
+                and rep_output
+                and rep_output["tax_code"]
+            ):
+                async with semaphore:
+                    started = time.perf_counter()
+                    derived = await self.tools.adapt_variant_content(
+                        products[representative], rep_output, products[i], use_cache
+                    )
+                    # Only a size change keeps the representative's classification
+                    if derived is not None and not same_masked_descriptions(
+                        products[representative], products[i]
+                    ):
+                        derived = await self._classify_variant(
+                            products[i], derived, use_cache
+                        )
+                    processing_times[i] = time.perf_counter() - started
+                if derived is not None:
+                    results[i] = derived
+                    variant_of[i] = representative
+                    adapted.append(i)
+                    return
+            await analyze(i)
+
+        await asyncio.gather(*[analyze_group(group) for group in groups])
+
+        stats = {
+            "products": len(products),
+            "groups": len(groups),
+            "templated_variants": len(templated),
+            "adapted_variants": len(adapted),
+            "agent_runs": len(products) - len(templated) - len(adapted),
+        }
+        logger.info(
+            f"Batch analysis complete: {len(products)} products in {len(groups)} "
+            f"groups, {len(templated)} variants templated and {len(adapted)} "
+            f"adapted from their representative"
+        )
+
+        return {
+            "results": results,
+            "variant_of": variant_of,
+            "processing_times": processing_times,
+            "stats": stats,
+        }
+
+    async def _classify_variant(
+        self,
+        variant: Dict[str, Any],
+        output: ProductAnalysisOutput,
+        use_cache: bool = True,
+    ) -> ProductAnalysisOutput:
+        """
+        Classify an adapted variant on its own, through the Structure Group
+        map, the tax code cascade or the LLM, keeping its adapted content.
+        """
+        state = self._initial_state(variant, use_cache)
+        state["keywords"] = output["keywords"]
+        await self.tools.retrieve_tax_categories(state)
+        await self.tools.classify_product(state)
+
+        classified: ProductAnalysisOutput = dict(output)  # type:ignore
+        classified["category"] = state["category"]
+        classified["tax_code"] = state["tax_code_result"]["tax_code"]
+        classified["tax_code_name"] = state["tax_code_result"]["tax_code_name"]
+        classified["tax_code_confidence"] = state["tax_code_result"]["confidence"]
+        classified["tax_code_reasoning"] = state["tax_code_result"]["reasoning"]
+        classified["total_tokens"] += state["total_tokens"]
+        classified["cached_tokens"] += state["cached_tokens"]
+        return classified
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Collect runtime metrics from the agent's components"""
+        metrics: Dict[str, Any] = {"vector_store": self.vector_store.stats()}
+        metrics["graph_topologies"] = {
+            topology: {
+                "runs": len(latencies),
+                "median_seconds": (
+                    round(statistics.median(latencies), 3) if latencies else None
+                ),
+                "p95_seconds": (
+                    round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 3)
+                    if latencies
+                    else None
+                ),
+            }
+            for topology, latencies in self.topology_latencies.items()
+        }
+        if self.candidate_table is not None:
+            metrics["candidate_table"] = self.candidate_table.stats()
+        if self.retrieval_cache is not None:
+            metrics["retrieval_cache"] = self.retrieval_cache.stats()
+        if self.search_batcher is not None:
+            metrics["search_batcher"] = self.search_batcher.stats()
+        if self.llm_cache is not None:
+            metrics["llm_cache"] = self.llm_cache.stats()
+        usage = self.tools.usage
+        metrics["prompt_cache"] = {
+            **usage,
+            "cached_ratio": (
+                round(usage["cached_tokens"] / usage["prompt_tokens"], 4)
+                if usage["prompt_tokens"]
+                else 0.0
+            ),
+        }
+        rate_limiter = getattr(self.openai_client, "limiter", None)
+        if rate_limiter is not None:
+            metrics["rate_limiter"] = rate_limiter.stats()
+        if self.call_policy is not None:
+            metrics["node_calls"] = self.call_policy.stats()
+        if self.prompt_assembler is not None:
+            metrics["prompt_budget"] = self.prompt_assembler.stats()
+        if self.category_map is not None:
+            metrics["category_map"] = self.category_map.stats()
+        if self.tax_cascade is not None:
+            metrics["tax_cascade"] = self.tax_cascade.stats()
+        return metrics
+
     async def close(self):
         """Close connections"""
         await self.vector_store.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+        if self.category_map is not None:
+            self.category_map.close()
+        if self.tax_cascade is not None:
+            self.tax_cascade.close()
 
 
 _agent_instance = None
@@ -137,7 +874,7 @@ async def get_agent() -> ProductCategorizationAgent:
     global _agent_instance
 
     if _agent_instance is None:
-        openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=5)
+        openai_client = create_openai_client()
         vector_store = QdrantVectorStore(openai_client=openai_client)
         _agent_instance = ProductCategorizationAgent(openai_client, vector_store)
         logger.info("Product categorization agent initialized")
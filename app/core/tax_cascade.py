@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.helper import format_product_for_llm, product_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    return array / max(float(np.linalg.norm(array)), 1e-12)
+
+
+class TaxCodeCascade:
+    """
+    Weighted kNN tax code prediction over previously analysed products.
+
+    Products are embedded with ``embed_query`` from the same text as the
+    tax category search query, so with the embedding cache the lookup
+    usually costs no extra API call. The embedding of every product the
+    LLM classified is stored in SQLite
+    with its final tax code, confidence and category. A new product's
+    ``k`` nearest stored neighbours with cosine similarity of at least
+    ``min_similarity`` vote for their tax codes, each weighted by
+    similarity times the LLM's confidence. The winning code is returned
+    when at least ``min_neighbors`` neighbours voted and its margin over
+    the runner-up, as a share of all votes, reaches ``min_margin``; the
+    caller asks the LLM otherwise. Locally resolved products are not
+    stored, so the cascade never votes for itself.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embed_query: Callable[[str], Awaitable[List[float]]],
+        model: str,
+        k: int = 10,
+        min_similarity: float = 0.9,
+        min_margin: float = 0.5,
+        min_neighbors: int = 3,
+    ):
+        self.path = path
+        self.embed_query = embed_query
+        self.model = model
+        self.k = k
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.min_neighbors = min_neighbors
+
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.resolved = 0
+        self.recorded = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS classified_products (
+                product_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                tax_code TEXT NOT NULL,
+                tax_code_name TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                category TEXT,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self._conn.commit()
+
+        # Row i of the matrix belongs to self._keys[i]; replaced products
+        # are overwritten in place
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors: List[np.ndarray] = []
+        self._labels: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+
+        # Products embedded with another model are not comparable
+        for key, vector, tax_code, name, confidence, category in self._conn.execute(
+            "SELECT product_key, vector, tax_code, tax_code_name, confidence, category FROM classified_products WHERE model = ?",
+            (model,),
+        ):
+            self._store(
+                key,
+                np.frombuffer(vector, dtype=np.float32),
+                {
+                    "tax_code": tax_code,
+                    "tax_code_name": name,
+                    "confidence": confidence,
+                    "category": json.loads(category) if category else None,
+                },
+            )
+        logger.info(f"Tax code cascade loaded {len(self._keys)} classified products")
+
+    @staticmethod
+    def product_key(product_data: Dict[str, Any]) -> str:
+        # API products use Item_Num, catalog and batch products Item Num
+        item_num = product_data.get("Item Num") or product_data.get("Item_Num")
+        return str(item_num or product_fingerprint(product_data))
+
+    def _store(self, key: str, vector: np.ndarray, label: Dict[str, Any]):
+        if key in self._rows:
+            row = self._rows[key]
+            self._vectors[row] = vector
+            self._labels[row] = label
+        else:
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            self._vectors.append(vector)
+            self._labels.append(label)
+        self._matrix = None
+
+    def _neighbours(
+        self, vector: np.ndarray, exclude: Optional[int] = None
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Up to k stored products at min_similarity or closer, nearest first"""
+        if not self._vectors:
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors)
+        if self._matrix.shape[1] != vector.shape[0]:
+            return []
+        scores = self._matrix @ vector
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(self.k, scores.shape[0])
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+        return [
+            (float(scores[i]), self._labels[i])
+            for i in top
+            if scores[i] >= self.min_similarity
+        ]
+
+    async def _embed(self, product_data: Dict[str, Any]) -> List[float]:
+        return await self.embed_query(format_product_for_llm(product_data))
+
+    async def predict(
+        self, product_data: Dict[str, Any], require_category: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Tax code of a product by neighbour vote, or None when the vote is
+        too thin or too close for a local answer. With ``require_category``
+        the winning voters must also supply the category.
+        """
+        vector = await self._embed(product_data)
+        # The vote waits on the lock SQLite writes hold; keep it off the loop
+        return await asyncio.to_thread(
+            self._vote, _normalise(vector), product_data, require_category
+        )
+
+    def _vote(
+        self,
+        vector: np.ndarray,
+        product_data: Dict[str, Any],
+        require_category: bool,
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.predictions += 1
+            # A re-analysed product does not vote for itself
+            neighbours = self._neighbours(
+                vector, self._rows.get(self.product_key(product_data))
+            )
+            if len(neighbours) < self.min_neighbors:
+                return None
+
+            votes: Dict[str, float] = defaultdict(float)
+            for similarity, label in neighbours:
+                votes[label["tax_code"]] += similarity * label["confidence"]
+            ranked = sorted(votes.items(), key=lambda item: -item[1])
+            total = sum(votes.values())
+            if total <= 0:
+                return None
+            runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+            margin = (ranked[0][1] - runner_up) / total
+            if margin < self.min_margin:
+                return None
+
+            tax_code = ranked[0][0]
+            voters = [
+                (similarity, label)
+                for similarity, label in neighbours
+                if label["tax_code"] == tax_code
+            ]
+            categories: Dict[str, float] = defaultdict(float)
+            for similarity, label in voters:
+                if label["category"]:
+                    categories[json.dumps(label["category"], sort_keys=True)] += (
+                        similarity * label["confidence"]
+                    )
+            if require_category and not categories:
+                return None
+
+            self.resolved += 1
+            # Vote share scaled by the voters' own LLM confidence
+            similarity_total = sum(similarity for similarity, _ in neighbours)
+            return {
+                "tax_code": tax_code,
+                "tax_code_name": voters[0][1]["tax_code_name"],
+                "confidence": round(ranked[0][1] / similarity_total, 4),
+                "margin": round(margin, 4),
+                "neighbors": len(voters),
+                "similarity": round(voters[0][0], 4),
+                "category": (
+                    json.loads(max(categories, key=categories.get))  # type:ignore
+                    if categories
+                    else None
+                ),
+            }
+
+    async def record(
+        self,
+        product_data: Dict[str, Any],
+        tax_code: str,
+        tax_code_name: str,
+        confidence: float,
+        category: Optional[Dict[str, Any]] = None,
+    ):
+        """Store the LLM's classification of a product"""
+        if not tax_code:
+            return
+        normalised = _normalise(await self._embed(product_data))
+        # SQLite I/O runs in a worker thread, off the event loop
+        await asyncio.to_thread(
+            self._write,
+            self.product_key(product_data),
+            normalised,
+            tax_code,
+            tax_code_name,
+            float(confidence),
+            category,
+        )
+
+    def _write(
+        self,
+        key: str,
+        normalised: np.ndarray,
+        tax_code: str,
+        tax_code_name: str,
+        confidence: float,
+        category: Optional[Dict[str, Any]],
+    ):
+        category_json = json.dumps(category) if category else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classified_products (product_key, model, vector, tax_code, tax_code_name, confidence, category, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    self.model,
+                    normalised.tobytes(),
+                    tax_code,
+                    tax_code_name,
+                    confidence,
+                    category_json,
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+            self._store(
+                key,
+                normalised,
+                {
+                    "tax_code": tax_code,
+                    "tax_code_name": tax_code_name,
+                    "confidence": confidence,
+                    "category": category,
+                },
+            )
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self._keys),
+            "k": self.k,
+            "min_similarity": self.min_similarity,
+            "min_margin": self.min_margin,
+            "predictions": self.predictions,
+            "resolved_locally": self.resolved,
+            "llm_fallbacks": self.predictions - self.resolved,
+            "local_rate": (
+                round(self.resolved / self.predictions, 4) if self.predictions else 0.0
+            ),
+            "recorded": self.recorded,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
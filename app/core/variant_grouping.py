@@ -0,0 +1,323 @@
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.agent_state import ProductAnalysisOutput
+from utils.helper import SIZE_PATTERNS
+
+logger = logging.getLogger(__name__)
+
+# Size, gauge, length and count tokens that distinguish variants of a product
+SIZE_WORDS = (
+    r"x{0,2}-?small|medium|x{0,2}-?large|xs|sm|med|md|lg|xl|xxl|one\s?size|onesz"
+)
+VARIANT_TOKEN_PATTERN = re.compile(
+    "|".join(f"(?<![\\w.])(?:{pattern})(?![a-z])" for pattern in SIZE_PATTERNS)
+    + r"|[^\s,()]*\d[^\s,()]*"
+    + rf"|\b(?:{SIZE_WORDS})\b",
+    re.IGNORECASE,
+)
+SIZE_WORD_PATTERN = re.compile(rf"(?:{SIZE_WORDS})", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"[a-z]+")
+BARE_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+UNIT_WORD_PATTERN = re.compile(r"\s*([a-z]+)\b", re.IGNORECASE)
+# Purely numeric catalog numbers shorter than this could be quantities
+MIN_NUMERIC_CATALOG_DIGITS = 5
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def _field(product: Dict[str, Any], name: str) -> str:
+    value = product.get(name) or product.get(name.replace(" ", "_"))
+    return str(value).strip() if value else ""
+
+
+def variant_tokens(text: str) -> List[str]:
+    """Size/count tokens of a description in order of appearance"""
+    return [match.group(0) for match in VARIANT_TOKEN_PATTERN.finditer(text)]
+
+
+def anchored_variant_tokens(text: str) -> List[Optional[str]]:
+    """
+    Size/count tokens of a description, with bare numbers anchored to the
+    unit word that follows them (100 Units). A bare number without a unit
+    is kept as None: its position counts, but it is never substituted.
+    """
+    tokens: List[Optional[str]] = []
+    for match in VARIANT_TOKEN_PATTERN.finditer(text):
+        token = match.group(0)
+        if BARE_NUMBER_PATTERN.fullmatch(token):
+            unit = UNIT_WORD_PATTERN.match(text, match.end())
+            token = f"{token} {unit.group(1)}" if unit else None  # type:ignore
+        tokens.append(token)
+    return tokens
+
+
+def _token_key(token: str) -> str:
+    return "".join(token.lower().split())
+
+
+def _token_pattern(token: str) -> str:
+    """Whole-token regex of a size token, spacing-insensitive (100 Units, 100Units)"""
+    return r"\s*".join(re.escape(char) for char in _token_key(token))
+
+
+def token_shape(token: str) -> str:
+    """Coarse form of a size token, e.g. 4-0 -> 9-9 and PS-2 -> a-9"""
+    if SIZE_WORD_PATTERN.fullmatch(token):
+        return "size"
+    return re.sub(r"[a-z]+", "a", re.sub(r"\d+", "9", token.lower()))
+
+
+def _masked_words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(VARIANT_TOKEN_PATTERN.sub(" ", text.lower()))
+
+
+def same_masked_descriptions(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Whether two products' descriptions are identical once sizes are masked"""
+    return all(
+        _masked_words(_field(a, name)) == _masked_words(_field(b, name))
+        for name in ("Item Desc Short", "Item Desc Full")
+    )
+
+
+def masked_shingles(product: Dict[str, Any]) -> set:
+    """Word unigrams and bigrams of the descriptions with size tokens masked"""
+    shingles = set()
+    for name in ("Item Desc Short", "Item Desc Full"):
+        text = VARIANT_TOKEN_PATTERN.sub(" ", _field(product, name).lower())
+        words = WORD_PATTERN.findall(text)
+        shingles.update(f"{name}:{word}" for word in words)
+        shingles.update(f"{name}:{a} {b}" for a, b in zip(words, words[1:]))
+    return shingles
+
+
+class MinHashLSH:
+    """
+    MinHash signatures with banded locality-sensitive hashing.
+
+    Items whose signatures agree on every row of at least one band become
+    candidate pairs; candidates are then kept only if their estimated
+    Jaccard similarity reaches ``threshold``.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 32,
+        threshold: float = 0.8,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+
+    def signature(self, shingles: set) -> np.ndarray:
+        if not shingles:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.int64)
+        hashes = np.array(
+            [
+                int.from_bytes(
+                    hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big"
+                )
+                % MERSENNE_PRIME
+                for s in shingles
+            ],
+            dtype=np.int64,
+        )
+        return ((np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME).min(axis=0)
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+    def candidate_pairs(self, signatures: List[np.ndarray]) -> set:
+        pairs = set()
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[int]] = defaultdict(list)
+            start = band * self.rows
+            for i, signature in enumerate(signatures):
+                buckets[signature[start : start + self.rows].tobytes()].append(i)
+            for members in buckets.values():
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pairs.add((members[x], members[y]))
+        return pairs
+
+
+def group_near_duplicates(
+    products: List[Dict[str, Any]], lsh: Optional[MinHashLSH] = None
+) -> List[List[int]]:
+    """
+    Group product indices whose descriptions differ only by size tokens.
+
+    Products are only grouped within the same Structure Group and vendor.
+    The first index of each group is its representative.
+    """
+    lsh = lsh or MinHashLSH()
+
+    blocks: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for i, product in enumerate(products):
+        key = (
+            _field(product, "Structure Group").lower(),
+            _field(product, "Vendor Name").lower(),
+        )
+        blocks[key].append(i)
+
+    parent = list(range(len(products)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        signatures = [lsh.signature(masked_shingles(products[i])) for i in members]
+        for x, y in lsh.candidate_pairs(signatures):
+            if lsh.similarity(signatures[x], signatures[y]) >= lsh.threshold:
+                root_x, root_y = find(members[x]), find(members[y])
+                if root_x != root_y:
+                    parent[max(root_x, root_y)] = min(root_x, root_y)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(products)):
+        groups[find(i)].append(i)
+    return list(groups.values())
+
+
+def _variant_substitutions(
+    representative: Dict[str, Any], variant: Dict[str, Any]
+) -> Optional[Dict[str, str]]:
+    """
+    Map the representative's size tokens to the variant's, position by
+    position. None when the descriptions differ in anything but size
+    tokens, or don't line up token for token.
+    """
+    if not same_masked_descriptions(representative, variant):
+        return None
+
+    substitutions: Dict[str, str] = {}
+    pairs: List[Tuple[Optional[str], Optional[str]]] = []
+    catalog = (_field(representative, "Catalog Num"), _field(variant, "Catalog Num"))
+    if not any(
+        num.isdigit() and len(num) < MIN_NUMERIC_CATALOG_DIGITS for num in catalog
+    ):
+        pairs.append(catalog)
+    for name in ("Item Desc Short", "Item Desc Full"):
+        source = anchored_variant_tokens(_field(representative, name))
+        target = anchored_variant_tokens(_field(variant, name))
+        if len(source) != len(target) or any(
+            (a is None) != (b is None)
+            or (a is not None and token_shape(a) != token_shape(b))  # type:ignore
+            for a, b in zip(source, target)
+        ):
+            return None
+        pairs.extend(zip(source, target))
+
+    for source, target in pairs:
+        # Bare numbers stay; the leftover check rejects them if generated
+        if not source or not target or source.lower() == target.lower():
+            continue
+        key = _token_key(source)
+        if substitutions.get(key, target) != target:
+            return None
+        substitutions[key] = target
+    return substitutions
+
+
+def _changed_numbers(representative: Dict[str, Any], variant: Dict[str, Any]) -> set:
+    """Numbers of the representative's size tokens that differ in the variant"""
+    numbers = set()
+    for name in ("Item Desc Short", "Item Desc Full"):
+        for source, target in zip(
+            variant_tokens(_field(representative, name)),
+            variant_tokens(_field(variant, name)),
+        ):
+            if source.lower() != target.lower():
+                numbers.update(re.findall(r"\d+(?:[./-]\d+)*", source))
+    return numbers
+
+
+def _substitute(text: str, pattern: re.Pattern, substitutions: Dict[str, str]) -> str:
+    return pattern.sub(lambda match: substitutions[_token_key(match.group(0))], text)
+
+
+def derive_variant_output(
+    representative: Dict[str, Any],
+    representative_output: ProductAnalysisOutput,
+    variant: Dict[str, Any],
+) -> Optional[ProductAnalysisOutput]:
+    """
+    Build a variant's analysis from its representative's by substituting
+    size tokens in the generated text. Category and tax code carry over.
+
+    Returns None when the substitution is ambiguous (tokens don't align,
+    or a size value appears in the generated text in a form that can't be
+    replaced safely); the variant then needs its own analysis.
+    """
+    substitutions = _variant_substitutions(representative, variant)
+    if substitutions is None:
+        return None
+
+    output: ProductAnalysisOutput = dict(representative_output)  # type:ignore
+    output["total_tokens"] = 0
+    output["cached_tokens"] = 0
+    output["node_timings"] = {}
+    changed = _changed_numbers(representative, variant)
+    if not substitutions and not changed:
+        return output
+
+    # Never matches when there is nothing to substitute
+    pattern = re.compile(
+        "|".join(
+            f"(?<![\\w.]){_token_pattern(source)}(?![\\w])"
+            for source in sorted(substitutions, key=len, reverse=True)
+        )
+        or r"(?!)",
+        re.IGNORECASE,
+    )
+
+    generated = " ".join(
+        [
+            representative_output["name_pattern"],
+            representative_output["product_summary"],
+            representative_output["product_description"],
+            " ".join(representative_output["keywords"]),
+        ]
+    )
+    # A changed number still present after substitution was rendered
+    # differently by the LLM (e.g. 18" as "18 inch") or stood without a unit
+    remaining = pattern.sub(" ", generated)
+    for source in substitutions:
+        changed.update(re.findall(r"\d+(?:[./-]\d+)*", source))
+    for number in changed:
+        if re.search(rf"(?<![\w./-]){re.escape(number)}(?![\w/-])", remaining):
+            return None
+
+    output["name_pattern"] = _substitute(
+        representative_output["name_pattern"], pattern, substitutions
+    )
+    output["product_summary"] = _substitute(
+        representative_output["product_summary"], pattern, substitutions
+    )
+    output["product_description"] = _substitute(
+        representative_output["product_description"], pattern, substitutions
+    )
+    output["keywords"] = [
+        _substitute(keyword, pattern, substitutions)
+        for keyword in representative_output["keywords"]
+    ]
+    return output
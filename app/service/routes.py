@@ -1,14 +1,22 @@
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Optional
+import json
 import logging
+import time
 from app.service.schemas import (
     ProductInput,
     ProductAnalysisResponse,
+    BatchProductInput,
+    BatchAnalysisResponse,
+    KeywordsResponse,
+    CategoryInfo,
     ErrorResponse,
     HealthCheckResponse,
     CategoriesResponse,
+    MetricsResponse,
 )
-from app.core.product_agent import get_agent
+from app.core.product_agent import TOPOLOGIES, get_agent
 from utils.helper import get_category_hierarchy
 from config.config import settings
 
@@ -17,6 +25,41 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1", tags=["Product Analysis"])
 
 
+def _build_response(
+    result: dict, processing_time: float, variant_of: Optional[int] = None
+) -> ProductAnalysisResponse:
+    return ProductAnalysisResponse(
+        name_pattern=result["name_pattern"],
+        product_summary=result["product_summary"],
+        product_description=result["product_description"],
+        keywords=result["keywords"],
+        category=CategoryInfo(**result["category"]),  # Convert dict to CategoryInfo
+        tax_code=result["tax_code"],
+        tax_code_name=result["tax_code_name"],
+        tax_code_confidence=result["tax_code_confidence"],
+        tax_code_reasoning=result["tax_code_reasoning"],
+        processing_time_seconds=round(processing_time, 2),
+        total_tokens=result.get("total_tokens", 0),
+        cached_tokens=result.get("cached_tokens", 0),
+        variant_of=variant_of,
+        topology=result.get("topology"),
+        node_timings=result.get("node_timings", {}),
+    )
+
+
+def _check_topology(topology: Optional[str]):
+    if topology not in (None, "auto", *TOPOLOGIES):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown topology '{topology}'",
+        )
+
+
+def _sse_event(event: str, data: Any) -> str:
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
 @router.post(
     "/analyze-product",
     response_model=ProductAnalysisResponse,
@@ -24,10 +67,18 @@ router = APIRouter(prefix="/api/v1", tags=["Product Analysis"])
     summary="Analyze Product",
     description="Analyze a product and generate name pattern, summary, keywords, category, and tax code",
 )
-async def analyze_product(product: ProductInput):
+async def analyze_product(
+    product: ProductInput,
+    topology: Optional[str] = None,
+    x_cache_bypass: bool = Header(default=False),
+):
     """
     Analyze a product and generate comprehensive categorization data.
 
+    Send ``X-Cache-Bypass: true`` to skip cached LLM responses. The
+    ``topology`` query parameter (serial, parallel, fanout, pipelined or auto)
+    overrides the configured graph topology for this request.
+
     Returns:
     - name_pattern: Standardized product name
     - structured_summary: Detailed product summary
@@ -35,9 +86,9 @@ async def analyze_product(product: ProductInput):
     - category: Product category (Main > Subcategory)
     - tax_code: Suggested tax code with confidence
     """
-    try:
-        import time
+    _check_topology(topology)
 
+    try:
         start_time = time.time()
         logger.info(f"Received product analysis request for Item: {product.Item_Num}")
 
@@ -47,27 +98,14 @@ async def analyze_product(product: ProductInput):
 
         agent = await get_agent()
 
-        result = await agent.analyze_product(product_data)
+        result = await agent.analyze_product(
+            product_data, use_cache=not x_cache_bypass, topology=topology
+        )
 
         # Calculate processing time
         processing_time = time.time() - start_time
 
-        # Import CategoryInfo for response construction
-        from app.service.schemas import CategoryInfo
-
-        response = ProductAnalysisResponse(
-            name_pattern=result["name_pattern"],
-            product_summary=result["product_summary"],
-            product_description=result["product_description"],
-            keywords=result["keywords"],
-            category=CategoryInfo(**result["category"]),  # Convert dict to CategoryInfo
-            tax_code=result["tax_code"],
-            tax_code_name=result["tax_code_name"],
-            tax_code_confidence=result["tax_code_confidence"],
-            tax_code_reasoning=result["tax_code_reasoning"],
-            processing_time_seconds=round(processing_time, 2),
-            total_tokens=result.get("total_tokens", 0),
-        )
+        response = _build_response(result, processing_time)
 
         logger.info(
             f"Successfully analyzed product: {product.Item_Num} in {processing_time:.2f}s"
@@ -82,6 +120,157 @@ async def analyze_product(product: ProductInput):
         )
 
 
+@router.post(
+    "/analyze-product/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Analyze Product (streaming)",
+    description="Analyze a product, streaming each graph node's results as Server-Sent Events",
+    response_class=StreamingResponse,
+)
+async def analyze_product_stream(
+    product: ProductInput,
+    topology: Optional[str] = None,
+    x_cache_bypass: bool = Header(default=False),
+):
+    """
+    Analyze a product and stream results as Server-Sent Events.
+
+    Emits a ``node`` event as each graph node completes, carrying the node
+    name, the response fields it produced (e.g. name_pattern and keywords
+    before the tax code is ready), its tokens, errors and duration. Nodes
+    that stream their LLM response (pipelined topology) also emit ``field``
+    events with each content field as soon as it has streamed in. A final
+    ``result`` event carries the full ProductAnalysisResponse; on failure an
+    ``error`` event carries the detail instead.
+    """
+    _check_topology(topology)
+
+    logger.info(f"Received streaming analysis request for Item: {product.Item_Num}")
+    product_data = product.model_dump(by_alias=False)
+    agent = await get_agent()
+
+    async def events() -> AsyncIterator[str]:
+        start_time = time.time()
+        try:
+            async for event, data in agent.stream_product(
+                product_data, use_cache=not x_cache_bypass, topology=topology
+            ):
+                if event == "result":
+                    processing_time = time.time() - start_time
+                    response = _build_response(data, processing_time)
+                    yield _sse_event("result", response.model_dump_json())
+                    logger.info(
+                        f"Successfully streamed product: {product.Item_Num} in {processing_time:.2f}s"
+                    )
+                else:
+                    yield _sse_event(event, data)
+
+        except Exception as e:
+            logger.error(f"Error streaming product analysis: {str(e)}", exc_info=True)
+            yield _sse_event("error", {"detail": f"Product analysis failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/analyze-products",
+    response_model=BatchAnalysisResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Analyze Products",
+    description="Analyze a batch of products, reusing generated content across size variants",
+)
+async def analyze_products(
+    batch: BatchProductInput, x_cache_bypass: bool = Header(default=False)
+):
+    """
+    Analyze a batch of products.
+
+    Near-duplicate size variants are grouped and only one representative
+    per group runs through the agent; the others get its content with
+    their sizes substituted and report the representative in variant_of.
+    """
+    try:
+        start_time = time.time()
+        logger.info(f"Received batch analysis request for {len(batch.products)} items")
+
+        products = [product.model_dump(by_alias=False) for product in batch.products]
+
+        agent = await get_agent()
+
+        batch_result = await agent.analyze_products(
+            products, use_cache=not x_cache_bypass
+        )
+
+        results = [
+            _build_response(
+                result,
+                processing_time,
+                (
+                    products[representative]["Item_Num"]
+                    if representative is not None
+                    else None
+                ),
+            )
+            for result, processing_time, representative in zip(
+                batch_result["results"],
+                batch_result["processing_times"],
+                batch_result["variant_of"],
+            )
+        ]
+
+        processing_time = time.time() - start_time
+        logger.info(
+            f"Successfully analyzed {len(products)} products in {processing_time:.2f}s"
+        )
+        return BatchAnalysisResponse(
+            results=results,
+            stats=batch_result["stats"],
+            processing_time_seconds=round(processing_time, 2),
+            total_tokens=sum(result.total_tokens for result in results),
+            cached_tokens=sum(result.cached_tokens for result in results),
+        )
+
+    except Exception as e:
+        logger.error(f"Error analyzing products: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch product analysis failed: {str(e)}",
+        )
+
+
+@router.post(
+    "/keywords",
+    response_model=KeywordsResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Extract Keywords",
+    description="Keywords from the catalog-trained local keyword model, without an LLM call",
+)
+async def extract_keywords(product: ProductInput):
+    """
+    Keyword-only fast mode: ranks the product's own phrases by TF-IDF
+    against the catalog. No LLM call is made.
+    """
+    try:
+        start_time = time.time()
+        agent = await get_agent()
+        keywords = agent.tools.local_keywords(product.model_dump(by_alias=False))
+        return KeywordsResponse(
+            keywords=keywords,
+            processing_time_seconds=round(time.time() - start_time, 4),
+        )
+
+    except Exception as e:
+        logger.error(f"Error extracting keywords: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Keyword extraction failed: {str(e)}",
+        )
+
+
 @router.get(
     "/health",
     response_model=HealthCheckResponse,
@@ -138,3 +327,26 @@ async def get_categories():
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch categories: {str(e)}",
         )
+
+
+@router.get(
+    "/metrics",
+    response_model=MetricsResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Runtime Metrics",
+    description="Get runtime metrics such as embedding cache and batching statistics",
+)
+async def get_metrics():
+    """
+    Get runtime metrics from the agent's components.
+    """
+    try:
+        agent = await get_agent()
+        return MetricsResponse(metrics=agent.get_metrics())
+
+    except Exception as e:
+        logger.error(f"Error fetching metrics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch metrics: {str(e)}",
+        )
@@ -104,6 +104,19 @@ class ProductAnalysisResponse(BaseModel):
         ..., description="Total API processing time in seconds"
     )
     total_tokens: int = Field(..., description="Total tokens used across all LLM calls")
+    cached_tokens: int = Field(
+        0, description="Prompt tokens served from the provider's prefix cache"
+    )
+    variant_of: Optional[int] = Field(
+        None,
+        description="Item number of the batch representative this variant's content was derived from",
+    )
+    topology: Optional[str] = Field(
+        None, description="Graph topology the analysis ran on"
+    )
+    node_timings: Dict[str, float] = Field(
+        default_factory=dict, description="Seconds spent in each graph node"
+    )
 
     class Config:
         json_schema_extra = {
@@ -129,6 +142,45 @@ class ProductAnalysisResponse(BaseModel):
         }
 
 
+class BatchProductInput(BaseModel):
+    """Input schema for batch product analysis"""
+
+    products: List[ProductInput] = Field(
+        ..., description="Products to analyze", min_length=1
+    )
+
+
+class BatchAnalysisResponse(BaseModel):
+    """Response schema for batch product analysis"""
+
+    results: List[ProductAnalysisResponse] = Field(
+        ..., description="Analysis per product, in request order"
+    )
+    stats: Dict[str, Any] = Field(..., description="Near-duplicate grouping statistics")
+    processing_time_seconds: float = Field(
+        ..., description="Total API processing time in seconds"
+    )
+    total_tokens: int = Field(..., description="Total tokens used across all LLM calls")
+    cached_tokens: int = Field(
+        0, description="Prompt tokens served from the provider's prefix cache"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": [],
+                "stats": {
+                    "products": 128,
+                    "groups": 47,
+                    "templated_variants": 62,
+                    "agent_runs": 66,
+                },
+                "processing_time_seconds": 95.2,
+                "total_tokens": 198000,
+            }
+        }
+
+
 class ErrorResponse(BaseModel):
     """Error response schema"""
 
@@ -161,6 +213,23 @@ class HealthCheckResponse(BaseModel):
         }
 
 
+class KeywordsResponse(BaseModel):
+    """Response schema for local keyword extraction"""
+
+    keywords: List[str] = Field(..., description="Catalog-trained keywords")
+    processing_time_seconds: float = Field(
+        ..., description="Total API processing time in seconds"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "keywords": ["3m", "masks", "surgical mask", "n95", "respirator"],
+                "processing_time_seconds": 0.001,
+            }
+        }
+
+
 class CategoriesResponse(BaseModel):
     """Available categories response"""
 
@@ -175,3 +244,28 @@ class CategoriesResponse(BaseModel):
                 }
             }
         }
+
+
+class MetricsResponse(BaseModel):
+    """Runtime metrics response"""
+
+    metrics: Dict[str, Any] = Field(..., description="Metrics grouped by component")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "metrics": {
+                    "vector_store": {
+                        "embedding_batcher": {
+                            "max_batch_size": 64,
+                            "max_wait_ms": 5.0,
+                            "requests": 120,
+                            "batches": 9,
+                            "failed_batches": 0,
+                            "avg_batch_size": 13.33,
+                            "batch_size_histogram": {"1": 2, "16": 7},
+                        }
+                    }
+                }
+            }
+        }
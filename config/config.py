@@ -1,16 +1,86 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, List, Optional
 import os
 
 
 class Settings(BaseSettings):
     OPENAI_API_KEY: str
+    embedding_provider: str = "openai"  # "openai" or "fastembed"
     embedding_model: str = "text-embedding-ada-002"
     vector_size: int = 1536
+    fastembed_model: str = "BAAI/bge-small-en-v1.5"
+    fastembed_threads: Optional[int] = None
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 100_000
+    embedding_cache_memory_entries: int = 4096
+    embedding_batch_enabled: bool = True
+    embedding_batch_max_size: int = 64
+    embedding_batch_max_wait_ms: float = 5.0
+    upload_batch_size: int = 100
+    upload_max_concurrent_embeddings: int = 4
+    upload_max_concurrent_upserts: int = 2
+    upload_max_retries: int = 3
+    upload_retry_backoff_seconds: float = 1.0
     model_name: str = "gpt-4o-mini"
 
     agent_temperature: float = 0.3
+    graph_topology: str = "serial"  # "serial", "parallel", "fanout", "pipelined" or "auto"
+    graph_topology_min_samples: int = 20  # runs per topology before "auto" picks
     agent_max_tokens: int = 2000
     retrieval_top_k: int = 5
+    retrieval_mode: str = "dense"  # "dense", "hybrid" or "lexical"
+    hybrid_candidate_k: int = 20
+    hybrid_rrf_k: int = 60
+    hybrid_dense_timeout_seconds: float = 2.0
+    search_payload_mode: str = "full"  # "full", "projected" or "local"
+    search_payload_fields: List[str] = ["product_tax_code", "name", "description"]
+    search_batch_enabled: bool = True
+    search_batch_max_size: int = 32
+    search_batch_max_wait_ms: float = 5.0
+    local_index_enabled: bool = False
+    candidate_table_enabled: bool = False
+    candidate_table_top_k: int = 20
+    retrieval_cache_enabled: bool = False
+    retrieval_cache_max_entries: int = 2048
+    retrieval_cache_ttl_seconds: float = 3600.0
+    retrieval_cache_similarity: float = 0.5
+    llm_cache_enabled: bool = False
+    llm_cache_max_entries: int = 50_000
+    llm_cache_ttl_seconds: float = 604_800  # 7 days
+    prompt_budget_enabled: bool = False
+    prompt_budget_content_tokens: int = 1200
+    prompt_budget_classification_tokens: int = 1600
+    variant_grouping_enabled: bool = False
+    variant_grouping_similarity: float = 0.8
+    variant_delta_llm_enabled: bool = False
+    batch_max_concurrency: int = 4
+    node_call_policy_enabled: bool = False
+    node_timeout_seconds: float = 30.0
+    node_max_attempts: int = 2
+    hedge_enabled: bool = True
+    hedge_min_delay_seconds: float = 2.0
+    hedge_initial_delay_seconds: float = 10.0  # until a node has 20 samples
+    fallback_model_name: Optional[str] = None
+    fallback_after_timeouts: int = 3
+    fallback_cooldown_seconds: float = 300.0
+    openai_rate_limit_enabled: bool = False
+    openai_requests_per_minute: int = 500
+    openai_tokens_per_minute: int = 200_000
+    openai_max_retries: int = 5
+    openai_retry_backoff_seconds: float = 1.0
+    openai_batch_base_url: Optional[str] = None  # e.g. a local stand-in server
+    openai_batch_completion_window: str = "24h"
+    openai_batch_max_requests: int = 50_000
+    openai_batch_poll_seconds: float = 60.0
+    category_map_enabled: bool = False
+    category_map_min_support: int = 20  # products of a Structure Group
+    category_map_min_agreement: float = 0.9
+    tax_cascade_enabled: bool = False
+    tax_cascade_k: int = 10
+    tax_cascade_min_similarity: float = 0.9
+    tax_cascade_min_margin: float = 0.5  # winner's lead as a share of all votes
+    tax_cascade_min_neighbors: int = 3
+    local_keywords_only: bool = False  # extract_keywords without an LLM call
     keyword_count_min: int = 15
     keyword_count_max: int = 30
     DATABASE_NAME: str
@@ -21,12 +91,23 @@ class Settings(BaseSettings):
     QDRANT_URl: str
     QDRANT_API_KEY: str
     collection_name: str
+    collection_profile: str = "default"  # "default", "latency", "memory", "exact"
+    collection_profiles: Dict[str, str] = {}  # per-collection overrides
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     DATA_DIR: str = os.path.join(BASE_DIR, "data")
     TAX_CATEGORIES_FILE: str = os.path.join(DATA_DIR, "tax_categories.json")
     PRODUCT_CATEGORIES_FILE: str = os.path.join(DATA_DIR, "product_categories.json")
-    TAX_EMBEDDINGS_CACHE: str = os.path.join(DATA_DIR, "tax_embeddings.json")
-    CATEGORY_EMBEDDINGS_CACHE: str = os.path.join(DATA_DIR, "category_embeddings.json")
+    CATALOG_FILE: str = os.path.join(DATA_DIR, "aire_mckesson_catalog.json")
+    KEYWORD_MODEL_FILE: str = os.path.join(DATA_DIR, "keyword_model.json")
+    BATCH_RUNS_DIR: str = os.path.join(DATA_DIR, "batch_runs")
+    CANDIDATE_TABLE_FILE: str = os.path.join(DATA_DIR, "tax_candidates.json")
+    TAX_EMBEDDINGS_CACHE: str = os.path.join(DATA_DIR, "tax_embeddings.db")
+    CATEGORY_EMBEDDINGS_CACHE: str = os.path.join(DATA_DIR, "category_embeddings.db")
+    LLM_RESPONSE_CACHE: str = os.path.join(DATA_DIR, "llm_responses.db")
+    CATEGORY_MAP_FILE: str = os.path.join(DATA_DIR, "category_map.db")
+    TAX_CASCADE_FILE: str = os.path.join(DATA_DIR, "tax_cascade.db")
+    LOCAL_INDEX_DIR: str = os.path.join(DATA_DIR, "local_index")
+    FASTEMBED_CACHE_DIR: str = os.path.join(DATA_DIR, "fastembed_models")
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from database.vector_db.payload_table import project_payload
+
+logger = logging.getLogger(__name__)
+
+
+class TaxCandidateTable:
+    """
+    Precomputed tax candidates keyed by product fingerprint.
+
+    The file stores, for every catalog product, the ids of its top-k tax
+    categories in rank order; payloads are resolved from the tax category
+    rows when the table is loaded.
+    """
+
+    def __init__(
+        self,
+        candidates: Dict[str, List[str]],
+        tax_categories: List[Dict[str, Any]],
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        self.candidates = candidates
+        self.rows = {str(row.get("id")): row for row in tax_categories}
+        self.metadata = metadata or {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(
+        cls, path: str, tax_categories: List[Dict[str, Any]]
+    ) -> Optional["TaxCandidateTable"]:
+        if not os.path.exists(path):
+            logger.warning(f"Tax candidate table not found: {path}")
+            return None
+
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        table = cls(
+            {fp: entry["ids"] for fp, entry in data.get("candidates", {}).items()},
+            tax_categories,
+            {k: v for k, v in data.items() if k != "candidates"},
+        )
+        logger.info(
+            f"Loaded tax candidate table with {len(table.candidates)} products "
+            f"(top_k={table.metadata.get('top_k')})"
+        )
+        return table
+
+    def lookup(
+        self,
+        fingerprint: str,
+        top_k: int,
+        payload_fields: Optional[List[str]] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Candidates for a product, or None when it is new or changed"""
+        ids = self.candidates.get(fingerprint)
+        if ids is None or len(ids) < top_k:
+            self.misses += 1
+            return None
+
+        rows = [self.rows[i] for i in ids[:top_k] if i in self.rows]
+        if len(rows) < top_k:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return [project_payload(row, payload_fields) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "products": len(self.candidates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
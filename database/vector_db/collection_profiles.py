@@ -0,0 +1,179 @@
+import logging
+import pathlib
+import sys
+from typing import Any, Dict, Optional
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Named provisioning profiles for Qdrant collections.
+#   hnsw_m / hnsw_ef_construct: graph degree and build-time beam width
+#   hnsw_ef: search-time beam width (None lets Qdrant decide)
+#   exact: brute-force search, skipping the HNSW graph entirely
+#   quantization: None, "scalar" (int8) or "binary", kept in RAM
+#   rescore / oversampling: re-rank quantized candidates with full vectors
+#   on_disk: keep original vectors (and the HNSW graph) on disk
+COLLECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "hnsw_ef": None,
+        "exact": False,
+        "quantization": None,
+        "rescore": False,
+        "oversampling": None,
+        "on_disk": False,
+    },
+    "latency": {
+        "hnsw_m": 32,
+        "hnsw_ef_construct": 256,
+        "hnsw_ef": 128,
+        "exact": False,
+        "quantization": "scalar",
+        "rescore": True,
+        "oversampling": 2.0,
+        "on_disk": False,
+    },
+    "memory": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "hnsw_ef": 64,
+        "exact": False,
+        "quantization": "binary",
+        "rescore": True,
+        "oversampling": 3.0,
+        "on_disk": True,
+    },
+    "exact": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "hnsw_ef": None,
+        "exact": True,
+        "quantization": None,
+        "rescore": False,
+        "oversampling": None,
+        "on_disk": False,
+    },
+}
+
+# Payload fields indexed in every profile
+PAYLOAD_INDEXES: Dict[str, models.PayloadSchemaType] = {
+    "product_tax_code": models.PayloadSchemaType.KEYWORD,
+    "name": models.PayloadSchemaType.TEXT,
+}
+
+
+def get_profile_name(collection_name: str) -> str:
+    """Profile configured for a collection, falling back to the global one"""
+    return settings.collection_profiles.get(
+        collection_name, settings.collection_profile
+    )
+
+
+def get_profile(name: str) -> Dict[str, Any]:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(
+            f"Unknown collection profile '{name}'. "
+            f"Available: {', '.join(COLLECTION_PROFILES)}"
+        )
+    return COLLECTION_PROFILES[name]
+
+
+def _quantization_config(profile: Dict[str, Any]):
+    if profile["quantization"] == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if profile["quantization"] == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
+
+
+def _hnsw_config(profile: Dict[str, Any]) -> models.HnswConfigDiff:
+    return models.HnswConfigDiff(
+        m=profile["hnsw_m"],
+        ef_construct=profile["hnsw_ef_construct"],
+        on_disk=profile["on_disk"],
+    )
+
+
+def search_params(profile_name: str) -> Optional[models.SearchParams]:
+    """Search-time parameters for a profile, None for Qdrant defaults"""
+    profile = get_profile(profile_name)
+    quantization = None
+    if profile["quantization"]:
+        quantization = models.QuantizationSearchParams(
+            rescore=profile["rescore"], oversampling=profile["oversampling"]
+        )
+
+    if not (profile["hnsw_ef"] or profile["exact"] or quantization):
+        return None
+    return models.SearchParams(
+        hnsw_ef=profile["hnsw_ef"], exact=profile["exact"], quantization=quantization
+    )
+
+
+async def create_collection(
+    client: AsyncQdrantClient, collection_name: str, dimension: int, profile_name: str
+):
+    """Create a collection provisioned according to a profile"""
+    profile = get_profile(profile_name)
+    logger.info(
+        f"Creating collection '{collection_name}' with profile '{profile_name}'"
+    )
+    await client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(
+            size=dimension,
+            distance=models.Distance.COSINE,
+            on_disk=profile["on_disk"],
+        ),
+        hnsw_config=_hnsw_config(profile),
+        quantization_config=_quantization_config(profile),
+    )
+    await ensure_payload_indexes(client, collection_name)
+
+
+async def ensure_payload_indexes(client: AsyncQdrantClient, collection_name: str):
+    """Create the standard payload indexes that are missing"""
+    info = await client.get_collection(collection_name)
+    existing = info.payload_schema or {}
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        if field_name not in existing:
+            await client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=schema,
+            )
+            logger.info(f"Created {schema.value} index on '{field_name}'")
+
+
+async def apply_profile(
+    client: AsyncQdrantClient, collection_name: str, profile_name: str
+):
+    """
+    Migrate an existing collection to a profile in place. Qdrant rebuilds
+    the HNSW graph and quantized vectors in the background; points and
+    payloads are kept.
+    """
+    profile = get_profile(profile_name)
+    quantization = _quantization_config(profile) or models.Disabled.DISABLED
+
+    logger.info(f"Migrating collection '{collection_name}' to profile '{profile_name}'")
+    await client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=profile["on_disk"])},
+        hnsw_config=_hnsw_config(profile),
+        quantization_config=quantization,
+    )
+    await ensure_payload_indexes(client, collection_name)
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by (embedding model, dimension, sha256 of the text),
+    so vectors of another model or output size are never served. A small
+    in-memory LRU sits in front of a SQLite file that holds float32 vectors
+    and is trimmed back to ``max_entries`` by least-recent access.
+    """
+
+    def __init__(
+        self, path: str, max_entries: int = 100_000, memory_entries: int = 4096
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[
+            0
+        ]
+
+    @staticmethod
+    def make_key(model: str, dimension: int, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimension}:{digest}"
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(
+        self, model: str, dimension: int, texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order, None where missing"""
+        keys = [self.make_key(model, dimension, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+
+        with self._lock:
+            disk_lookup: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup:
+                lookup_keys = list(disk_lookup)
+                found = []
+                for start in range(0, len(lookup_keys), 500):
+                    chunk = lookup_keys[start : start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    found.extend(
+                        self._conn.execute(
+                            f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                            chunk,
+                        ).fetchall()
+                    )
+
+                now = time.time()
+                for key, blob in found:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    for i in disk_lookup[key]:
+                        results[i] = vector
+                    self.disk_hits += len(disk_lookup[key])
+
+                if found:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in found],
+                    )
+                    self._conn.commit()
+
+            self.misses += sum(1 for r in results if r is None)
+
+        return results
+
+    def put_many(
+        self,
+        model: str,
+        dimension: int,
+        texts: List[str],
+        vectors: List[List[float]],
+    ):
+        """Store vectors for texts, evicting the least recently used entries"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model, dimension, text)
+                self._remember(key, list(vector))
+                rows.append(
+                    (key, model, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                )
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._count = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+            if self._count > self.max_entries:
+                overflow = self._count - self.max_entries
+                self._conn.execute(
+                    """
+                    DELETE FROM embeddings WHERE key IN (
+                        SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,),
+                )
+                self._count -= overflow
+                logger.info(f"Evicted {overflow} embeddings from cache {self.path}")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": self._count,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                round((self.memory_hits + self.disk_hits) / lookups, 4)
+                if lookups
+                else 0.0
+            ),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import pathlib
+import sys
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from openai import AsyncOpenAI
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider(ABC):
+    """Base class for embedding backends used by the vector store"""
+
+    name: str = ""
+    model: str = ""
+    dimension: int = 0
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in input order"""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI embeddings API"""
+
+    name = "openai"
+
+    def __init__(self, openai_client: AsyncOpenAI, model: str, dimension: int):
+        self.openai_client = openai_client
+        self.model = model
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        res = await self.openai_client.embeddings.create(model=self.model, input=texts)
+        return [d.embedding for d in res.data]
+
+
+class FastEmbedProvider(EmbeddingProvider):
+    """
+    Local ONNX embeddings on CPU through fastembed.
+
+    The model is downloaded once into ``cache_dir`` and then runs fully
+    offline. Inference runs in a worker thread to keep the event loop free.
+    """
+
+    name = "fastembed"
+
+    def __init__(
+        self,
+        model: str,
+        cache_dir: Optional[str] = None,
+        threads: Optional[int] = None,
+    ):
+        try:
+            from fastembed import TextEmbedding
+        except ImportError as e:
+            raise ImportError(
+                "fastembed is required for embedding_provider='fastembed'. "
+                "Install qdrant-client[fastembed]."
+            ) from e
+
+        supported = {
+            description["model"]: description["dim"]
+            for description in TextEmbedding.list_supported_models()
+        }
+        if model not in supported:
+            raise ValueError(f"Unsupported fastembed model: {model}")
+
+        self.model = model
+        self.dimension = supported[model]
+        self._model = TextEmbedding(
+            model_name=model, cache_dir=cache_dir, threads=threads
+        )
+        logger.info(f"Loaded fastembed model {model} ({self.dimension} dims)")
+
+    def _embed_sync(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self._model.embed(texts)]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._embed_sync, texts)
+
+
+def get_embedding_provider(openai_client: AsyncOpenAI) -> EmbeddingProvider:
+    """Create the embedding provider selected in settings"""
+    if settings.embedding_provider == "openai":
+        return OpenAIEmbeddingProvider(
+            openai_client, settings.embedding_model, settings.vector_size
+        )
+    if settings.embedding_provider == "fastembed":
+        return FastEmbedProvider(
+            settings.fastembed_model,
+            cache_dir=settings.FASTEMBED_CACHE_DIR,
+            threads=settings.fastembed_threads,
+        )
+    raise ValueError(f"Unknown embedding provider: {settings.embedding_provider}")
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import pathlib
+import sys
+from typing import Any, Dict, List, Optional
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+from database.vector_db.lexical_index import BM25Index
+from database.vector_db.payload_table import project_payload
+
+logger = logging.getLogger(__name__)
+
+
+def _result_key(payload: Dict[str, Any]) -> str:
+    return str(payload.get("id") or payload.get("product_tax_code"))
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]], k: int = 60
+) -> List[Dict[str, Any]]:
+    """Fuse ranked payload lists by summing 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, payload in enumerate(results, 1):
+            key = _result_key(payload)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            payloads.setdefault(key, payload)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [payloads[key] for key in ranked]
+
+
+class HybridRetriever:
+    """
+    Sparse + dense tax category retrieval.
+
+    Runs the in-process BM25 index alongside the dense store and fuses both
+    rankings with reciprocal rank fusion. If the dense search fails or does
+    not answer within ``dense_timeout`` seconds, the lexical ranking alone
+    is returned. In "lexical" mode the dense store is not called at all.
+    """
+
+    def __init__(
+        self,
+        dense_store,
+        collection_name: str,
+        lexical_index: BM25Index,
+        mode: str = "hybrid",
+    ):
+        self.dense_store = dense_store
+        self.collection_name = collection_name
+        self.lexical_index = lexical_index
+        self.mode = mode
+
+        self.dense_failures = 0
+
+    async def _dense_search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(
+                self.dense_store.search(self.collection_name, query, top_k),
+                timeout=settings.hybrid_dense_timeout_seconds,
+            )
+        except Exception as e:
+            self.dense_failures += 1
+            logger.warning(
+                f"Dense search unavailable ({type(e).__name__}), using lexical results"
+            )
+            return []
+
+    async def _dense_search_many(
+        self, queries: List[str], top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        try:
+            return await asyncio.wait_for(
+                self.dense_store.search_many(self.collection_name, queries, top_k),
+                timeout=settings.hybrid_dense_timeout_seconds,
+            )
+        except Exception as e:
+            self.dense_failures += 1
+            logger.warning(
+                f"Dense search unavailable ({type(e).__name__}), using lexical results"
+            )
+            return [[] for _ in queries]
+
+    def _fuse(
+        self,
+        lexical_results: List[Dict[str, Any]],
+        dense_results: Optional[List[Dict[str, Any]]],
+        top_k: int,
+        payload_fields: Optional[List[str]],
+    ) -> List[Dict[str, Any]]:
+        results = lexical_results
+        if dense_results is not None:
+            results = reciprocal_rank_fusion(
+                [dense_results, lexical_results], k=settings.hybrid_rrf_k
+            )
+        return [project_payload(payload, payload_fields) for payload in results[:top_k]]
+
+    async def search(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fuses lexical and dense results for the tax category collection.
+        """
+        if collection_name != self.collection_name:
+            return await self.dense_store.search(
+                collection_name, query, top_k, payload_fields
+            )
+
+        candidate_k = max(top_k, settings.hybrid_candidate_k)
+        dense_results = None
+        if self.mode != "lexical":
+            dense_results = await self._dense_search(query, candidate_k)
+        return self._fuse(
+            self.lexical_index.search(query, candidate_k),
+            dense_results,
+            top_k,
+            payload_fields,
+        )
+
+    async def search_many(
+        self,
+        collection_name: str,
+        queries: List[str],
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Fuses lexical and dense results for a batch of queries, with a
+        single batched dense search for all of them.
+        """
+        if collection_name != self.collection_name:
+            return await self.dense_store.search_many(
+                collection_name, queries, top_k, payload_fields
+            )
+        if not queries:
+            return []
+
+        candidate_k = max(top_k, settings.hybrid_candidate_k)
+        dense_results = (
+            await self._dense_search_many(queries, candidate_k)
+            if self.mode != "lexical"
+            else None
+        )
+        return [
+            self._fuse(
+                self.lexical_index.search(query, candidate_k),
+                dense_results[i] if dense_results is not None else None,
+                top_k,
+                payload_fields,
+            )
+            for i, query in enumerate(queries)
+        ]
+
+    async def close(self):
+        await self.dense_store.close()
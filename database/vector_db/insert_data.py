@@ -5,9 +5,13 @@ import logging
 import asyncio
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
-from openai import AsyncOpenAI
 from config.config import settings
-from database.vector_db.vector_store import QdrantVectorStore
+from utils.rate_limiter import create_openai_client
+from database.vector_db.vector_store import (
+    QdrantVectorStore,
+    TAX_CATEGORY_TEXT_FIELDS,
+)
+from database.vector_db.local_index import LocalVectorIndex
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +21,7 @@ async def insert_tax_categories():
     """Extract tax categories from JSON and upsert into Qdrant vector store"""
     try:
         
-        openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=5)
+        openai_client = create_openai_client()
         vector_store = QdrantVectorStore(openai_client=openai_client)
 
         logger.info(f"Loading tax categories from: {settings.TAX_CATEGORIES_FILE}")
@@ -36,17 +40,31 @@ async def insert_tax_categories():
 
         logger.info(f"Found {len(data_items)} tax categories")
 
-        text_fields = ["name", "description", "product_tax_code"]
+        text_fields = TAX_CATEGORY_TEXT_FIELDS
 
-        # Upload to Qdrant
-        await vector_store.qdrant_connection(
+        # Sync to Qdrant: only added or changed rows are embedded and upserted
+        report = await vector_store.qdrant_connection(
             collection_name=settings.collection_name,
             data=data_items,
             text_data=text_fields,
+            sync=True,
         )
+        if report:
+            logger.info(
+                f"Added: {report['added']}, changed: {report['changed']}, "
+                f"unchanged: {report['unchanged']}, deleted: {report['deleted']}, "
+                f"failed: {report['failed']}"
+            )
 
         logger.info("Successfully inserted tax categories into Qdrant")
 
+        # Refresh the in-process index so it matches the collection
+        if settings.local_index_enabled:
+            local_index = LocalVectorIndex(
+                vector_store, settings.collection_name, settings.LOCAL_INDEX_DIR
+            )
+            await local_index.export_from_qdrant()
+
         # Close connection
         await vector_store.close()
 
@@ -0,0 +1,108 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Labels added by format_product_for_llm and common filler words
+STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "as",
+    "at",
+    "be",
+    "benefits",
+    "by",
+    "catalog",
+    "description",
+    "features",
+    "for",
+    "from",
+    "full",
+    "group",
+    "in",
+    "is",
+    "measure",
+    "number",
+    "of",
+    "on",
+    "or",
+    "product",
+    "short",
+    "that",
+    "the",
+    "to",
+    "unit",
+    "vendor",
+    "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens, keeping codes such as 81112200a2310 whole"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over a list of payload dicts.
+
+    Each document is the concatenation of ``text_fields``; the payloads are
+    returned unchanged so results look like vector store hits.
+    """
+
+    def __init__(
+        self,
+        documents: List[Dict[str, Any]],
+        text_fields: List[str],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+
+        for doc_id, doc in enumerate(documents):
+            text = " ".join(str(doc.get(field) or "") for field in text_fields)
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+        total_docs = len(documents)
+        self.avg_length = (
+            sum(self.doc_lengths) / total_docs if total_docs else 0.0
+        ) or 1.0
+        self.idf = {
+            term: math.log(1 + (total_docs - len(posts) + 0.5) / (len(posts) + 0.5))
+            for term, posts in self.postings.items()
+        }
+
+    def score(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posts = self.postings.get(term)
+            if not posts:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in posts:
+                norm = self.k1 * (
+                    1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + norm
+                )
+        return scores
+
+    def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        scores = self.score(query)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [dict(self.documents[doc_id]) for doc_id, _ in ranked[:top_k]]
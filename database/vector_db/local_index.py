@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from qdrant_client.http import models
+from database.vector_db.vector_store import QdrantVectorStore, CONTENT_HASH_FIELD
+from database.vector_db.payload_table import project_payload
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorIndex:
+    """
+    In-process exact-search index for a small Qdrant collection.
+
+    The collection's vectors are exported once into a contiguous, L2-normalised
+    float32 matrix on disk and memory-mapped back in, so a query is a single
+    matrix-vector product followed by ``argpartition``. Exposes the same
+    ``search(collection_name, query, top_k)`` contract as QdrantVectorStore and
+    delegates any other collection to the wrapped store.
+    """
+
+    def __init__(
+        self, vector_store: QdrantVectorStore, collection_name: str, index_dir: str
+    ):
+        self.vector_store = vector_store
+        self.collection_name = collection_name
+        self.vectors_path = os.path.join(index_dir, f"{collection_name}.npy")
+        self.payloads_path = os.path.join(index_dir, f"{collection_name}.json")
+
+        self.vectors: Optional[np.ndarray] = None
+        self.payloads: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+
+    def load(self) -> bool:
+        """Memory-map the exported matrix and load its payloads"""
+        if not (
+            os.path.exists(self.vectors_path) and os.path.exists(self.payloads_path)
+        ):
+            return False
+
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        with open(self.payloads_path, "r") as f:
+            payloads = json.load(f)
+
+        if vectors.ndim != 2 or vectors.shape[0] != len(payloads):
+            logger.warning(
+                f"Local index for '{self.collection_name}' is inconsistent "
+                f"({vectors.shape[0]} vectors, {len(payloads)} payloads). Ignoring it."
+            )
+            return False
+
+        self.vectors = vectors
+        self.payloads = payloads
+        logger.info(
+            f"Loaded local index for '{self.collection_name}': "
+            f"{vectors.shape[0]} x {vectors.shape[1]}"
+        )
+        return True
+
+    async def export_from_qdrant(self, batch_size: int = 256) -> int:
+        """
+        Copy every vector and payload out of Qdrant into the on-disk index.
+        No embedding calls are made; the stored vectors are reused as-is.
+        """
+        vectors: List[List[float]] = []
+        payloads: List[Dict[str, Any]] = []
+        offset = None
+
+        while True:
+            points, offset = await self.vector_store.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=models.PayloadSelectorExclude(
+                    exclude=[CONTENT_HASH_FIELD]
+                ),
+                with_vectors=True,
+            )
+            for point in points:
+                vectors.append(point.vector)  # type:ignore
+                payloads.append(point.payload or {})
+            if offset is None:
+                break
+
+        if not vectors:
+            logger.warning(f"Collection '{self.collection_name}' is empty")
+            return 0
+
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+
+        os.makedirs(os.path.dirname(self.vectors_path), exist_ok=True)
+        tmp_vectors = self.vectors_path + ".tmp.npy"
+        tmp_payloads = self.payloads_path + ".tmp"
+        np.save(tmp_vectors, matrix)
+        with open(tmp_payloads, "w") as f:
+            json.dump(payloads, f)
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_payloads, self.payloads_path)
+
+        logger.info(
+            f"Exported {len(payloads)} vectors from '{self.collection_name}' "
+            f"to {self.vectors_path}"
+        )
+        self.vectors = None
+        self.load()
+        return len(payloads)
+
+    async def ensure_loaded(self) -> bool:
+        """Load the index, exporting it from Qdrant first if it is missing"""
+        if self.vectors is not None:
+            return True
+
+        async with self._lock:
+            if self.vectors is not None:
+                return True
+            if self.load():
+                return True
+            await self.export_from_qdrant()
+            return self.vectors is not None
+
+    def search_vector(
+        self,
+        query_vector: List[float],
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Exact cosine top-k for an already-embedded query"""
+        if self.vectors is None or top_k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = self.vectors @ query
+        k = min(top_k, scores.shape[0])
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+
+        return [project_payload(self.payloads[i], payload_fields) for i in top]
+
+    def search_vectors(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Exact cosine top-k for a batch of already-embedded queries"""
+        if self.vectors is None or top_k <= 0 or not query_vectors:
+            return [[] for _ in query_vectors]
+
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        scores = queries @ self.vectors.T
+        k = min(top_k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        return [
+            [project_payload(self.payloads[i], payload_fields) for i in row]
+            for row in top
+        ]
+
+    async def search(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Embeds query and searches the local matrix.
+        """
+        if collection_name != self.collection_name:
+            return await self.vector_store.search(
+                collection_name, query, top_k, payload_fields
+            )
+
+        try:
+            if not await self.ensure_loaded():
+                return await self.vector_store.search(
+                    collection_name, query, top_k, payload_fields
+                )
+
+            query_vector = await self.vector_store.embed_query(query)
+            return self.search_vector(query_vector, top_k, payload_fields)
+
+        except Exception as e:
+            logger.error(f"Local search error in {collection_name}: {e}")
+            return []
+
+    async def search_many(
+        self,
+        collection_name: str,
+        queries: List[str],
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Embeds all queries together and scores them against the local
+        matrix in a single matrix product.
+        """
+        if collection_name != self.collection_name:
+            return await self.vector_store.search_many(
+                collection_name, queries, top_k, payload_fields
+            )
+        if not queries:
+            return []
+
+        try:
+            if not await self.ensure_loaded():
+                return await self.vector_store.search_many(
+                    collection_name, queries, top_k, payload_fields
+                )
+
+            query_vectors = await self.vector_store.embed_queries(queries)
+            return self.search_vectors(query_vectors, top_k, payload_fields)
+
+        except Exception as e:
+            logger.error(f"Local batch search error in {collection_name}: {e}")
+            raise
+
+    async def close(self):
+        await self.vector_store.close()
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-text requests into batched calls.
+
+    Texts submitted through ``submit`` wait up to ``max_wait_ms`` (or until
+    ``max_batch_size`` texts are queued) and are then sent together in one
+    call to ``batch_fn``, which returns one result per text in order; each
+    caller receives its own result.
+    """
+
+    name = "Micro"
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], Awaitable[List[Any]]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.batch_sizes: Counter = Counter()
+
+    async def submit(self, text: str) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.batch_sizes[len(batch)] += 1
+
+        try:
+            results = await self.batch_fn(texts)
+            by_text = dict(zip(texts, results))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        batched = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "requests": self.requests,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": (
+                round(batched / self.batches, 2) if self.batches else 0.0
+            ),
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+class EmbeddingBatcher(MicroBatcher):
+    """Coalesces concurrent single-text embedding requests into one API call"""
+
+    name = "Embedding"
+
+    async def embed(self, text: str) -> List[float]:
+        return await self.submit(text)
+
+
+class SearchBatcher(MicroBatcher):
+    """Coalesces concurrent searches into one ``search_many`` call"""
+
+    name = "Search"
+
+    async def search(self, query: str) -> List[Dict[str, Any]]:
+        return await self.submit(query)
@@ -0,0 +1,56 @@
+import pathlib
+import sys
+import asyncio
+import logging
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+from utils.rate_limiter import create_openai_client
+from database.vector_db.vector_store import QdrantVectorStore
+from database.vector_db.collection_profiles import (
+    COLLECTION_PROFILES,
+    apply_profile,
+    get_profile_name,
+)
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+async def migrate_collection(collection_name: str, profile_name: str):
+    """Move an existing Qdrant collection to another provisioning profile"""
+    try:
+        openai_client = create_openai_client()
+        vector_store = QdrantVectorStore(openai_client=openai_client)
+
+        if not await vector_store.client.collection_exists(collection_name):
+            logger.error(f"Collection '{collection_name}' does not exist!")
+            return
+
+        await apply_profile(vector_store.client, collection_name, profile_name)
+
+        info = await vector_store.client.get_collection(collection_name)
+        logger.info(f"HNSW config: {info.config.hnsw_config}")
+        logger.info(f"Quantization: {info.config.quantization_config}")
+        logger.info(f"Payload indexes: {list((info.payload_schema or {}).keys())}")
+        logger.info(
+            f"Set collection_profile={profile_name} so searches use its parameters"
+        )
+
+        await vector_store.close()
+
+    except Exception as e:
+        logger.error(f"Error migrating collection: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    # Usage: python database/vector_db/migrate_collection.py <profile> [collection]
+    collection = sys.argv[2] if len(sys.argv) > 2 else settings.collection_name
+    profile = sys.argv[1] if len(sys.argv) > 1 else get_profile_name(collection)
+    if profile not in COLLECTION_PROFILES:
+        sys.exit(
+            f"Unknown profile '{profile}'. Available: {', '.join(COLLECTION_PROFILES)}"
+        )
+    asyncio.run(migrate_collection(collection, profile))
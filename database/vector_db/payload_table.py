@@ -0,0 +1,43 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def project_payload(
+    payload: Dict[str, Any], fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Keep only the requested payload fields (all of them when fields is None)"""
+    if fields is None:
+        return dict(payload)
+    return {field: payload[field] for field in fields if field in payload}
+
+
+class PayloadTable:
+    """
+    In-memory point id -> payload table.
+
+    Lets a search ask Qdrant for ids and scores only and resolve the
+    payloads locally from rows loaded once at startup.
+    """
+
+    def __init__(self, payloads: Dict[str, Dict[str, Any]]):
+        self.payloads = payloads
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def resolve(
+        self, point_ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Payloads for point ids in order, skipping ids missing from the table"""
+        results = []
+        for point_id in point_ids:
+            payload = self.payloads.get(point_id)
+            if payload is None:
+                self.misses += 1
+                logger.warning(f"Point {point_id} not found in local payload table")
+                continue
+            results.append(project_payload(payload, fields))
+        return results
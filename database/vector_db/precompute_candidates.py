@@ -0,0 +1,86 @@
+import pathlib
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+from config.config import settings
+from utils.rate_limiter import create_openai_client
+from database.vector_db.vector_store import QdrantVectorStore
+from database.vector_db.local_index import LocalVectorIndex
+from utils.helper import format_product_for_llm, product_fingerprint
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+async def precompute_tax_candidates(batch_size: int = 256):
+    """
+    Embed the whole catalog in large batches and store the top-k tax
+    candidates of every product, keyed by product fingerprint.
+    """
+    try:
+        openai_client = create_openai_client()
+        vector_store = QdrantVectorStore(openai_client=openai_client)
+        tax_index = LocalVectorIndex(
+            vector_store, settings.collection_name, settings.LOCAL_INDEX_DIR
+        )
+
+        logger.info(f"Loading catalog from: {settings.CATALOG_FILE}")
+        with open(settings.CATALOG_FILE, "r") as f:
+            catalog = json.load(f)
+
+        started = time.perf_counter()
+        texts = [format_product_for_llm(product) for product in catalog]
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(await vector_store.embed(texts[i : i + batch_size]))
+            logger.info(f"Embedded {min(i + batch_size, len(texts))}/{len(texts)}")
+
+        if not await tax_index.ensure_loaded():
+            logger.error("Tax category index is empty. Run insert_data.py first.")
+            return
+
+        # One matrix product scores every product against every tax category
+        top_k = settings.candidate_table_top_k
+        results = tax_index.search_vectors(vectors, top_k, payload_fields=["id"])
+
+        candidates = {}
+        for product, hits in zip(catalog, results):
+            candidates[product_fingerprint(product)] = {
+                "item_num": product.get("Item Num"),
+                "ids": [str(hit["id"]) for hit in hits],
+            }
+
+        output = {
+            "embedding_model": vector_store.embedding_model,
+            "collection_name": settings.collection_name,
+            "top_k": top_k,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "candidates": candidates,
+        }
+        tmp_path = settings.CANDIDATE_TABLE_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(output, f, separators=(",", ":"))
+        os.replace(tmp_path, settings.CANDIDATE_TABLE_FILE)
+
+        logger.info(
+            f"Stored candidates for {len(candidates)} products in "
+            f"{settings.CANDIDATE_TABLE_FILE} ({time.perf_counter() - started:.1f}s)"
+        )
+
+        await vector_store.close()
+
+    except FileNotFoundError:
+        logger.error(f"Catalog file not found: {settings.CATALOG_FILE}")
+    except Exception as e:
+        logger.error(f"Error precomputing tax candidates: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(precompute_tax_candidates())
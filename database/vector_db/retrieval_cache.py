@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from database.vector_db.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+PACK_PATTERN = re.compile(r"\([^)]*\)")
+
+CacheKey = Tuple[str, str]
+
+
+def normalize_group(group: str) -> str:
+    return " ".join(group.lower().split())
+
+
+def description_tokens(description: str) -> FrozenSet[str]:
+    """Tokens of a short description without pack counts, sizes and gauges"""
+    text = PACK_PATTERN.sub(" ", description.lower())
+    return frozenset(
+        token
+        for token in tokenize(text)
+        if len(token) > 1 and not any(char.isdigit() for char in token)
+    )
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("tokens", "future", "created_at")
+
+    def __init__(self, tokens: FrozenSet[str], future: asyncio.Future):
+        self.tokens = tokens
+        self.future = future
+        self.created_at = time.monotonic()
+
+
+class GroupRetrievalCache:
+    """
+    Shares tax candidate sets between products of the same Structure Group.
+
+    Entries are keyed by the normalized Structure Group and short
+    description. A lookup reuses an entry of the same group whose
+    description tokens have a Jaccard similarity of at least
+    ``similarity_threshold``. Searches still in flight are shared too, so a
+    concurrent batch of siblings waits for one search instead of issuing
+    its own. Entries expire after ``ttl_seconds`` and the least recently
+    used ones are evicted beyond ``max_entries``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.5,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._groups: Dict[str, Dict[str, _Entry]] = {}
+
+        self.hits = 0
+        self.sibling_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key, None)
+        group_entries = self._groups.get(key[0])
+        if group_entries is not None:
+            group_entries.pop(key[1], None)
+            if not group_entries:
+                del self._groups[key[0]]
+
+    def _find(
+        self, group: str, description: str, tokens: FrozenSet[str]
+    ) -> Optional[Tuple[CacheKey, _Entry]]:
+        group_entries = self._groups.get(group, {})
+
+        best: Optional[Tuple[CacheKey, _Entry]] = None
+        best_score = -1.0
+        for cached_description, entry in list(group_entries.items()):
+            key = (group, cached_description)
+            if self._expired(entry):
+                self._remove(key)
+                continue
+            score = (
+                1.0
+                if cached_description == description
+                else jaccard(tokens, entry.tokens)
+            )
+            if score >= self.similarity_threshold and score > best_score:
+                best, best_score = (key, entry), score
+        return best
+
+    def _insert(self, key: CacheKey, entry: _Entry):
+        self._entries[key] = entry
+        self._groups.setdefault(key[0], {})[key[1]] = entry
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def get_or_search(
+        self,
+        group: str,
+        description: str,
+        search: Callable[[], Awaitable[List[Dict[str, Any]]]],
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Candidates for a product, reusing a sibling's when one is close
+        enough. Returns the results and whether they came from the cache.
+        """
+        group = normalize_group(group)
+        tokens = description_tokens(description)
+        description = " ".join(sorted(tokens))
+
+        # A failed search drops its entry, so this ends once none is left
+        while (found := self._find(group, description, tokens)) is not None:
+            key, entry = found
+            self._entries.move_to_end(key)
+            try:
+                results = await asyncio.shield(entry.future)
+            except asyncio.CancelledError:
+                # The owning search was cancelled, not this lookup
+                if entry.future.cancelled():
+                    continue
+                raise
+            except Exception:
+                continue
+            if key[1] == description:
+                self.hits += 1
+            else:
+                self.sibling_hits += 1
+            return results, True
+
+        self.misses += 1
+        key = (group, description)
+        entry = _Entry(tokens, asyncio.get_running_loop().create_future())
+        self._insert(key, entry)
+        try:
+            results = await search()
+        except BaseException as e:
+            # Cancellation too, or siblings waiting on the entry would hang
+            if self._entries.get(key) is entry:
+                self._remove(key)
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                # Mark the exception retrieved so asyncio doesn't log it without waiters
+                entry.future.exception()
+            raise
+
+        # Searches that swallow errors return no candidates; don't share those
+        if not results and self._entries.get(key) is entry:
+            self._remove(key)
+        entry.future.set_result(results)
+        return results, False
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.sibling_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "groups": len(self._groups),
+            "hits": self.hits,
+            "sibling_hits": self.sibling_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (
+                round((self.hits + self.sibling_hits) / lookups, 4) if lookups else 0.0
+            ),
+        }
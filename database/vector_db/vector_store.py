@@ -2,47 +2,180 @@ from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+import json
 import logging
 import pathlib
 import sys
+import time
 import uuid
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
 from config.config import settings
+from database.vector_db.embedding_cache import EmbeddingCache
+from database.vector_db.micro_batcher import EmbeddingBatcher
+from database.vector_db.embedding_provider import get_embedding_provider
+from database.vector_db.collection_profiles import (
+    create_collection,
+    ensure_payload_indexes,
+    get_profile_name,
+    search_params,
+)
+from database.vector_db.payload_table import PayloadTable
+from utils.helper import load_tax_categories
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+CONTENT_HASH_FIELD = "content_hash"
+TAX_CATEGORY_TEXT_FIELDS = ["name", "description", "product_tax_code"]
+
 
 class QdrantVectorStore:
     def __init__(self, openai_client: AsyncOpenAI):
         self.openai_client = openai_client
+        self.embedding_provider = get_embedding_provider(openai_client)
         self.client = AsyncQdrantClient(
             url=settings.QDRANT_URl, api_key=settings.QDRANT_API_KEY
         )
+        self.embedding_cache = (
+            EmbeddingCache(
+                settings.TAX_EMBEDDINGS_CACHE,
+                max_entries=settings.embedding_cache_max_entries,
+                memory_entries=settings.embedding_cache_memory_entries,
+            )
+            if settings.embedding_cache_enabled
+            else None
+        )
+        self.embedding_batcher = (
+            EmbeddingBatcher(
+                self._embed_remote,
+                max_batch_size=settings.embedding_batch_max_size,
+                max_wait_ms=settings.embedding_batch_max_wait_ms,
+            )
+            if settings.embedding_batch_enabled
+            else None
+        )
+        self.payload_tables: Dict[str, PayloadTable] = {}
+        if settings.search_payload_mode == "local":
+            self.register_payload_table(
+                settings.collection_name,
+                load_tax_categories(settings.TAX_CATEGORIES_FILE),
+                TAX_CATEGORY_TEXT_FIELDS,
+            )
+
+    @property
+    def embedding_model(self) -> str:
+        return self.embedding_provider.model
+
+    async def _embed_remote(self, texts: List[str]) -> List[List[float]]:
+        return await self.embedding_provider.embed(texts)
 
     async def embed(self, texts: List[str]) -> List[List[float]]:
-        res = await self.openai_client.embeddings.create(
-            model=settings.embedding_model, input=texts
+        """
+        Embeds texts, serving repeats from the embedding cache and sending
+        only the unseen texts to the API in a single request.
+        """
+        if self.embedding_cache is None:
+            return await self._embed_remote(texts)
+
+        # SQLite lookups and writes run in a worker thread, off the event loop
+        vectors = await asyncio.to_thread(
+            self.embedding_cache.get_many,
+            self.embedding_model,
+            self.embedding_provider.dimension,
+            texts,
         )
-        return [d.embedding for d in res.data]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = await self._embed_remote(missing)
+            await asyncio.to_thread(
+                self.embedding_cache.put_many,
+                self.embedding_model,
+                self.embedding_provider.dimension,
+                missing,
+                fresh,
+            )
+            by_text = dict(zip(missing, fresh))
+            vectors = [
+                v if v is not None else by_text[t] for t, v in zip(texts, vectors)
+            ]
+
+        return vectors  # type:ignore
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embeds search queries. Cache misses are coalesced with other
+        concurrent queries by the micro-batcher into one API request.
+        """
+        if self.embedding_batcher is None:
+            return await self.embed(queries)
+
+        vectors: List[Optional[List[float]]] = [None] * len(queries)
+        if self.embedding_cache is not None:
+            vectors = await asyncio.to_thread(
+                self.embedding_cache.get_many,
+                self.embedding_model,
+                self.embedding_provider.dimension,
+                queries,
+            )
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        if missing:
+            fresh = await asyncio.gather(
+                *(self.embedding_batcher.embed(query) for query in missing)
+            )
+            if self.embedding_cache is not None:
+                await asyncio.to_thread(
+                    self.embedding_cache.put_many,
+                    self.embedding_model,
+                    self.embedding_provider.dimension,
+                    missing,
+                    list(fresh),
+                )
+            by_query = dict(zip(missing, fresh))
+            vectors = [
+                v if v is not None else by_query[q] for q, v in zip(queries, vectors)
+            ]
+
+        return vectors  # type:ignore
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Embeds a single query, see embed_queries"""
+        return (await self.embed_queries([query]))[0]
 
     async def qdrant_connection(
-        self, collection_name: str, data: List[Dict[str, Any]], text_data: List[str]
-    ):
+        self,
+        collection_name: str,
+        data: List[Dict[str, Any]],
+        text_data: List[str],
+        sync: bool = False,
+    ) -> Optional[Dict[str, int]]:
+        """
+        Ensure the collection exists and holds the data.
+
+        By default the upload is skipped when the collection already has
+        points. With ``sync=True`` only added or changed rows are embedded
+        and upserted, removed rows are deleted, and the counts are returned.
+        """
         try:
             existing_collection = await self.client.collection_exists(collection_name)
             if not existing_collection:
-                logger.info(f"Creating collection{collection_name}")
-                await self.client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=models.VectorParams(
-                        size=settings.vector_size, distance=models.Distance.COSINE
-                    ),
+                await create_collection(
+                    self.client,
+                    collection_name,
+                    self.embedding_provider.dimension,
+                    get_profile_name(collection_name),
                 )
+            else:
+                await self._check_dimension(collection_name)
+                await ensure_payload_indexes(self.client, collection_name)
+
+            if sync:
+                return await self.sync_collection(collection_name, data, text_data)
 
             count_result = await self.client.count(collection_name=collection_name)
             if count_result.count > 0:
@@ -56,83 +189,348 @@ class QdrantVectorStore:
             logger.info(f"Successfully uploaded data to '{collection_name}'.")
         except Exception as e:
             logger.warning(f"Error starting qdrant database{e}")
+        return None
 
-    async def _upload(
+    async def _check_dimension(self, collection_name: str):
+        """Warn when a collection was built with a different embedding size"""
+        info = await self.client.get_collection(collection_name)
+        size = getattr(info.config.params.vectors, "size", None)
+        if size is not None and size != self.embedding_provider.dimension:
+            logger.warning(
+                f"Collection '{collection_name}' has {size}-dim vectors but the "
+                f"'{self.embedding_provider.name}' provider produces "
+                f"{self.embedding_provider.dimension}. Use a separate collection "
+                f"per provider."
+            )
+
+    @staticmethod
+    def _item_text(item: Dict[str, Any], text_fields: List[str]) -> str:
+        return ". ".join(
+            [
+                f"{field.capitalize()}: {str(item.get(field, ''))}"
+                for field in text_fields
+                if item.get(field)
+            ]
+        )
+
+    @staticmethod
+    def _point_id(item: Dict[str, Any], text_content: str) -> str:
+        unique_str = str(
+            item.get("id") or item.get("product_tax_code") or text_content
+        )
+        return str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_str))
+
+    def _content_hash(self, item: Dict[str, Any], text_content: str) -> str:
+        """Hash of the embedded text and the stored payload of a row"""
+        payload = {k: v for k, v in item.items() if k != CONTENT_HASH_FIELD}
+        digest = hashlib.sha256()
+        digest.update(self.embedding_model.encode("utf-8"))
+        digest.update(text_content.encode("utf-8"))
+        digest.update(json.dumps(payload, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    async def sync_collection(
+        self, collection_name: str, data: List[Dict[str, Any]], text_fields: List[str]
+    ) -> Dict[str, int]:
+        """
+        Incrementally sync the collection with data using per-row content
+        hashes stored in the payload.
+        """
+        existing: Dict[str, Optional[str]] = {}
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=[CONTENT_HASH_FIELD],
+                with_vectors=False,
+            )
+            for point in points:
+                existing[str(point.id)] = (point.payload or {}).get(CONTENT_HASH_FIELD)
+            if offset is None:
+                break
+
+        to_upload: List[Dict[str, Any]] = []
+        seen = set()
+        added = changed = unchanged = 0
+        for item in data:
+            text_content = self._item_text(item, text_fields)
+            point_id = self._point_id(item, text_content)
+            seen.add(point_id)
+            if point_id not in existing:
+                added += 1
+                to_upload.append(item)
+            elif existing[point_id] != self._content_hash(item, text_content):
+                changed += 1
+                to_upload.append(item)
+            else:
+                unchanged += 1
+
+        stale = [point_id for point_id in existing if point_id not in seen]
+
+        failed = 0
+        if to_upload:
+            logger.info(
+                f"Syncing '{collection_name}': upserting {len(to_upload)} rows..."
+            )
+            upload_report = await self._upload(collection_name, to_upload, text_fields)
+            failed = upload_report["failed_items"]
+        if stale:
+            await self.client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=stale),  # type:ignore
+            )
+
+        report = {
+            "added": added,
+            "changed": changed,
+            "unchanged": unchanged,
+            "deleted": len(stale),
+            "failed": failed,
+        }
+        logger.info(f"Synced '{collection_name}': {report}")
+        return report
+
+    async def _with_retries(self, operation, description: str):
+        """Run an async operation, retrying with exponential backoff"""
+        attempts = settings.upload_max_retries + 1
+        for attempt in range(attempts):
+            try:
+                return await operation()
+            except Exception as e:
+                if attempt == attempts - 1:
+                    raise
+                delay = settings.upload_retry_backoff_seconds * (2**attempt)
+                logger.warning(
+                    f"{description} failed (attempt {attempt + 1}/{attempts}): {e}. "
+                    f"Retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _upload_batch(
         self,
         collection_name: str,
-        data: List[Dict[str, Any]],
+        start: int,
+        batch: List[Dict[str, Any]],
         text_fields: List[str],
-        batch_size: int = 100,
-    ):
+        embed_slots: asyncio.Semaphore,
+        upsert_slots: asyncio.Semaphore,
+    ) -> bool:
+        texts_to_embed = [self._item_text(item, text_fields) for item in batch]
 
-        total = len(data)
-        for i in range(0, total, batch_size):
-            batch = data[i : i + batch_size]
+        try:
+            async with embed_slots:
+                embeddings = await self._with_retries(
+                    lambda: self.embed(texts_to_embed), f"Embedding batch {start}"
+                )
 
-            texts_to_embed = []
             points = []
+            for j, item in enumerate(batch):
+                point_id = self._point_id(item, texts_to_embed[j])
+                payload = {
+                    **item,
+                    CONTENT_HASH_FIELD: self._content_hash(item, texts_to_embed[j]),
+                }
 
-            for item in batch:
-                text_content = ". ".join(
-                    [
-                        f"{field.capitalize()}: {str(item.get(field, ''))}"
-                        for field in text_fields
-                        if item.get(field)
-                    ]
+                points.append(
+                    models.PointStruct(
+                        id=point_id, vector=embeddings[j], payload=payload
+                    )
                 )
-                texts_to_embed.append(text_content)
 
-            try:
-                response = await self.openai_client.embeddings.create(
-                    input=texts_to_embed, model=settings.embedding_model
+            async with upsert_slots:
+                await self._with_retries(
+                    lambda: self.client.upsert(
+                        collection_name=collection_name, points=points
+                    ),
+                    f"Upserting batch {start}",
                 )
-                embeddings = [e.embedding for e in response.data]
+            logger.info(f"Processed batch {start}-{start + len(batch)}")
+            return True
 
-                for j, item in enumerate(batch):
-                    unique_str = str(
-                        item.get("id")
-                        or item.get("product_tax_code")
-                        or texts_to_embed[j]
-                    )
-                    point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_str))
+        except Exception as e:
+            logger.error(f"Error processing batch {start}: {e}")
+            return False
 
-                    points.append(
-                        models.PointStruct(
-                            id=point_id, vector=embeddings[j], payload=item
-                        )
-                    )
+    async def _upload(
+        self,
+        collection_name: str,
+        data: List[Dict[str, Any]],
+        text_fields: List[str],
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Pipelined upload: embedding requests for later batches overlap with
+        Qdrant upserts of earlier ones, each bounded by its own in-flight
+        limit. Failed batches are retried with backoff and reported.
+        """
+        batch_size = batch_size or settings.upload_batch_size
+        embed_slots = asyncio.Semaphore(settings.upload_max_concurrent_embeddings)
+        upsert_slots = asyncio.Semaphore(settings.upload_max_concurrent_upserts)
 
-                await self.client.upsert(collection_name=collection_name, points=points)
-                print(f"Processed batch {i + len(batch)}/{total}")
+        total = len(data)
+        started = time.perf_counter()
+        starts = list(range(0, total, batch_size))
+        results = await asyncio.gather(
+            *[
+                self._upload_batch(
+                    collection_name,
+                    i,
+                    data[i : i + batch_size],
+                    text_fields,
+                    embed_slots,
+                    upsert_slots,
+                )
+                for i in starts
+            ]
+        )
+        elapsed = time.perf_counter() - started
 
-            except Exception as e:
-                print(f"Error processing batch {i}: {e}")
+        failed_batches = [i for i, ok in zip(starts, results) if not ok]
+        failed_items = sum(len(data[i : i + batch_size]) for i in failed_batches)
+        uploaded = total - failed_items
+        report = {
+            "total": total,
+            "uploaded": uploaded,
+            "failed_items": failed_items,
+            "failed_batches": failed_batches,
+            "elapsed_seconds": round(elapsed, 2),
+            "items_per_second": round(uploaded / elapsed, 1) if elapsed else 0.0,
+        }
+
+        if failed_batches:
+            logger.warning(
+                f"Upload to '{collection_name}' finished with failures: {report}"
+            )
+        else:
+            logger.info(f"Upload to '{collection_name}' finished: {report}")
+        return report
+
+    def register_payload_table(
+        self, collection_name: str, data: List[Dict[str, Any]], text_fields: List[str]
+    ):
+        """
+        Resolve search payloads for a collection from these rows instead of
+        asking Qdrant for them. Point ids are derived exactly as on upload.
+        """
+        self.payload_tables[collection_name] = PayloadTable(
+            {
+                self._point_id(item, self._item_text(item, text_fields)): item
+                for item in data
+            }
+        )
+        logger.info(
+            f"Loaded local payload table for '{collection_name}' "
+            f"({len(self.payload_tables[collection_name])} rows)"
+        )
+
+    def _with_payload(self, collection_name: str, payload_fields: Optional[List[str]]):
+        if collection_name in self.payload_tables:
+            return False
+        if payload_fields is not None:
+            return models.PayloadSelectorInclude(include=payload_fields)
+        return models.PayloadSelectorExclude(exclude=[CONTENT_HASH_FIELD])
+
+    def _hit_payloads(
+        self, collection_name: str, points, payload_fields: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        table = self.payload_tables.get(collection_name)
+        if table is not None:
+            return table.resolve([str(hit.id) for hit in points], payload_fields)
+        return [hit.payload for hit in points]
 
     async def search(
-        self, collection_name: str, query: str, top_k: int = 10
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Embeds query and searches Qdrant.
+
+        ``payload_fields`` limits the returned payload to those keys. When a
+        local payload table is registered for the collection, Qdrant returns
+        only ids and scores and payloads are resolved from the table.
         """
         try:
-            response = await self.openai_client.embeddings.create(
-                input=query, model=settings.embedding_model
-            )
-            query_vector = response.data[0].embedding
+            query_vector = await self.embed_query(query)
 
             search_result = await self.client.query_points(
                 collection_name=collection_name,
                 query=query_vector,
                 limit=top_k,
-                with_payload=True,
+                with_payload=self._with_payload(collection_name, payload_fields),
+                search_params=search_params(get_profile_name(collection_name)),
             )
 
-            results = [hit.payload for hit in search_result.points]  # type:ignore
+            results = self._hit_payloads(
+                collection_name, search_result.points, payload_fields
+            )
             return results  # type:ignore
 
         except Exception as e:
             print(f"Search error in {collection_name}: {e}")
             return []
 
+    async def search_many(
+        self,
+        collection_name: str,
+        queries: List[str],
+        top_k: int = 10,
+        payload_fields: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Embeds all queries together and runs them through Qdrant's batch
+        query endpoint in a single round trip. Results are returned in input
+        order; errors are raised to every caller of the batch.
+        """
+        if not queries:
+            return []
+
+        try:
+            query_vectors = await self.embed_queries(queries)
+            params = search_params(get_profile_name(collection_name))
+            with_payload = self._with_payload(collection_name, payload_fields)
+
+            responses = await self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=[
+                    models.QueryRequest(
+                        query=query_vector,
+                        limit=top_k,
+                        with_payload=with_payload,
+                        params=params,
+                    )
+                    for query_vector in query_vectors
+                ],
+            )
+
+            return [
+                self._hit_payloads(collection_name, response.points, payload_fields)
+                for response in responses
+            ]
+
+        except Exception as e:
+            logger.error(f"Batch search error in {collection_name}: {e}")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Embedding cache, micro-batcher and payload table metrics"""
+        return {
+            "embedding_cache": (
+                self.embedding_cache.stats() if self.embedding_cache else None
+            ),
+            "embedding_batcher": (
+                self.embedding_batcher.stats() if self.embedding_batcher else None
+            ),
+            "payload_table_misses": sum(
+                table.misses for table in self.payload_tables.values()
+            ),
+        }
+
     async def close(self):
         await self.client.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
@@ -4,8 +4,8 @@ import asyncio
 import logging
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
-from openai import AsyncOpenAI
 from config.config import settings
+from utils.rate_limiter import create_openai_client
 from database.vector_db.vector_store import QdrantVectorStore
 
 logger = logging.getLogger(__name__)
@@ -17,7 +17,7 @@ logging.basicConfig(
 async def verify_collection():
     """Verify Qdrant collection and test search functionality"""
     try:
-        openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=5)
+        openai_client = create_openai_client()
         vector_store = QdrantVectorStore(openai_client=openai_client)
 
         collection_name = settings.collection_name
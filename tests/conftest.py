@@ -0,0 +1,19 @@
+import os
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+# Settings requires these; the tests never connect to any of them
+for name, value in {
+    "OPENAI_API_KEY": "sk-test",
+    "DATABASE_NAME": "test",
+    "HOST": "localhost",
+    "PORT": "3306",
+    "USERNAME": "test",
+    "PASSWORD": "test",
+    "QDRANT_URl": "http://localhost:6333",
+    "QDRANT_API_KEY": "test",
+    "collection_name": "tax_categories",
+}.items():
+    os.environ.setdefault(name, value)
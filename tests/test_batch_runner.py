@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import pytest
+from openai.types import Batch, FileObject
+
+from app.core.agent_tools import ProductAgentTools
+from app.core.batch_runner import BatchRunner
+from config.config import settings
+
+PRODUCTS = [
+    {
+        "Item Num": 1000 + i,
+        "Structure Group": "Masks",
+        "Vendor Name": "3M Company",
+        "Item Desc Short": f"MASK, RESPIRATOR N95 SIZE {size}",
+    }
+    for i, size in enumerate(["S", "M", "L"])
+]
+
+TAX_CATEGORY = {
+    "id": "1",
+    "product_tax_code": "51020",
+    "name": "Medical Supplies",
+    "description": "Disposable medical supplies",
+}
+
+
+def fake_reply(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat completion body the fake Batch API returns for a request"""
+    if "Classify this product" in body["messages"][-1]["content"]:
+        content = {
+            "category": {"main_category": "Masks", "subcategories": ["N95"]},
+            "tax_code": {
+                "tax_code": "51020",
+                "tax_code_name": "Medical Supplies",
+                "confidence": 0.9,
+                "reasoning": "Disposable respirator",
+            },
+        }
+    else:
+        content = {
+            "name_pattern": "3M N95 Respirator Mask",
+            "keywords": [f"n95 mask {i}" for i in range(16)],
+            "product_summary": "Summary",
+            "product_description": "Description",
+        }
+    return {
+        "choices": [{"message": {"role": "assistant", "content": json.dumps(content)}}],
+        "usage": {"prompt_tokens": 80, "completion_tokens": 20, "total_tokens": 100},
+    }
+
+
+class FakeBatchClient:
+    """
+    In-memory stand-in for the files and batches endpoints of AsyncOpenAI.
+
+    A batch is in progress on its first poll and completed on the next.
+    ``interrupt_polls`` makes that many polls raise, as a dropped
+    connection or killed process would.
+    """
+
+    def __init__(self):
+        self.files_store: Dict[str, str] = {}
+        self.batches_store: Dict[str, Dict[str, Any]] = {}
+        self.polls: Dict[str, int] = {}
+        self.interrupt_polls = 0
+        self.created = 0
+        self.files = SimpleNamespace(create=self._create_file, content=self._content)
+        self.batches = SimpleNamespace(
+            create=self._create_batch, list=self._list, retrieve=self._retrieve
+        )
+
+    def _store(self, text: str) -> str:
+        file_id = f"file-{uuid.uuid4().hex[:8]}"
+        self.files_store[file_id] = text
+        return file_id
+
+    async def _create_file(self, file, purpose: str) -> FileObject:
+        name, data = file
+        return FileObject(
+            id=self._store(data.decode("utf-8")),
+            bytes=len(data),
+            created_at=int(time.time()),
+            filename=name,
+            object="file",
+            purpose=purpose,
+            status="processed",
+        )
+
+    async def _content(self, file_id: str):
+        return SimpleNamespace(text=self.files_store[file_id])
+
+    async def _create_batch(
+        self,
+        input_file_id: str,
+        endpoint: str,
+        completion_window: str,
+        metadata: Optional[Dict[str, str]] = None,
+    ) -> Batch:
+        self.created += 1
+        batch_id = f"batch_{uuid.uuid4().hex[:8]}"
+        self.batches_store[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": metadata,
+        }
+        self.polls[batch_id] = 0
+        return Batch(**self.batches_store[batch_id])
+
+    async def _list(self, limit: int = 20):
+        batches = [Batch(**batch) for batch in self.batches_store.values()]
+        return SimpleNamespace(data=batches[::-1][:limit])
+
+    async def _retrieve(self, batch_id: str) -> Batch:
+        if self.interrupt_polls:
+            self.interrupt_polls -= 1
+            raise ConnectionError("poll interrupted")
+        batch = self.batches_store[batch_id]
+        self.polls[batch_id] += 1
+        if self.polls[batch_id] == 1:
+            batch["status"] = "in_progress"
+        elif batch["status"] != "completed":
+            lines = self.files_store[batch["input_file_id"]].splitlines()
+            output = []
+            for line in lines:
+                request = json.loads(line)
+                output.append(
+                    {
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": fake_reply(request["body"]),
+                        },
+                        "error": None,
+                    }
+                )
+            batch.update(
+                status="completed",
+                output_file_id=self._store("\n".join(map(json.dumps, output))),
+                request_counts={
+                    "total": len(lines),
+                    "completed": len(lines),
+                    "failed": 0,
+                },
+            )
+        return Batch(**batch)
+
+
+class FakeVectorStore:
+    async def search(self, collection_name, query, top_k=10, payload_fields=None):
+        return [TAX_CATEGORY]
+
+
+@pytest.fixture
+def batch_client() -> FakeBatchClient:
+    return FakeBatchClient()
+
+
+@pytest.fixture
+def agent(monkeypatch) -> SimpleNamespace:
+    monkeypatch.setattr(settings, "openai_batch_poll_seconds", 0.0)
+    return SimpleNamespace(tools=ProductAgentTools(None, FakeVectorStore()))  # type:ignore
+
+
+def read_state(run_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(run_dir, "state.json"), "r") as f:
+        return json.load(f)
+
+
+def test_resumes_after_interrupted_poll(tmp_path, agent, batch_client):
+    run_dir = str(tmp_path / "run")
+    batch_client.interrupt_polls = 1
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(BatchRunner(agent, batch_client, run_dir).run(PRODUCTS))
+
+    # The submitted batch was checkpointed before the poll failed
+    content = read_state(run_dir)["phases"]["content"]["batches"]
+    assert [batch["status"] for batch in content] == ["validating"]
+    assert batch_client.created == 1
+
+    outputs: List[Dict[str, Any]] = asyncio.run(
+        BatchRunner(agent, batch_client, run_dir).run(PRODUCTS)
+    )
+
+    # The content batch was polled again, not submitted again
+    phases = read_state(run_dir)["phases"]
+    assert phases["content"]["batches"][0]["batch_id"] == content[0]["batch_id"]
+    assert batch_client.created == 2
+    assert all(
+        batch["status"] == "completed"
+        for phase in phases.values()
+        for batch in phase["batches"]
+    )
+    assert [output["tax_code"] for output in outputs] == ["51020"] * len(PRODUCTS)
+    assert outputs[0]["name_pattern"] == "3M N95 Respirator Mask"
+    assert outputs[0]["total_tokens"] == 200
+
+
+def test_finished_run_is_not_resubmitted(tmp_path, agent, batch_client):
+    run_dir = str(tmp_path / "run")
+    first = asyncio.run(BatchRunner(agent, batch_client, run_dir).run(PRODUCTS))
+    second = asyncio.run(BatchRunner(agent, batch_client, run_dir).run(PRODUCTS))
+
+    assert second == first
+    assert batch_client.created == 2
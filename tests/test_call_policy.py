@@ -0,0 +1,140 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from app.core.call_policy import NodeCallPolicy
+
+
+class FakeRequests:
+    """
+    Request factory whose n-th call sleeps ``delays[n]`` seconds and
+    answers with its model and call index; a (seconds, error) pair raises
+    the error after sleeping instead
+    """
+
+    def __init__(self, delays: List):
+        self.delays = delays
+        self.models: List[str] = []
+        self.cancelled: List[int] = []
+
+    async def __call__(self, model: str) -> Dict:
+        index = len(self.models)
+        self.models.append(model)
+        delay = self.delays[min(index, len(self.delays) - 1)]
+        error = None
+        if isinstance(delay, tuple):
+            delay, error = delay
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        if error is not None:
+            raise error
+        return {"model": model, "call": index}
+
+
+def policy(**kwargs) -> NodeCallPolicy:
+    options = {
+        "model": "primary",
+        "timeout_seconds": 0.5,
+        "max_attempts": 2,
+        "min_hedge_delay": 0.05,
+        "initial_hedge_delay": 0.05,
+        "fallback_model": "fallback",
+        "fallback_after_timeouts": 1,
+    }
+    return NodeCallPolicy(**{**options, **kwargs})
+
+
+def test_primary_wins_before_the_hedge_delay():
+    call_policy = policy()
+    requests = FakeRequests([0.0])
+
+    response, model = asyncio.run(call_policy.call("node", requests))
+
+    assert response == {"model": "primary", "call": 0}
+    assert model == "primary"
+    stats = call_policy.stats()["node"]
+    assert stats["hedges"] == 0
+    assert stats["hedge_wins"] == 0
+
+
+def test_primary_wins_after_hedging():
+    call_policy = policy()
+    requests = FakeRequests([0.1, 0.3])
+
+    response, _ = asyncio.run(call_policy.call("node", requests))
+
+    assert response["call"] == 0
+    # The slower hedge is cancelled once the primary answers
+    assert requests.cancelled == [1]
+    stats = call_policy.stats()["node"]
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 0
+
+
+def test_hedge_wins_when_the_primary_stalls():
+    call_policy = policy()
+    requests = FakeRequests([0.4, 0.01])
+
+    response, model = asyncio.run(call_policy.call("node", requests))
+
+    assert response["call"] == 1
+    assert model == "primary"
+    assert requests.cancelled == [0]
+    stats = call_policy.stats()["node"]
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_error_of_the_only_attempt_is_raised():
+    call_policy = policy(hedge_enabled=False)
+    requests = FakeRequests([(0.0, ValueError("bad request"))])
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_policy.call("node", requests))
+
+    assert call_policy.stats()["node"]["errors"] == 1
+    assert requests.models == ["primary"]
+
+
+def test_hedge_answers_when_the_primary_errors():
+    call_policy = policy()
+    requests = FakeRequests([(0.1, ValueError("connection reset")), 0.1])
+
+    response, _ = asyncio.run(call_policy.call("node", requests))
+
+    # The failed primary leaves the attempt waiting for the hedge
+    assert response["call"] == 1
+    assert call_policy.stats()["node"]["errors"] == 0
+
+
+def test_timeout_is_retried_on_the_fallback_model():
+    call_policy = policy(hedge_enabled=False, timeout_seconds=0.1)
+    requests = FakeRequests([1.0, 0.0])
+
+    response, model = asyncio.run(call_policy.call("node", requests))
+
+    assert model == "fallback"
+    assert response == {"model": "fallback", "call": 1}
+    assert requests.models == ["primary", "fallback"]
+    stats = call_policy.stats()["node"]
+    assert stats["timeouts"] == 1
+    assert stats["retries"] == 1
+    assert stats["fallback_calls"] == 1
+    # The node stays on the fallback model for the cooldown
+    assert stats["model"] == "fallback"
+
+
+def test_every_attempt_timing_out_raises():
+    call_policy = policy(hedge_enabled=False, timeout_seconds=0.05, fallback_model=None)
+    requests = FakeRequests([1.0])
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_policy.call("node", requests))
+
+    assert requests.models == ["primary", "primary"]
+    assert requests.cancelled == [0, 1]
+    assert call_policy.stats()["node"]["timeouts"] == 2
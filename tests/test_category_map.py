@@ -0,0 +1,45 @@
+from app.core.category_map import CategoryMap
+from app.service.schemas import ProductInput
+
+CATEGORY = {"main_category": "Infection Control", "subcategories": ["Masks"]}
+
+
+def api_product(item_num: int) -> dict:
+    # The shape the analyze route passes to the agent
+    return ProductInput(
+        Item_Num=item_num,
+        Structure_Group="Masks",
+        Vendor_Name="3M Company",
+        Item_Desc_Short=f"MASK, RESPIRATOR N95 {item_num}",
+    ).model_dump(by_alias=False)
+
+
+def catalog_product(item_num: int) -> dict:
+    return {
+        "Item Num": item_num,
+        "Structure Group": "Masks",
+        "Item Desc Short": f"MASK, RESPIRATOR N95 {item_num}",
+    }
+
+
+def test_api_products_are_learned_and_looked_up(tmp_path):
+    category_map = CategoryMap(str(tmp_path / "map.db"), min_support=3)
+    for item_num in range(3):
+        category_map.record(api_product(item_num), CATEGORY)
+
+    assert category_map.stats()["products"] == 3
+    assert category_map.lookup(api_product(99)) == CATEGORY
+    assert category_map.lookup(catalog_product(99)) == CATEGORY
+    category_map.close()
+
+
+def test_both_key_forms_are_the_same_product(tmp_path):
+    category_map = CategoryMap(str(tmp_path / "map.db"), min_support=1)
+    category_map.record(catalog_product(7), CATEGORY)
+    category_map.record(
+        api_product(7), {"main_category": "Respiratory", "subcategories": []}
+    )
+
+    assert category_map.stats()["products"] == 1
+    assert category_map.lookup(api_product(8))["main_category"] == "Respiratory"
+    category_map.close()
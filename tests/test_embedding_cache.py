@@ -0,0 +1,70 @@
+import asyncio
+from typing import List
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+
+from config.config import settings
+from database.vector_db import vector_store as vector_store_module
+from database.vector_db.embedding_cache import EmbeddingCache
+from database.vector_db.embedding_provider import EmbeddingProvider
+from database.vector_db.vector_store import QdrantVectorStore
+
+
+class FakeProvider(EmbeddingProvider):
+    name = "fake"
+
+    def __init__(self, model: str = "fake-model", dimension: int = 2):
+        self.model = model
+        self.dimension = dimension
+        self.calls: List[List[str]] = []
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(texts)
+        return [[float(len(text))] * self.dimension for text in texts]
+
+
+@pytest.fixture
+def vector_store(tmp_path, monkeypatch) -> QdrantVectorStore:
+    monkeypatch.setattr(settings, "TAX_EMBEDDINGS_CACHE", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(settings, "embedding_cache_enabled", True)
+    monkeypatch.setattr(settings, "search_payload_mode", "full")
+    # No Qdrant server is needed for embedding
+    monkeypatch.setattr(
+        vector_store_module,
+        "AsyncQdrantClient",
+        lambda **kwargs: AsyncQdrantClient(location=":memory:"),
+    )
+    store = QdrantVectorStore(None)  # type:ignore
+    store.embedding_provider = FakeProvider()
+    yield store
+    asyncio.run(store.close())
+
+
+def test_cache_hit_skips_the_provider(vector_store):
+    provider = vector_store.embedding_provider
+
+    first = asyncio.run(vector_store.embed(["gloves", "masks"]))
+    second = asyncio.run(vector_store.embed(["masks", "gloves", "gowns"]))
+    query = asyncio.run(vector_store.embed_query("gloves"))
+
+    # Only the unseen text went to the provider the second time
+    assert provider.calls == [["gloves", "masks"], ["gowns"]]
+    assert second[:2] == first[::-1]
+    assert query == first[0]
+
+
+def test_entries_are_keyed_by_model_and_dimension(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("model-a", 2, ["gloves"], [[1.0, 2.0]])
+
+    assert cache.get_many("model-a", 2, ["gloves"]) == [[1.0, 2.0]]
+    assert cache.get_many("model-b", 2, ["gloves"]) == [None]
+    assert cache.get_many("model-a", 3, ["gloves"]) == [None]
+    cache.close()
+
+    # Entries persist on disk under the same key
+    reopened = EmbeddingCache(str(tmp_path / "cache.db"))
+    assert reopened.get_many("model-a", 2, ["gloves"]) == [[1.0, 2.0]]
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from utils.json_stream import JSONFieldStream
+
+RESPONSE = {
+    "name_pattern": 'Glove "Nitrile" \\ Exam',
+    "keywords": ["nitrile glove", "exam glove, powder-free", "café [sic]"],
+    "details": {"size": {"min": 6, "max": 9}, "tags": ["a", {"b": "}]"}]},
+    "count": 100,
+    "sterile": False,
+    "note": None,
+}
+
+
+def feed_all(stream: JSONFieldStream, chunks):
+    closed = []
+    for chunk in chunks:
+        closed.extend(stream.feed(chunk))
+    return closed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_fields_split_across_chunks(size):
+    text = "```json\n" + json.dumps(RESPONSE, indent=2) + "\n```"
+    stream = JSONFieldStream()
+
+    closed = feed_all(stream, [text[i : i + size] for i in range(0, len(text), size)])
+
+    assert closed == list(RESPONSE.items())
+    assert stream.fields == RESPONSE
+    assert stream.done
+
+
+def test_field_is_reported_once_its_value_closes():
+    stream = JSONFieldStream()
+
+    assert stream.feed('{"name_pat') == []
+    assert stream.feed('tern": "Glove') == []
+    assert stream.feed('", "keywords": ["a", ') == [("name_pattern", "Glove")]
+    assert stream.feed('"b"], "count": 1') == [("keywords", ["a", "b"])]
+    # A scalar is only complete at the next comma or the closing brace
+    assert stream.feed("0}") == [("count", 10)]
+
+
+def test_escapes_split_at_chunk_boundaries():
+    text = json.dumps({"a": 'say \\"hi\\"', "b": "é\n", "c": "x"})
+    # Break right after each backslash, inside escape sequences
+    chunks = []
+    start = 0
+    for i, char in enumerate(text):
+        if char == "\\":
+            chunks.append(text[start : i + 1])
+            start = i + 1
+    chunks.append(text[start:])
+    stream = JSONFieldStream()
+
+    closed = feed_all(stream, chunks)
+
+    assert dict(closed) == json.loads(text)
+
+
+def test_nested_values_are_returned_whole():
+    stream = JSONFieldStream()
+
+    assert stream.feed('{"details": {"size": {"min": 6}, "tags": ["}", "]"') == []
+    assert stream.feed("]}") == [("details", {"size": {"min": 6}, "tags": ["}", "]"]})]
@@ -0,0 +1,83 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from database.vector_db.micro_batcher import EmbeddingBatcher
+
+
+class FakeEmbed:
+    """Batch embedding function that records each call's texts"""
+
+    def __init__(self, error: Exception = None):
+        self.calls: List[List[str]] = []
+        self.error = error
+
+    async def __call__(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(texts)
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_callers_share_one_call():
+    embed = FakeEmbed()
+    batcher = EmbeddingBatcher(embed, max_batch_size=64, max_wait_ms=5.0)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.embed(text) for text in ["a", "bb", "ccc", "bb"])
+        )
+
+    vectors = asyncio.run(run())
+
+    # Each caller gets its own text's vector; the repeat is sent once
+    assert vectors == [[1.0], [2.0], [3.0], [2.0]]
+    assert embed.calls == [["a", "bb", "ccc"]]
+    assert batcher.stats()["batch_size_histogram"] == {4: 1}
+
+
+def test_full_batch_is_sent_without_waiting():
+    embed = FakeEmbed()
+    batcher = EmbeddingBatcher(embed, max_batch_size=2, max_wait_ms=60_000)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(text) for text in ["a", "b", "c", "d"])),
+            timeout=1.0,
+        )
+
+    asyncio.run(run())
+
+    assert embed.calls == [["a", "b"], ["c", "d"]]
+
+
+def test_partial_batch_is_sent_at_the_deadline():
+    embed = FakeEmbed()
+    batcher = EmbeddingBatcher(embed, max_batch_size=64, max_wait_ms=20.0)
+
+    async def run():
+        task = asyncio.ensure_future(batcher.embed("a"))
+        await asyncio.sleep(0.005)
+        assert embed.calls == []
+        return await asyncio.wait_for(task, timeout=1.0)
+
+    assert asyncio.run(run()) == [1.0]
+    assert embed.calls == [["a"]]
+
+
+@pytest.mark.parametrize("max_batch_size", [1, 2, 64])
+def test_error_reaches_every_waiter(max_batch_size):
+    embed = FakeEmbed(RuntimeError("provider down"))
+    batcher = EmbeddingBatcher(embed, max_batch_size=max_batch_size, max_wait_ms=5.0)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.embed(text) for text in ["a", "b", "c"]),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["failed_batches"] == len(embed.calls)
@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+from utils import rate_limiter
+from utils.rate_limiter import TokenBucketRateLimiter, _LimitedEndpoint
+
+real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the limiter sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(
+        rate_limiter, "time", SimpleNamespace(monotonic=clock.monotonic)
+    )
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def rate_limit_error(retry_after: str = "") -> RateLimitError:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = httpx.Response(
+        429, headers=headers, request=httpx.Request("POST", "https://api.test")
+    )
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+class FakeEndpoint:
+    """Raises the queued errors in turn, then answers with ``total_tokens``"""
+
+    def __init__(self, errors=(), total_tokens: int = 10):
+        self.errors = list(errors)
+        self.total_tokens = total_tokens
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=self.total_tokens))
+
+
+def test_requests_per_minute_spaces_requests(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire(1)
+
+    asyncio.run(run())
+
+    # Two requests fit the bucket; the third waits for one to refill
+    assert clock.now == pytest.approx(30.0)
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_tokens_per_minute_waits_for_budget(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=100, tokens_per_minute=600)
+
+    async def run():
+        await limiter.acquire(500)
+        await limiter.acquire(200)
+
+    asyncio.run(run())
+
+    # 100 tokens were left; 100 more refill in 10 seconds
+    assert clock.now == pytest.approx(10.0)
+
+
+def test_settle_returns_unused_reservation(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=100, tokens_per_minute=600)
+
+    async def run():
+        reserved = await limiter.acquire(500)
+        limiter.settle(reserved, 100)
+        await limiter.acquire(500)
+
+    asyncio.run(run())
+
+    assert clock.now == 0.0
+    assert limiter.stats()["actual_tokens"] == 100
+
+
+def test_rate_limited_attempts_are_retried_through_the_bucket(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=100, tokens_per_minute=600)
+    endpoint = FakeEndpoint([rate_limit_error(), rate_limit_error("7")])
+    limited = _LimitedEndpoint(
+        endpoint, limiter, lambda kwargs: 60, max_retries=2, retry_backoff_seconds=1.0
+    )
+
+    response = asyncio.run(limited.create(model="test"))
+
+    assert response.usage.total_tokens == 10
+    assert endpoint.calls == 3
+    stats = limiter.stats()
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["rate_limit_errors"] == 2
+    # Rejected attempts are settled as unbilled, the answered one with its usage
+    assert stats["actual_tokens"] == 10
+    # Backoff of 1s, then the server's Retry-After over the 2s backoff
+    assert clock.sleeps[0] == 1.0
+    assert 7.0 in clock.sleeps
+
+
+def test_retries_give_up_after_max_retries(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=100, tokens_per_minute=600)
+    endpoint = FakeEndpoint([rate_limit_error() for _ in range(3)])
+    limited = _LimitedEndpoint(
+        endpoint, limiter, lambda kwargs: 60, max_retries=1, retry_backoff_seconds=1.0
+    )
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(limited.create(model="test"))
+
+    assert endpoint.calls == 2
+    assert limiter.stats()["retries"] == 1
@@ -0,0 +1,28 @@
+import asyncio
+
+from app.core.tax_cascade import TaxCodeCascade
+from app.service.schemas import ProductInput
+
+
+async def embed_query(text: str):
+    return [1.0, 0.0, 0.0]
+
+
+def test_product_key_matches_across_key_forms():
+    api_product = ProductInput(Item_Num=1110513, Structure_Group="Masks").model_dump(
+        by_alias=False
+    )
+    assert TaxCodeCascade.product_key(api_product) == "1110513"
+    assert TaxCodeCascade.product_key({"Item Num": 1110513}) == "1110513"
+
+
+def test_api_product_does_not_vote_for_itself(tmp_path):
+    cascade = TaxCodeCascade(
+        str(tmp_path / "cascade.db"), embed_query, "test", min_neighbors=1
+    )
+    asyncio.run(cascade.record({"Item Num": 1}, "P0000000", "General", 0.9))
+    api_product = ProductInput(Item_Num=1).model_dump(by_alias=False)
+
+    assert asyncio.run(cascade.predict(api_product)) is None
+    assert asyncio.run(cascade.predict({"Item Num": 2}))["tax_code"] == "P0000000"
+    cascade.close()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+
+from app.core.product_agent import TOPOLOGIES, ProductCategorizationAgent
+
+PRODUCT = {
+    "Item Num": 1000,
+    "Structure Group": "Gloves",
+    "Vendor Name": "Medline",
+    "Item Desc Short": "GLOVE, EXAM NITRILE POWDER-FREE LARGE",
+}
+
+TAX_CATEGORY = {
+    "id": "1",
+    "product_tax_code": "51020",
+    "name": "Medical Supplies",
+    "description": "Disposable medical supplies",
+}
+
+NAME_PATTERN = "Medline Nitrile Exam Glove, Large"
+SUMMARY = "About this Product\n- Powder-free nitrile exam glove"
+DESCRIPTION = "A powder-free nitrile exam glove."
+KEYWORDS = [f"nitrile glove {i}" for i in range(16)]
+CATEGORY = {"main_category": "Gloves", "subcategories": ["Exam Gloves"]}
+TAX_CODE = {
+    "tax_code": "51020",
+    "tax_code_name": "Medical Supplies",
+    "confidence": 0.9,
+    "reasoning": "Disposable exam glove",
+}
+
+# (prompt marker, answer); the combined prompts are matched first
+ANSWERS = [
+    (
+        "Generate ALL product content",
+        {
+            "name_pattern": NAME_PATTERN,
+            "keywords": KEYWORDS,
+            "product_summary": SUMMARY,
+            "product_description": DESCRIPTION,
+        },
+    ),
+    ("Classify this product by BOTH", {"category": CATEGORY, "tax_code": TAX_CODE}),
+    ("product naming expert", NAME_PATTERN),
+    ("About this Product", SUMMARY),
+    ("COMPREHENSIVE product description", DESCRIPTION),
+    ("SEO expert", {"keywords": KEYWORDS}),
+    ("categorization expert", CATEGORY),
+    ("Select the MOST ACCURATE tax code", TAX_CODE),
+]
+
+
+def usage(total_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        total_tokens=total_tokens,
+        prompt_tokens=total_tokens // 2,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+    )
+
+
+class FakeStream:
+    """Streamed completion: content deltas, then a usage chunk without choices"""
+
+    def __init__(self, content: str, total_tokens: int):
+        self.chunks = [
+            SimpleNamespace(
+                choices=[
+                    SimpleNamespace(delta=SimpleNamespace(content=content[i : i + 7]))
+                ],
+                usage=None,
+            )
+            for i in range(0, len(content), 7)
+        ]
+        self.chunks.append(SimpleNamespace(choices=[], usage=usage(total_tokens)))
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+class FakeCompletions:
+    """
+    Answers each prompt by its template. A call costs 100 tokens per field
+    it answers, so every topology spends the same total.
+    """
+
+    def __init__(self):
+        self.prompts: List[str] = []
+
+    async def create(
+        self, messages: List[Dict[str, str]], stream: bool = False, **kwargs
+    ):
+        prompt = "\n".join(message["content"] for message in messages)
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        for marker, answer in ANSWERS:
+            if marker in prompt:
+                break
+        else:
+            raise AssertionError(f"Unexpected prompt: {prompt[:80]}")
+        if isinstance(answer, str):
+            content, total_tokens = answer, 100
+        else:
+            content = json.dumps(answer)
+            fields = len(answer) if marker in (ANSWERS[0][0], ANSWERS[1][0]) else 1
+            total_tokens = 100 * fields
+        if stream:
+            return FakeStream(content, total_tokens)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage(total_tokens),
+        )
+
+
+class FakeVectorStore:
+    embedding_model = "fake-model"
+
+    async def search(self, collection_name, query, top_k=10, payload_fields=None):
+        return [TAX_CATEGORY]
+
+    async def search_many(
+        self, collection_name, queries, top_k=10, payload_fields=None
+    ):
+        return [[TAX_CATEGORY] for _ in queries]
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def agent() -> ProductCategorizationAgent:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    return ProductCategorizationAgent(client, FakeVectorStore())  # type:ignore
+
+
+def comparable(output: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        field: value
+        for field, value in output.items()
+        if field not in ("node_timings", "topology")
+    }
+
+
+def test_topologies_agree(agent):
+    outputs = {
+        topology: asyncio.run(agent.analyze_product(dict(PRODUCT), topology=topology))
+        for topology in TOPOLOGIES
+    }
+
+    async def stream() -> Dict[str, Any]:
+        fields: Dict[str, Any] = {}
+        async for event, chunk in agent.stream_product(
+            dict(PRODUCT), topology="pipelined"
+        ):
+            if event == "field":
+                fields.update(chunk["fields"])
+            elif event == "result":
+                result = chunk
+        # The pipelined content call reports its fields as they close
+        assert fields["name_pattern"] == NAME_PATTERN
+        return result
+
+    streamed = asyncio.run(stream())
+
+    expected = comparable(outputs["serial"])
+    assert expected["name_pattern"] == NAME_PATTERN
+    assert expected["keywords"] == KEYWORDS
+    assert expected["category"] == CATEGORY
+    assert expected["tax_code"] == TAX_CODE["tax_code"]
+    assert expected["total_tokens"] == 600
+    for topology, output in outputs.items():
+        assert comparable(output) == expected, topology
+        assert output["topology"] == topology
+    assert comparable(streamed) == expected
@@ -0,0 +1,132 @@
+from app.core.variant_grouping import (
+    MinHashLSH,
+    derive_variant_output,
+    group_near_duplicates,
+)
+
+
+def product(size: str, catalog: str) -> dict:
+    return {
+        "Item Num": int(catalog),
+        "Structure Group": "Neurotoxins",
+        "Vendor Name": "Allergan Pharmaceutical",
+        "Catalog Num": catalog,
+        "Item Desc Short": f"BOTOX THERAPEUTIC, VL {size}U D/S",
+        "Item Desc Full": f"Botox Therapeutic Botulinum Toxin Type A {size} Units Injection",
+    }
+
+
+def output(description: str) -> dict:
+    return {
+        "name_pattern": "Allergan Botox Therapeutic 100U Vial",
+        "product_summary": "Botulinum toxin, 100 Units per vial",
+        "product_description": description,
+        "keywords": ["botox 100u", "botox 100 units", "botulinum toxin"],
+        "category": {"main_category": "Pharmaceuticals", "subcategories": []},
+        "tax_code": "51020",
+        "tax_code_name": "Drugs",
+        "tax_code_confidence": 0.9,
+        "tax_code_reasoning": "",
+        "total_tokens": 1000,
+        "cached_tokens": 0,
+        "node_timings": {},
+        "topology": "serial",
+    }
+
+
+def test_sizes_are_substituted_with_their_unit():
+    derived = derive_variant_output(
+        product("100", "23114501"),
+        output("Single-dose vial of 100 Units."),
+        product("200", "23392102"),
+    )
+
+    assert derived is not None
+    assert derived["name_pattern"] == "Allergan Botox Therapeutic 200U Vial"
+    assert derived["product_summary"] == "Botulinum toxin, 200 Units per vial"
+    assert derived["keywords"][:2] == ["botox 200U", "botox 200 Units"]
+    assert derived["total_tokens"] == 0
+
+
+def test_bare_numbers_are_never_substituted():
+    # "100/BX" and "100%" share the size's number but are not sizes
+    derived = derive_variant_output(
+        product("100", "23114501"),
+        output("100 units, 100/BX, 100% preservative free."),
+        product("200", "23392102"),
+    )
+
+    assert derived is None
+
+
+def test_unrelated_numbers_are_left_alone():
+    derived = derive_variant_output(
+        product("50", "23391950"),
+        {
+            **output("Single-dose vial of 50 Units, packed 100/BX."),
+            "name_pattern": "Allergan Botox 50U Vial",
+            "product_summary": "Botulinum toxin, 50 Units per vial",
+            "keywords": ["botox 50u"],
+        },
+        product("100", "23923201"),
+    )
+
+    assert derived is not None
+    assert derived["product_description"] == (
+        "Single-dose vial of 100 Units, packed 100/BX."
+    )
+    assert derived["name_pattern"] == "Allergan Botox 100U Vial"
+
+
+def glove(size: str, item_num: int, vendor: str = "Medline Industries") -> dict:
+    return {
+        "Item Num": item_num,
+        "Structure Group": "Exam Gloves",
+        "Vendor Name": vendor,
+        "Item Desc Short": f"GLOVE, EXAM NITRILE PF BLUE {size} 200/BX",
+        "Item Desc Full": f"Nitrile exam glove, powder-free, blue, size {size}, 200 per box",
+    }
+
+
+def test_size_variants_are_grouped():
+    products = [
+        glove("SM", 1),
+        product("100", "23114501"),
+        glove("MD", 2),
+        product("200", "23392102"),
+        glove("LG", 3),
+        glove("XL", 4),
+    ]
+
+    assert group_near_duplicates(products) == [[0, 2, 4, 5], [1, 3]]
+
+
+def test_different_products_stay_apart():
+    gown = {
+        **glove("MD", 5),
+        "Item Desc Short": "GOWN, ISOLATION YELLOW MD 50/CS",
+        "Item Desc Full": "Isolation gown, fluid resistant, yellow, size MD, 50 per case",
+    }
+    products = [
+        glove("SM", 1),
+        glove("MD", 2, vendor="Cardinal Health"),
+        gown,
+        # Same vendor and group, but another material
+        {
+            **glove("LG", 3),
+            "Item Desc Short": "GLOVE, SURGICAL LATEX PF TAN LG 50/BX",
+            "Item Desc Full": "Latex surgical glove, sterile, tan, size LG, 50 per box",
+        },
+    ]
+
+    assert group_near_duplicates(products) == [[0], [1], [2], [3]]
+
+
+def test_lsh_similarity_estimates_jaccard():
+    lsh = MinHashLSH(num_perm=256, bands=64)
+    a = {f"w{i}" for i in range(100)}
+    b = {f"w{i}" for i in range(50, 150)}
+
+    # True Jaccard similarity is 50 / 150
+    assert abs(lsh.similarity(lsh.signature(a), lsh.signature(b)) - 1 / 3) < 0.1
+    assert lsh.similarity(lsh.signature(a), lsh.signature(set(a))) == 1.0
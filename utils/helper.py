@@ -1,3 +1,4 @@
+import hashlib
 import json
 import re
 from typing import Dict, List, Any, Optional
@@ -17,6 +18,21 @@ def load_product_categories(file_path: str) -> Dict[str, List[str]]:
         return {}
 
 
+def load_tax_categories(file_path: str) -> List[Dict[str, Any]]:
+    """Load tax category rows from the phpMyAdmin JSON export"""
+    try:
+        with open(file_path, "r") as f:
+            json_data = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading tax categories: {e}")
+        return []
+
+    for item in json_data:
+        if item.get("type") == "table" and item.get("name") == "tax_categories":
+            return item.get("data", [])
+    return []
+
+
 def extract_brand_name(product_data: Dict[str, Any]) -> str:
     """Extract brand name from product data"""
     # Try both field name formats
@@ -30,6 +46,14 @@ def extract_brand_name(product_data: Dict[str, Any]) -> str:
     return brand.strip() if brand else ""
 
 
+SIZE_PATTERNS = [
+    r"\d+\.?\d*\s*(?:mm|cm|m|ml|mL|L|mg|g|kg|inch|in|oz|lb)",
+    r"\d+\s*x\s*\d+",
+    r"\d+\.?\d*\s*(?:mg|g)\s*/\s*(?:ml|mL)",
+    r"\d+\s*(?:gauge|ga|G)",
+]
+
+
 def extract_size_dimensions(product_data: Dict[str, Any]) -> str:
     """Extract size/dimensions from product description and UOM"""
     size_parts = []
@@ -41,14 +65,7 @@ def extract_size_dimensions(product_data: Dict[str, Any]) -> str:
     desc_short = product_data.get("Item Desc Short", "")
     desc_full = product_data.get("Item Desc Full", "")
 
-    size_patterns = [
-        r"\d+\.?\d*\s*(?:mm|cm|m|ml|mL|L|mg|g|kg|inch|in|oz|lb)",
-        r"\d+\s*x\s*\d+",
-        r"\d+\.?\d*\s*(?:mg|g)\s*/\s*(?:ml|mL)",
-        r"\d+\s*(?:gauge|ga|G)",
-    ]
-
-    for pattern in size_patterns:
+    for pattern in SIZE_PATTERNS:
         matches = re.findall(pattern, desc_short + " " + desc_full, re.IGNORECASE)
         size_parts.extend(matches[:2])
 
@@ -68,6 +85,35 @@ def parse_specifications(product_data: Dict[str, Any]) -> List[str]:
     return specs
 
 
+# Product fields format_product_for_llm puts in the prompts
+PROMPT_PRODUCT_FIELDS = [
+    "Vendor Name",
+    "Item Desc Short",
+    "Item Desc Full",
+    "Structure Group",
+    "Catalog Num",
+    "UOM",
+]
+
+
+def normalized_product_fields(product_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The product fields that reach the prompts, under underscore keys with
+    whitespace collapsed, so both key forms and formatting agree
+    """
+    fields: Dict[str, Any] = {}
+    for name in PROMPT_PRODUCT_FIELDS:
+        value = product_data.get(name)
+        if value is None or not str(value).strip():
+            value = product_data.get(name.replace(" ", "_"))
+        if value is not None and str(value).strip():
+            fields[name.replace(" ", "_")] = " ".join(str(value).split())
+    features = [" ".join(f.split()) for f in parse_specifications(product_data)[:10]]
+    if features:
+        fields["features"] = features
+    return fields
+
+
 def format_product_for_llm(product_data: Dict[str, Any]) -> str:
     """Format product data for LLM prompt"""
     parts = []
@@ -127,6 +173,13 @@ def format_product_for_llm(product_data: Dict[str, Any]) -> str:
     return "\n".join(parts)
 
 
+def product_fingerprint(product_data: Dict[str, Any]) -> str:
+    """Stable fingerprint of the product fields that drive retrieval"""
+    return hashlib.sha256(
+        format_product_for_llm(product_data).encode("utf-8")
+    ).hexdigest()
+
+
 def validate_keyword_count(
     keywords: List[str], min_count: int = 15, max_count: int = 20
 ) -> bool:
@@ -0,0 +1,106 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JSONFieldStream:
+    """
+    Incremental parser for a JSON object arriving in chunks.
+
+    ``feed`` takes the next piece of text and returns the top-level fields
+    whose values closed within it, in order, so a caller can act on the
+    first fields while later ones are still being generated. Nested values
+    are returned whole once their closing bracket arrives. Anything before
+    the opening brace (such as a markdown fence) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # "key", "colon", "value" or "comma", at depth 1
+        self._expect = "key"
+        self._token_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+
+    def _close(self, end: int, closed: List[Tuple[str, Any]]):
+        raw = self.text[self._value_start : end].strip()  # type:ignore
+        self._expect = "comma"
+        self._value_start = None
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.debug(f"Could not parse streamed value of '{self._key}': {raw}")
+            return
+        self.fields[self._key] = value  # type:ignore
+        closed.append((self._key, value))  # type:ignore
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        closed: List[Tuple[str, Any]] = []
+        while self._pos < len(self.text) and not self.done:
+            pos = self._pos
+            char = self.text[pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key":
+                        self._key = json.loads(self.text[self._token_start : pos + 1])
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._expect == "value":
+                        self._close(pos + 1, closed)
+                continue
+
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == "key":
+                    self._token_start = pos
+                elif self._depth == 1 and self._expect == "value":
+                    self._value_start = pos
+            elif char in "{[":
+                if self._depth == 1 and self._expect == "value":
+                    self._value_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    # A scalar last value ends at the object's closing brace
+                    if self._expect == "value" and self._value_start is not None:
+                        self._close(pos, closed)
+                    self.done = True
+                elif self._depth == 1 and self._expect == "value":
+                    self._close(pos + 1, closed)
+            elif self._depth == 1:
+                if char == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif char == ",":
+                    if self._expect == "value" and self._value_start is not None:
+                        self._close(pos, closed)
+                    self._expect = "key"
+                elif (
+                    self._expect == "value"
+                    and self._value_start is None
+                    and not char.isspace()
+                ):
+                    # Number, true, false or null
+                    self._value_start = pos
+        return closed
@@ -0,0 +1,320 @@
+import json
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import tiktoken
+
+from utils.helper import parse_specifications
+from utils.prompts import (
+    COMBINED_CLASSIFICATION_PROMPT,
+    get_combined_product_content_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+# Fields of a retrieved tax category the classification prompt needs
+TAX_PROMPT_FIELDS = ("product_tax_code", "name", "description")
+
+# Rough characters per token when no tiktoken encoding can be loaded
+CHARS_PER_TOKEN = 4
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[tiktoken.Encoding]:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The BPE files are downloaded on first use
+        logger.warning(
+            f"Could not load tiktoken encoding for {model}, estimating tokens: {e}"
+        )
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut text to at most max_tokens tokens, marking the cut with an ellipsis"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        limit = max_tokens * CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit].rstrip() + "…"
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + "…"
+
+
+def _words(text: str) -> set:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+def _field(product_data: Dict[str, Any], name: str) -> Optional[str]:
+    for key in (name, name.replace(" ", "_")):
+        value = product_data.get(key)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def compact_product_info(
+    product_data: Dict[str, Any],
+    max_features: int = 10,
+    full_description_tokens: Optional[int] = None,
+    model: str = "gpt-4o-mini",
+) -> str:
+    """
+    Product information for prompts without repeated content.
+
+    Same fields as format_product_for_llm, but the short description is
+    dropped when every word of it already appears in the full description,
+    and features that only repeat the descriptions are skipped.
+    """
+    parts = []
+
+    vendor = _field(product_data, "Vendor Name")
+    if vendor:
+        parts.append(f"Vendor: {vendor}")
+
+    desc_short = _field(product_data, "Item Desc Short")
+    desc_full = _field(product_data, "Item Desc Full")
+    if desc_short and not (desc_full and _words(desc_short) <= _words(desc_full)):
+        parts.append(f"Short Description: {desc_short}")
+    if desc_full:
+        if full_description_tokens is not None:
+            desc_full = truncate_tokens(desc_full, full_description_tokens, model)
+        parts.append(f"Full Description: {desc_full}")
+
+    group = _field(product_data, "Structure Group")
+    if group:
+        parts.append(f"Product Group: {group}")
+
+    catalog = _field(product_data, "Catalog Num")
+    if catalog:
+        parts.append(f"Catalog Number: {catalog}")
+
+    uom = _field(product_data, "UOM")
+    if uom:
+        parts.append(f"Unit of Measure: {uom}")
+
+    seen = _words(" ".join(filter(None, [desc_short, desc_full])))
+    features = []
+    for feature in parse_specifications(product_data):
+        words = _words(feature)
+        if words and not words <= seen:
+            features.append(feature)
+            seen |= words
+    if features and max_features > 0:
+        parts.append("Features and Benefits:")
+        for i, feature in enumerate(features[:max_features], 1):
+            parts.append(f"{i}. {feature}")
+
+    if not parts:
+        parts.append("Product information not available")
+
+    return "\n".join(parts)
+
+
+def _compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class PromptAssembler:
+    """
+    Fits the combined content and classification prompts to token budgets.
+
+    Prompts are rendered with compact JSON and de-duplicated product
+    information. When a prompt is still over budget, tax category
+    descriptions are truncated by retrieval rank (the lowest-ranked lose
+    the most), then product features are dropped, and finally the
+    lowest-ranked tax categories themselves. Input token counts of every
+    assembled prompt are recorded for the metrics endpoint.
+    """
+
+    def __init__(
+        self,
+        content_budget: int = 1200,
+        classification_budget: int = 1600,
+        model: str = "gpt-4o-mini",
+        max_features: int = 10,
+    ):
+        self.budgets = {
+            "generate_product_content": content_budget,
+            "classify_product": classification_budget,
+        }
+        self.model = model
+        self.max_features = max_features
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {
+            node: {"prompts": 0, "input_tokens": 0, "max_input_tokens": 0, "trimmed": 0}
+            for node in self.budgets
+        }
+        self.over_budget = 0
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def _record(self, node: str, tokens: int, trimmed: bool):
+        with self._lock:
+            stats = self._stats[node]
+            stats["prompts"] += 1
+            stats["input_tokens"] += tokens
+            stats["max_input_tokens"] = max(stats["max_input_tokens"], tokens)
+            stats["trimmed"] += int(trimmed)
+            if tokens > self.budgets[node]:
+                self.over_budget += 1
+                logger.warning(
+                    f"{node} prompt has {tokens} tokens, over its budget of "
+                    f"{self.budgets[node]}"
+                )
+
+    def _largest(
+        self, budget: int, render: Callable[[int], str], high: int
+    ) -> Optional[Tuple[str, int]]:
+        """Render with the largest value in [0, high] whose prompt fits the budget"""
+        low, best = 0, None
+        while low <= high:
+            value = (low + high) // 2
+            prompt = render(value)
+            tokens = self.count(prompt)
+            if tokens <= budget:
+                best, low = (prompt, tokens), value + 1
+            else:
+                high = value - 1
+        return best
+
+    def content_prompt(self, product_data: Dict[str, Any]) -> Tuple[str, int]:
+        """Combined product content prompt and its token count"""
+        node = "generate_product_content"
+        budget = self.budgets[node]
+
+        def render(features: int, description_tokens: Optional[int] = None) -> str:
+            return get_combined_product_content_prompt(
+                compact_product_info(
+                    product_data, features, description_tokens, self.model
+                )
+            )
+
+        prompt = render(self.max_features)
+        tokens = self.count(prompt)
+        trimmed = tokens > budget
+        if trimmed:
+            # Drop features first, then shorten the full description
+            full_tokens = self.count(_field(product_data, "Item Desc Full") or "")
+            fitted = self._largest(budget, render, self.max_features) or (
+                self._largest(budget, lambda n: render(0, n), full_tokens)
+            )
+            if fitted is not None:
+                prompt, tokens = fitted
+            else:
+                prompt = render(0, 0)
+                tokens = self.count(prompt)
+
+        self._record(node, tokens, trimmed)
+        return prompt, tokens
+
+    def classification_prompt(
+        self,
+        product_data: Dict[str, Any],
+        keywords: List[str],
+        categories: Dict[str, Any],
+        tax_categories: List[Dict[str, Any]],
+        template: str = COMBINED_CLASSIFICATION_PROMPT,
+    ) -> Tuple[str, int]:
+        """
+        Combined classification prompt and its token count. ``template``
+        may leave out the categories (COMBINED_TAX_CODE_PROMPT).
+        """
+        node = "classify_product"
+        budget = self.budgets[node]
+
+        rows = [
+            {field: row[field] for field in TAX_PROMPT_FIELDS if row.get(field)}
+            for row in tax_categories
+        ]
+        description_tokens = [self.count(row.get("description", "")) for row in rows]
+        categories_json = _compact_json(categories)
+
+        def render(features: int, detail: Optional[int] = None, kept: int = -1) -> str:
+            shown = rows if kept < 0 else rows[:kept]
+            if detail is not None:
+                # Rank r keeps at most detail / (r + 1) description tokens
+                shown = [
+                    {
+                        **row,
+                        "description": truncate_tokens(
+                            row.get("description", ""), detail // (rank + 1), self.model
+                        ),
+                    }
+                    for rank, row in enumerate(shown)
+                ]
+                shown = [{k: v for k, v in row.items() if v} for row in shown]
+            return template.format(
+                product_info=compact_product_info(
+                    product_data, features, model=self.model
+                ),
+                keywords=", ".join(keywords),
+                categories=categories_json,
+                tax_categories=_compact_json(shown),
+            )
+
+        prompt = render(self.max_features)
+        tokens = self.count(prompt)
+        trimmed = tokens > budget
+        if trimmed:
+            # Truncate descriptions by rank, then drop features, then the
+            # lowest-ranked tax categories
+            max_detail = max(
+                (n * (rank + 1) for rank, n in enumerate(description_tokens)),
+                default=0,
+            )
+            fitted = self._largest(
+                budget, lambda d: render(self.max_features, d), max_detail
+            ) or self._largest(budget, lambda n: render(n, 0), self.max_features)
+            if fitted is None and rows:
+                fitted = self._largest(
+                    budget, lambda k: render(0, 0, k + 1), len(rows) - 1
+                )
+            if fitted is not None:
+                prompt, tokens = fitted
+            else:
+                prompt = render(0, 0, min(len(rows), 1))
+                tokens = self.count(prompt)
+
+        self._record(node, tokens, trimmed)
+        return prompt, tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budgets": dict(self.budgets),
+                "over_budget": self.over_budget,
+                **{
+                    node: {
+                        "prompts": stats["prompts"],
+                        "avg_input_tokens": (
+                            round(stats["input_tokens"] / stats["prompts"], 1)
+                            if stats["prompts"]
+                            else 0.0
+                        ),
+                        "max_input_tokens": stats["max_input_tokens"],
+                        "trimmed": stats["trimmed"],
+                    }
+                    for node, stats in self._stats.items()
+                },
+            }
@@ -3,10 +3,12 @@ Prompts for the product categorization agent.
 Optimized for performance with combined LLM calls.
 """
 
-COMBINED_PRODUCT_CONTENT_PROMPT = """You are a product content generation expert. Generate ALL product content in a single response.
+import hashlib
 
-Product Information:
-{product_info}
+# The combined prompts keep product-specific text at the end so every request
+# shares the same leading instructions, which the provider caches as a prefix.
+
+COMBINED_PRODUCT_CONTENT_PROMPT = """You are a product content generation expert. Generate ALL product content in a single response for the product given at the end.
 
 Generate the following 4 components in JSON format:
 
@@ -14,7 +16,12 @@ Generate the following 4 components in JSON format:
    - Format: [Brand] [Product Name] [Size] - [Key Specs]
    - Example: "Allergan Botox Therapeutic 100 Units - Muscle Relaxant"
 
-2. **product_summary**: in html format
+2. **keywords**: 15-30 short e-commerce keywords
+   - 1-3 words each
+   - User search perspective
+   - Include: brand, product type, features, use cases
+
+3. **product_summary**: in html format
    - Start with Important content in <p> tag.
    - before bullet points add a Header of product should be precise and viewable.
    - 6-10 detailed bullet points using in <li>
@@ -24,7 +31,7 @@ Generate the following 4 components in JSON format:
    - Do not Change the format for any product.
    - put remaining text in <p> at bottom.
 
-3. **product_description**: Paragraph + HTML table
+4. **product_description**: Paragraph + HTML table
    - First: 2-4 sentence descriptive paragraph in <p>
    - Prioritise the information presend in the data like FEATURES_AND_BENEFITS for the table.
    - Then: Comprehensive HTML table with specifications
@@ -34,20 +41,18 @@ Generate the following 4 components in JSON format:
    - Do not add catalog number in the description table.
    - Do Not add unecessary description in the table.
 
-4. **keywords**: 15-30 short e-commerce keywords
-   - 1-3 words each
-   - User search perspective
-   - Include: brand, product type, features, use cases
-
-Return as JSON:
+Return as JSON, with the fields in this order:
 {{
   "name_pattern": "Brand Product Name - Size - Key Specs",
+  "keywords": ["keyword1", "keyword2", ...],
   "product_summary": "About this Product\\n\\n• Bullet point 1\\n• Bullet point 2...",
-  "product_description": "Paragraph description...\\n\\n<table>...</table>",
-  "keywords": ["keyword1", "keyword2", ...]
+  "product_description": "Paragraph description...\\n\\n<table>...</table>"
 }}
 
-Return ONLY valid JSON, no markdown formatting."""
+Return ONLY valid JSON, no markdown formatting.
+
+Product Information:
+{product_info}"""
 
 NAME_PATTERN_PROMPT = """You are a product naming expert. Given the following product information, create a standardized product name pattern.
 
@@ -310,19 +315,7 @@ def get_category_matching_prompt(product_info: str, categories: str) -> str:
     )
 
 
-COMBINED_CLASSIFICATION_PROMPT = """You are a medical product classification expert. Classify this product by BOTH category and tax code in one response.
-
-Product Information:
-{product_info}
-
-Keywords:
-{keywords}
-
-Available Categories (MUST use these only):
-{categories}
-
-Retrieved Tax Categories:
-{tax_categories}
+COMBINED_CLASSIFICATION_PROMPT = """You are a medical product classification expert. Classify this product by BOTH category and tax code in one response. The product and its retrieved tax categories are given at the end.
 
 Generate BOTH classifications:
 
@@ -350,7 +343,19 @@ Return as JSON:
   }}
 }}
 
-Return ONLY valid JSON, no markdown formatting."""
+Return ONLY valid JSON, no markdown formatting.
+
+Available Categories (MUST use these only):
+{categories}
+
+Retrieved Tax Categories:
+{tax_categories}
+
+Product Information:
+{product_info}
+
+Keywords:
+{keywords}"""
 
 
 def get_combined_classification_prompt(
@@ -367,8 +372,102 @@ def get_combined_classification_prompt(
     )
 
 
+# Classification prompt for products whose category is already known from
+# their Structure Group; same layout as COMBINED_CLASSIFICATION_PROMPT
+COMBINED_TAX_CODE_PROMPT = """You are a medical product classification expert. Select the tax code of this product. The product and its retrieved tax categories are given at the end.
+
+**TAX CODE SELECTION**:
+- Select BEST match from Retrieved Tax Categories
+- Be CONFIDENT - use 0.8+ if reasonable match
+- Provide detailed reasoning
+
+Return as JSON:
+{{
+  "tax_code": {{
+    "tax_code": "code_from_retrieved_list",
+    "tax_code_name": "exact name from tax category",
+    "confidence": 0.85,
+    "reasoning": "Detailed explanation of the tax code selection"
+  }}
+}}
+
+Return ONLY valid JSON, no markdown formatting.
+
+Retrieved Tax Categories:
+{tax_categories}
+
+Product Information:
+{product_info}
+
+Keywords:
+{keywords}"""
+
+
+def get_combined_tax_code_prompt(
+    product_info: str, keywords: list, tax_categories: list
+) -> str:
+    """Get combined classification prompt without category selection"""
+    import json
+
+    return COMBINED_TAX_CODE_PROMPT.format(
+        product_info=product_info,
+        keywords=", ".join(keywords),
+        tax_categories=json.dumps(tax_categories, indent=2),
+    )
+
+
 def get_tax_code_selection_prompt(product_info: str, tax_categories: str) -> str:
     """Get formatted tax code selection prompt"""
     return TAX_CODE_SELECTION_PROMPT.format(
         product_info=product_info, tax_categories=tax_categories
     )
+
+
+VARIANT_DELTA_PROMPT = """You are a product content generation expert. Content was already written for a representative product. Adapt it to a VARIANT of the same product line.
+
+Representative Product Information:
+{representative_info}
+
+Variant Product Information:
+{variant_info}
+
+Representative name_pattern:
+{name_pattern}
+
+Representative keywords:
+{keywords}
+
+Return as JSON:
+{{
+  "name_pattern": "name_pattern rewritten for the variant, same format",
+  "keywords": ["15-30 keywords for the variant, same style"],
+  "replacements": {{"exact text in the representative content": "text for the variant"}}
+}}
+
+- Only change what differs between the two products (size, gauge, length, count, color, needle type etc.)
+- "replacements" maps every representative-specific value (as it would appear in the summary and specification table) to the variant's value
+- Use an empty object for "replacements" if nothing else differs
+
+Return ONLY valid JSON, no markdown formatting."""
+
+
+def get_variant_delta_prompt(
+    representative_info: str, variant_info: str, name_pattern: str, keywords: list
+) -> str:
+    """Get variant content adaptation prompt"""
+    return VARIANT_DELTA_PROMPT.format(
+        representative_info=representative_info,
+        variant_info=variant_info,
+        name_pattern=name_pattern,
+        keywords=", ".join(keywords),
+    )
+
+
+# Version of the prompt templates above; cached LLM responses are keyed on it
+PROMPT_VERSION = hashlib.sha256(
+    "".join(
+        value
+        for name, value in sorted(globals().items())
+        if name.endswith("_PROMPT") and isinstance(value, str)
+    ).encode("utf-8")
+).hexdigest()[:16]
@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+
+from config.config import settings
+from utils.prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Per-message formatting overhead of the chat format
+TOKENS_PER_MESSAGE = 4
+
+# Errors the SDK would retry itself; APITimeoutError is an APIConnectionError
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+class TokenBucketRateLimiter:
+    """
+    Async limiter for requests per minute and tokens per minute.
+
+    Both limits are token buckets that refill continuously and hold at most
+    one minute of budget. A request reserves one request and its estimated
+    tokens before it is sent; once the response reports its real usage the
+    difference is settled. Waiters are served in arrival order, so a large
+    request is not starved by a stream of small ones.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+        self.total_requests = 0
+        self.estimated_tokens = 0
+        self.actual_tokens = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.rate_limit_errors = 0
+        self.retries = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(
+            self.requests_per_minute,
+            self._requests + elapsed * self.requests_per_minute / 60,
+        )
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens + elapsed * self.tokens_per_minute / 60,
+        )
+
+    async def acquire(self, tokens: int) -> int:
+        """Wait until a request of ``tokens`` fits both limits and reserve it"""
+        # A request larger than the bucket would never fit; let it drain it
+        tokens = min(tokens, self.tokens_per_minute)
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    break
+                wait = max(
+                    (1 - self._requests) * 60 / self.requests_per_minute,
+                    (tokens - self._tokens) * 60 / self.tokens_per_minute,
+                )
+                await asyncio.sleep(wait)
+            self._requests -= 1
+            self._tokens -= tokens
+
+        waited = time.monotonic() - started
+        self.total_requests += 1
+        self.estimated_tokens += tokens
+        if waited > 0.001:
+            self.throttled += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return tokens
+
+    def settle(self, reserved: int, actual: int):
+        """Correct a reservation with the usage the response reported"""
+        self.actual_tokens += actual
+        self._tokens = min(self.tokens_per_minute, self._tokens + reserved - actual)
+
+    def rate_limited(self):
+        """A 429 got through anyway: empty the token bucket to back off"""
+        self.rate_limit_errors += 1
+        self._tokens = min(self._tokens, 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "requests": self.total_requests,
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": self.actual_tokens,
+            "throttled": self.throttled,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "rate_limit_errors": self.rate_limit_errors,
+            "retries": self.retries,
+        }
+
+
+def estimate_chat_tokens(
+    messages: List[Dict[str, Any]], max_tokens: Optional[int], model: str
+) -> int:
+    """Prompt tokens plus the completion allowance, as the provider counts them"""
+    prompt_tokens = sum(
+        TOKENS_PER_MESSAGE + count_tokens(str(message.get("content") or ""), model)
+        for message in messages
+    )
+    return prompt_tokens + (max_tokens or 0)
+
+
+def estimate_embedding_tokens(input: Any, model: str) -> int:
+    texts = [input] if isinstance(input, str) else input
+    return sum(count_tokens(str(text), model) for text in texts)
+
+
+class _SettledStream:
+    """
+    Streamed response that settles its reservation once the final usage
+    chunk arrives. A stream that ends or is abandoned without reporting
+    usage keeps its reservation, since its tokens were generated anyway.
+    """
+
+    def __init__(self, stream: Any, limiter: TokenBucketRateLimiter, reserved: int):
+        self._stream = stream
+        self._iterator = stream.__aiter__()
+        self._limiter = limiter
+        self._reserved = reserved
+        self._settled = False
+
+    def _settle(self, actual: int):
+        if not self._settled:
+            self._settled = True
+            self._limiter.settle(self._reserved, actual)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = await self._iterator.__anext__()
+        except BaseException:
+            self._settle(self._reserved)
+            raise
+        usage = getattr(chunk, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            self._settle(usage.total_tokens)
+        return chunk
+
+    async def close(self):
+        self._settle(self._reserved)
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            await close()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+
+def _retry_after(error: Exception) -> float:
+    """Seconds the server asked to wait before retrying, 0 if it didn't say"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0))  # type:ignore
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class _LimitedEndpoint:
+    """
+    Endpoint whose calls reserve from the limiter. The wrapped client is
+    created without SDK retries; failed attempts are retried here with
+    exponential backoff, so every attempt goes through the token bucket.
+    """
+
+    def __init__(
+        self,
+        endpoint: Any,
+        limiter: TokenBucketRateLimiter,
+        estimate,
+        max_retries: int = 5,
+        retry_backoff_seconds: float = 1.0,
+    ):
+        self._endpoint = endpoint
+        self._limiter = limiter
+        self._estimate = estimate
+        self._max_retries = max_retries
+        self._retry_backoff_seconds = retry_backoff_seconds
+
+    async def create(self, *args, **kwargs):
+        estimate = self._estimate(kwargs)
+        attempt = 0
+        while True:
+            reserved = await self._limiter.acquire(estimate)
+            try:
+                response = await self._endpoint.create(*args, **kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                # Rejected requests are not billed
+                self._limiter.settle(reserved, 0)
+                if isinstance(e, RateLimitError):
+                    self._limiter.rate_limited()
+                if attempt >= self._max_retries:
+                    raise
+                delay = max(_retry_after(e), self._retry_backoff_seconds * (2**attempt))
+                attempt += 1
+                self._limiter.retries += 1
+                logger.warning(
+                    f"OpenAI request failed ({type(e).__name__}), retry "
+                    f"{attempt}/{self._max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Failed requests and cancelled ones, such as hedge losers, are
+                # not billed
+                self._limiter.settle(reserved, 0)
+                raise
+
+        if kwargs.get("stream"):
+            return _SettledStream(response, self._limiter, reserved)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            self._limiter.settle(reserved, usage.total_tokens)
+        return response
+
+    def __getattr__(self, name: str):
+        return getattr(self._endpoint, name)
+
+
+class _LimitedChat:
+    def __init__(self, chat: Any, limiter: TokenBucketRateLimiter, **retry: Any):
+        self._chat = chat
+        self.completions = _LimitedEndpoint(
+            chat.completions,
+            limiter,
+            lambda kwargs: estimate_chat_tokens(
+                kwargs.get("messages", []),
+                kwargs.get("max_tokens") or kwargs.get("max_completion_tokens"),
+                kwargs.get("model", settings.model_name),
+            ),
+            **retry,
+        )
+
+    def __getattr__(self, name: str):
+        return getattr(self._chat, name)
+
+
+class RateLimitedOpenAI:
+    """
+    AsyncOpenAI client whose chat completion and embedding calls go
+    through a shared TokenBucketRateLimiter, retrying failed attempts
+    itself (the wrapped client should have ``max_retries=0``). Everything
+    else is passed through to the wrapped client.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        limiter: TokenBucketRateLimiter,
+        max_retries: int = 5,
+        retry_backoff_seconds: float = 1.0,
+    ):
+        self._client = client
+        self.limiter = limiter
+        retry = {
+            "max_retries": max_retries,
+            "retry_backoff_seconds": retry_backoff_seconds,
+        }
+        self.chat = _LimitedChat(client.chat, limiter, **retry)
+        self.embeddings = _LimitedEndpoint(
+            client.embeddings,
+            limiter,
+            lambda kwargs: estimate_embedding_tokens(
+                kwargs.get("input", []), kwargs.get("model", settings.embedding_model)
+            ),
+            **retry,
+        )
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+
+_rate_limiter: Optional[TokenBucketRateLimiter] = None
+
+
+def get_rate_limiter() -> Optional[TokenBucketRateLimiter]:
+    """The process-wide limiter, or None when rate limiting is disabled"""
+    global _rate_limiter
+    if not settings.openai_rate_limit_enabled:
+        return None
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucketRateLimiter(
+            settings.openai_requests_per_minute, settings.openai_tokens_per_minute
+        )
+    return _rate_limiter
+
+
+def create_openai_client(**kwargs: Any) -> AsyncOpenAI:
+    """
+    OpenAI client for chat and embedding calls, sharing the process-wide
+    rate limiter when it is enabled.
+    """
+    kwargs.setdefault("api_key", settings.OPENAI_API_KEY)
+    max_retries = kwargs.pop("max_retries", settings.openai_max_retries)
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return AsyncOpenAI(max_retries=max_retries, **kwargs)
+    # SDK retries would bypass the token bucket; the wrapper retries instead
+    return RateLimitedOpenAI(  # type:ignore
+        AsyncOpenAI(max_retries=0, **kwargs),
+        limiter,
+        max_retries=max_retries,
+        retry_backoff_seconds=settings.openai_retry_backoff_seconds,
+    )